@@ -0,0 +1,13 @@
+"""
+Performance benchmarks for SmartJson.
+
+Run from the repository root:
+
+    python -m benchmarks                                   # run everything, print a table
+    python -m benchmarks --output results.json             # also write the results as JSON
+    python -m benchmarks --save-baseline baseline.json     # store a baseline for this machine
+    python -m benchmarks --baseline baseline.json          # fail (exit status 1) on regressions
+    python -m benchmarks --memory --output memory.json     # peak allocation per phase (tracemalloc)
+
+See `python -m benchmarks --help` for the remaining options.
+"""
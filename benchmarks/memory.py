@@ -0,0 +1,191 @@
+"""
+Memory benchmarks: peak allocation per phase of a serialization round trip, traced with tracemalloc.
+
+Every payload goes through the same phases, each measured on its own:
+
+    copy          SmartJson(payload, deep_copy=True)
+    convert       conversion to JSON-ready values (_convert_root)
+    encode        encoding the converted values to a JSON string
+    write         serializeToJsonFile() (convert, encode and write)
+    write_stream  serializeToJsonFile(stream=True)
+    parse         reading the file back and parsing it
+    build         building the _KObject tree from the parsed values
+
+For each phase the results hold:
+
+    peak          the highest traced allocation (in bytes) above what was allocated when the
+                  phase started
+    allocations   the number of memory blocks allocated by the phase and still allocated when it
+                  returns (its result included), from a diff of tracemalloc snapshots
+    allocated     the size of those blocks, in bytes
+    blocks        the net change of sys.getallocatedblocks(), i.e. allocations minus the blocks
+                  the phase freed, including blocks that were allocated before it started
+
+Blocks allocated and freed again within a phase are part of `peak` only: tracemalloc does not
+count them. `allocations` sums the per-line increases of the snapshot diff, so freeing older
+memory does not hide what the phase allocated, as it does for `blocks`.
+"""
+from __future__ import print_function, unicode_literals, division, absolute_import
+
+import datetime
+import gc
+import io
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+from collections import OrderedDict
+
+from benchmarks.workloads import Customer, Wide, deep_chain, nested_records
+from smartjson import SmartJson
+from smartjson.core import _KObject, _get_json_backend, _get_json_encoder
+
+PHASES = ("copy", "convert", "encode", "write", "write_stream", "parse", "build")
+
+PAYLOADS = OrderedDict()
+
+
+def payload(name):
+    def register(function):
+        PAYLOADS[name] = function
+        return function
+    return register
+
+
+@payload("customers")
+def customers():
+    return [Customer(i) for i in range(2000)]
+
+
+@payload("nested_dicts_lists")
+def nested_dicts_lists():
+    return nested_records(5000)
+
+
+@payload("wide_objects")
+def wide_objects():
+    return [Wide(200) for _ in range(100)]
+
+
+@payload("deep_object")
+def deep_object():
+    return deep_chain(50)  # deepcopy recurses several frames per level; 200 levels overflow it on Python 3.6
+
+
+@payload("datetimes")
+def datetimes():
+    start = datetime.datetime(2020, 1, 1)
+    return {"events": [{"at": start + datetime.timedelta(seconds=i), "day": (start + datetime.timedelta(days=i)).date()}
+                       for i in range(10000)]}
+
+
+def _phase_allocations(increases):
+    """Sums `(traceback, count, size)` increases, leaving out the snapshot taken before the phase."""
+    own_file = tracemalloc.__file__
+    allocations = allocated = 0
+    for traceback, count, size in increases:
+        if traceback[0].filename != own_file:
+            allocations += count
+            allocated += size
+    return allocations, allocated
+
+
+def measure(function):
+    """Runs `function` under tracemalloc; returns its result and its measurements (see the module docstring)."""
+    gc.collect()
+    if hasattr(tracemalloc, "reset_peak"):
+        before = tracemalloc.take_snapshot()  # Taken first, so that building it does not count towards the peak
+        tracemalloc.reset_peak()
+    else:  # Python < 3.9: forget the earlier traces so the peak starts from here
+        tracemalloc.clear_traces()
+        before = None
+    start_size = tracemalloc.get_traced_memory()[0]
+    start_blocks = sys.getallocatedblocks()
+    result = function()
+    peak = tracemalloc.get_traced_memory()[1]
+    blocks = sys.getallocatedblocks() - start_blocks
+    after = tracemalloc.take_snapshot()
+    if before is None:  # Every remaining trace was allocated by the phase
+        allocations, allocated = _phase_allocations(
+            (stat.traceback, stat.count, stat.size) for stat in after.statistics("lineno"))
+    else:
+        allocations, allocated = _phase_allocations(
+            (stat.traceback, stat.count_diff, max(stat.size_diff, 0))
+            for stat in after.compare_to(before, "lineno") if stat.count_diff > 0)
+    del before, after
+    return result, {"peak": peak - start_size, "allocations": allocations, "allocated": allocated,
+                    "blocks": blocks}
+
+
+def measure_payload(value):
+    """Returns the measurements of every phase for one payload, keyed by phase."""
+    directory = tempfile.mkdtemp(prefix="smartjson-bench-")
+    filepath = os.path.join(directory, "payload.json")
+    measurements = OrderedDict()
+
+    def read_and_parse():
+        with io.open(filepath, "r", encoding="utf-8") as infile:
+            return _get_json_backend().loads(infile.read())
+
+    try:
+        copied, measurements["copy"] = measure(lambda: SmartJson(value, deep_copy=True))
+        del copied
+        converted, measurements["convert"] = measure(lambda: SmartJson._convert_root(value, set())[0])
+        text, measurements["encode"] = measure(lambda: _get_json_encoder().dumps(converted, True, True))
+        del converted, text
+        _, measurements["write"] = measure(
+            lambda: SmartJson(value).serializeToJsonFile(directory=directory, filename="payload.json"))
+        _, measurements["write_stream"] = measure(
+            lambda: SmartJson(value).serializeToJsonFile(directory=directory, filename="payload.json", stream=True))
+        parsed, measurements["parse"] = measure(read_and_parse)
+        if not isinstance(parsed, dict):
+            parsed = {"items": parsed}  # _KObject needs a dictionary at the top
+        built, measurements["build"] = measure(lambda: _KObject(parsed))
+        del parsed, built
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return measurements
+
+
+def run_memory(patterns_match, out=None):
+    """
+    Measures the payloads with a phase name (`payload.phase`) accepted by `patterns_match`.
+
+    Returns `{name: {"peak": bytes, "allocations": count, "allocated": bytes, "blocks": count}}` in
+    payload and phase order.
+    """
+    results = OrderedDict()
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    try:
+        for payload_name, build_payload in PAYLOADS.items():
+            names = ["{}.{}".format(payload_name, phase) for phase in PHASES]
+            if not any(patterns_match(name) for name in names):
+                continue
+            value = build_payload()
+            for phase, measurement in measure_payload(value).items():
+                name = "{}.{}".format(payload_name, phase)
+                if not patterns_match(name):
+                    continue
+                results[name] = measurement
+                if out is not None:
+                    print("{:<36} {:>12}  {:>10} allocations".format(name, format_bytes(measurement["peak"]),
+                                                                     measurement["allocations"]), file=out)
+            del value
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+    return results
+
+
+def memory_names():
+    return ["{}.{}".format(payload_name, phase) for payload_name in PAYLOADS for phase in PHASES]
+
+
+def format_bytes(size):
+    for unit, scale in (("GiB", 1 << 30), ("MiB", 1 << 20), ("KiB", 1 << 10)):
+        if abs(size) >= scale:
+            return "{:.2f} {}".format(size / scale, unit)
+    return "{} B".format(size)
@@ -0,0 +1,214 @@
+"""
+Runs the benchmark workloads, writes their results as JSON and compares them with a baseline.
+
+Each workload is timed in `repeat` rounds of enough calls to last about `min_time` seconds; the
+fastest round is the figure used for comparisons, as it is the least disturbed by other activity
+on the machine. A workload regresses when it is more than `threshold` (a fraction) slower than
+in the baseline.
+
+With `--memory` the phases of `benchmarks.memory` are measured with tracemalloc instead, and a
+phase regresses when its peak allocation or its number of allocations grows by more than
+`threshold`.
+
+Results are only compared with a baseline measured in the same mode and with the same JSON
+backend.
+"""
+from __future__ import print_function, unicode_literals, division, absolute_import
+
+import argparse
+import fnmatch
+import gc
+import io
+import json
+import platform
+import sys
+import time
+
+from benchmarks.memory import format_bytes, memory_names, run_memory
+from benchmarks.workloads import WORKLOADS
+from smartjson import SmartJson
+
+RESULTS_FORMAT = 1
+DEFAULT_THRESHOLD = 0.25
+METRICS = {"time": ("min",), "memory": ("peak", "allocations")}  # Compared with the baseline, per mode
+
+
+def time_workload(function, repeat=5, min_time=0.2):
+    """Returns per-call timings of `function`: the fastest and median round, in seconds."""
+    clock = time.perf_counter
+    loops = 1
+    while True:  # Calibrate the number of calls per round
+        start = clock()
+        for _ in range(loops):
+            function()
+        elapsed = clock() - start
+        if elapsed >= min_time / 10:
+            loops = max(1, int(round(loops * min_time / elapsed)))
+            break
+        loops *= 10
+    rounds = []
+    gc_was_enabled = gc.isenabled()
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()  # Collections triggered by earlier rounds would add noise
+        try:
+            start = clock()
+            for _ in range(loops):
+                function()
+            rounds.append((clock() - start) / loops)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+    rounds.sort()
+    return {"min": rounds[0], "median": rounds[len(rounds) // 2], "loops": loops, "repeat": repeat}
+
+
+def select_workloads(patterns=None, memory=False):
+    """Returns the names of the workloads matching any of the shell-style `patterns` (all by default)."""
+    names = memory_names() if memory else list(WORKLOADS)
+    if not patterns:
+        return names
+    return [name for name in names if any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)]
+
+
+def run(names, repeat=5, min_time=0.2, out=None):
+    results = {}
+    for name in names:
+        function = WORKLOADS[name]()
+        results[name] = time_workload(function, repeat, min_time)
+        if out is not None:
+            print("{:<36} {:>12}  (median {})".format(name, format_seconds(results[name]["min"]),
+                                                     format_seconds(results[name]["median"])), file=out)
+    return _results("time", results)
+
+
+def run_memory_phases(names, out=None):
+    """Measures the memory phases in `names`; returns results shaped like those of `run()`."""
+    selected = set(names)
+    return _results("memory", run_memory(selected.__contains__, out))
+
+
+def _results(mode, benchmarks):
+    return {
+        "format": RESULTS_FORMAT,
+        "mode": mode,
+        "json_backend": SmartJson.get_backend(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "benchmarks": benchmarks,
+    }
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compares `results` with `baseline` (both as written by `run()` or `run_memory_phases()`): the
+    fastest timings, or the peak allocations and allocation counts in memory mode.
+
+    Returns a list of `(name, metric, baseline_value, current_value, ratio, regressed)` for the
+    workloads present in both, where `ratio` is current / baseline. Raises ValueError when the
+    runs used a different mode or JSON backend.
+    """
+    mode = results.get("mode", "time")
+    if baseline.get("mode", "time") != mode:
+        raise ValueError("Cannot compare {} results with a {} baseline".format(mode, baseline.get("mode", "time")))
+    backend, baseline_backend = results.get("json_backend"), baseline.get("json_backend")
+    if backend and baseline_backend and backend != baseline_backend:
+        raise ValueError("Cannot compare results using the '{}' JSON backend with a baseline using '{}'".format(
+            backend, baseline_backend))
+    rows = []
+    for name, current in results["benchmarks"].items():
+        previous = baseline.get("benchmarks", {}).get(name)
+        if previous is None:
+            continue
+        for metric in METRICS[mode]:
+            if metric not in previous:
+                continue  # Baselines recorded before the metric existed
+            if previous[metric]:
+                ratio = current[metric] / previous[metric]
+            else:
+                ratio = 1.0 if current[metric] <= 0 else float("inf")
+            rows.append((name, metric, previous[metric], current[metric], ratio, ratio > 1 + threshold))
+    return rows
+
+
+def format_seconds(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return "{:.3f} {}".format(seconds / scale, unit)
+    return "{:.1f} ns".format(seconds / 1e-9)
+
+
+FORMATTERS = {"min": format_seconds, "peak": format_bytes, "allocations": str}
+
+
+def load_results(path):
+    with io.open(path, "r", encoding="utf-8") as infile:
+        return json.load(infile)
+
+
+def save_results(results, path):
+    with io.open(path, "w", encoding="utf-8") as outfile:
+        outfile.write(json.dumps(results, indent=2, sort_keys=True))
+        outfile.write("\n")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Run the SmartJson benchmarks.")
+    parser.add_argument("patterns", nargs="*", metavar="PATTERN",
+                        help="only run workloads matching these shell-style patterns, e.g. 'serialize.*'")
+    parser.add_argument("--list", action="store_true", help="list the workloads and exit")
+    parser.add_argument("--memory", action="store_true",
+                        help="measure peak allocation per phase with tracemalloc instead of timing")
+    parser.add_argument("--repeat", type=int, default=5, help="timed rounds per workload (default 5)")
+    parser.add_argument("--min-time", type=float, default=0.2,
+                        help="approximate duration of one round in seconds (default 0.2)")
+    parser.add_argument("--output", metavar="PATH", help="write the results as JSON to PATH")
+    parser.add_argument("--save-baseline", metavar="PATH", help="write the results as a new baseline to PATH")
+    parser.add_argument("--baseline", metavar="PATH", help="compare with the baseline at PATH")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown (or peak and allocation growth with --memory) against the baseline "
+                             "as a fraction (default 0.25)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None, out=None):
+    """Command line entry point; returns the exit status (1 when a workload regressed)."""
+    out = out or sys.stdout
+    args = parse_args(argv)
+    names = select_workloads(args.patterns, args.memory)
+    if args.list:
+        for name in names:
+            print(name, file=out)
+        return 0
+    if not names:
+        print("No workload matches {}".format(", ".join(args.patterns)), file=sys.stderr)
+        return 2
+    if args.memory:
+        results = run_memory_phases(names, out)
+    else:
+        results = run(names, args.repeat, args.min_time, out)
+    if args.output:
+        save_results(results, args.output)
+    if args.save_baseline:
+        save_results(results, args.save_baseline)
+    if not args.baseline:
+        return 0
+
+    try:
+        rows = compare(results, load_results(args.baseline), args.threshold)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    print("\nCompared with {} (threshold +{:.0%}):".format(args.baseline, args.threshold), file=out)
+    for name, metric, previous, current, ratio, regressed in rows:
+        format_value = FORMATTERS[metric]
+        print("{:<36} {:<12} {:>12} -> {:>12}  {:>6.2f}x{}".format(
+            name, metric, format_value(previous), format_value(current), ratio, "  REGRESSION" if regressed else ""),
+            file=out)
+    regressions = ["{} ({})".format(row[0], row[1]) for row in rows if row[5]]
+    if regressions:
+        print("\n{} workload(s) regressed: {}".format(len(regressions), ", ".join(regressions)), file=out)
+        return 1
+    return 0
@@ -0,0 +1,276 @@
+"""
+Benchmark workloads.
+
+Each workload is a function registered with `@workload(name)` that builds its input and returns
+the zero-argument callable to be timed, so setup cost is never measured.
+"""
+from __future__ import print_function, unicode_literals, division, absolute_import
+
+import datetime
+import enum
+import io
+import json
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+
+import six
+
+from smartjson import SmartJson
+from smartjson.core import _KObject
+
+WORKLOADS = OrderedDict()
+
+
+def workload(name):
+    def register(function):
+        WORKLOADS[name] = function
+        return function
+    return register
+
+
+# --- Payloads ---
+class Color(enum.Enum):
+    RED = 1
+    GREEN = 2
+    BLUE = 3
+
+
+class Address(object):
+    def __init__(self, number):
+        self.street = "{} Main Street".format(number)
+        self.city = "Springfield"
+        self.zip_code = "{:05d}".format(number)
+
+
+class Customer(object):
+    def __init__(self, number):
+        self.id = number
+        self.name = "Customer {}".format(number)
+        self.email = "customer{}@example.com".format(number)
+        self.active = number % 2 == 0
+        self.balance = number * 1.25
+        self.created = datetime.datetime(2020, 1, 1, 12, 30) + datetime.timedelta(minutes=number)
+        self.birthday = datetime.date(1980, 1, 1) + datetime.timedelta(days=number)
+        self.address = Address(number)
+        self.tags = ["tag{}".format(i) for i in range(5)]
+
+
+class Wide(object):
+    def __init__(self, width):
+        for i in range(width):
+            setattr(self, "field_{}".format(i), i if i % 3 else "value {}".format(i))
+
+
+class Node(object):
+    def __init__(self, child, depth):
+        self.depth = depth
+        self.label = "node {}".format(depth)
+        self.child = child
+
+
+def deep_chain(depth):
+    node = None
+    for level in range(depth):
+        node = Node(node, level)
+    return node
+
+
+def nested_records(count):
+    return {"records": [{"id": i, "name": "record {}".format(i), "scores": [i, i * 0.5, -i],
+                         "meta": {"source": "import", "flags": [True, False], "parent": {"id": i // 10}}}
+                        for i in range(count)]}
+
+
+CUSTOMER_SCHEMA = {
+    'id': {'type': six.integer_types, 'required': True},
+    'name': {'type': six.string_types, 'required': True},
+    'email': {'type': six.string_types, 'required': True},
+    'active': {'type': bool, 'required': True},
+    'balance': {'type': float, 'required': True},
+    'created': {'type': datetime.datetime, 'required': True},
+    'birthday': {'type': datetime.date, 'required': True},
+    'address': {'type': Address, 'required': True, 'schema': {
+        'street': {'type': six.string_types, 'required': True},
+        'city': {'type': six.string_types, 'required': True},
+        'zip_code': {'type': six.string_types, 'required': True},
+    }},
+    'tags': {'type': list, 'required': True, 'item_type': six.string_types},
+}
+
+CUSTOMER_DATA_SCHEMA = {
+    'id': {'type': 'int', 'required': True},
+    'name': {'type': 'str', 'required': True},
+    'email': {'type': 'str', 'required': True},
+    'active': {'type': 'bool', 'required': True},
+    'balance': {'type': 'float', 'required': True},
+    'created': {'type': 'str', 'required': True},
+    'birthday': {'type': 'str', 'required': True},
+    'address': {'type': 'dict', 'required': True, 'schema': {
+        'street': {'type': 'str', 'required': True},
+        'city': {'type': 'str', 'required': True},
+        'zip_code': {'type': 'str', 'required': True},
+    }},
+    'tags': {'type': 'list', 'required': True, 'item_type': 'str'},
+}
+
+
+def customer_dict(number):
+    return json.loads(SmartJson(Customer(number)).serialize(pretty=False))["Customer"]
+
+
+# --- Serialization ---
+@workload("serialize.wide_object")
+def serialize_wide_object():
+    sj = SmartJson(Wide(200))
+    return lambda: sj.serialize(pretty=False)
+
+
+@workload("serialize.deep_object")
+def serialize_deep_object():
+    sj = SmartJson(deep_chain(500))
+    return lambda: sj.serialize(pretty=False)
+
+
+@workload("serialize.customers")
+def serialize_customers():
+    sj = SmartJson([Customer(i) for i in range(200)])
+    return lambda: sj.serialize(pretty=False)
+
+
+@workload("serialize.customers_pretty")
+def serialize_customers_pretty():
+    sj = SmartJson([Customer(i) for i in range(200)])
+    return lambda: sj.serialize(pretty=True)
+
+
+@workload("serialize.nested_dicts_lists")
+def serialize_nested_dicts_lists():
+    sj = SmartJson(nested_records(1000))
+    return lambda: sj.serialize(pretty=False)
+
+
+@workload("serialize.enums")
+def serialize_enums():
+    sj = SmartJson({"palette": Color, "choices": [{"color": Color.GREEN} for _ in range(200)]})
+    return lambda: sj.serialize(pretty=False)
+
+
+@workload("serialize.datetimes")
+def serialize_datetimes():
+    start = datetime.datetime(2020, 1, 1)
+    sj = SmartJson({"events": [{"at": start + datetime.timedelta(seconds=i), "day": (start + datetime.timedelta(days=i)).date()}
+                               for i in range(1000)]})
+    return lambda: sj.serialize(pretty=False)
+
+
+@workload("serialize.iterencode")
+def serialize_iterencode():
+    sj = SmartJson([Customer(i) for i in range(200)])
+    return lambda: "".join(sj.iterencode(pretty=False))
+
+
+# --- Deserialization ---
+@workload("deserialize.customers")
+def deserialize_customers():
+    text = SmartJson({"customers": [Customer(i) for i in range(200)]}).serialize(pretty=False)
+    sj = SmartJson()
+    return lambda: sj.toObject(text)
+
+
+@workload("deserialize.nested_dicts_lists")
+def deserialize_nested_dicts_lists():
+    text = json.dumps(nested_records(1000))
+    sj = SmartJson()
+    return lambda: sj.toObject(text)
+
+
+@workload("kobject.construct")
+def kobject_construct():
+    data = {"customers": [customer_dict(i) for i in range(200)]}
+    return lambda: _KObject(data)
+
+
+@workload("kobject.construct_slots")
+def kobject_construct_slots():
+    data = {"customers": [customer_dict(i) for i in range(200)]}
+    return lambda: SmartJson().toObject(data, slots=True)
+
+
+@workload("kobject.datetime_strings")
+def kobject_datetime_strings():
+    data = {"events": [{"at": "2020-01-02 03:04:{:02d}.000600".format(i % 60), "day": "2020-01-02",
+                        "note": "not a date {}".format(i)} for i in range(1000)]}
+    return lambda: _KObject(data)
+
+
+# --- Schema validation ---
+@workload("validate.data")
+def validate_data():
+    data = {"id": 1, "customers": [customer_dict(i) for i in range(200)]}
+    schema = {'id': {'type': 'int', 'required': True},
+              'customers': {'type': 'list', 'required': True, 'item_type': 'dict', 'item_schema': CUSTOMER_DATA_SCHEMA}}
+    return lambda: SmartJson._validate_data(data, schema)
+
+
+@workload("validate.object")
+def validate_object():
+    customers = [Customer(i) for i in range(200)]
+    return lambda: [SmartJson._validate_object(customer, CUSTOMER_SCHEMA) for customer in customers]
+
+
+@workload("validate.compiled_object")
+def validate_compiled_object():
+    customers = [Customer(i) for i in range(200)]
+    validator = SmartJson.compile_object_schema(CUSTOMER_SCHEMA)
+    return lambda: [validator.validate(customer) for customer in customers]
+
+
+# --- Files ---
+class _TemporaryDirectory(object):
+    """A directory removed when the workload callable is garbage collected."""
+
+    def __init__(self):
+        self.path = tempfile.mkdtemp(prefix="smartjson-bench-")
+
+    def __del__(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+@workload("file.round_trip")
+def file_round_trip():
+    directory = _TemporaryDirectory()
+    sj = SmartJson({"customers": [Customer(i) for i in range(200)]})
+    filepath = os.path.join(directory.path, "customers.json")
+
+    def run(directory=directory):
+        sj.serializeToJsonFile(directory=directory.path, filename="customers.json")
+        return SmartJson().toObjectFromFile(filepath)
+    return run
+
+
+@workload("file.stream_round_trip")
+def file_stream_round_trip():
+    directory = _TemporaryDirectory()
+    sj = SmartJson({"customers": [Customer(i) for i in range(200)]})
+    filepath = os.path.join(directory.path, "customers.json")
+
+    def run(directory=directory):
+        sj.serializeToJsonFile(directory=directory.path, filename="customers.json", stream=True)
+        return SmartJson().toObjectFromFile(filepath)
+    return run
+
+
+@workload("file.json_lines")
+def file_json_lines():
+    directory = _TemporaryDirectory()
+    customers = [Customer(i) for i in range(200)]
+    filepath = os.path.join(directory.path, "customers.jsonl")
+
+    def run(directory=directory):
+        with io.open(filepath, "w", encoding="utf-8") as outfile:
+            SmartJson.dump_lines(customers, outfile)
+        with io.open(filepath, "r", encoding="utf-8") as infile:
+            return list(SmartJson.iter_lines(infile))
+    return run
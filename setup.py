@@ -26,12 +26,17 @@ setup(
         'json conversion', 'python to json', 'json to python', 'schema validation',
         'object mapper', 'datetime', 'enum', 'complex', 'OrderedDict', 'deque'
     ],
-    packages=find_packages(exclude=("tests*", "examples*")), # Exclude tests and examples
+    packages=find_packages(exclude=("tests*", "examples*", "benchmarks*")), # Exclude tests, examples and benchmarks
     python_requires='>=2.7, !=3.0.*, !=3.1.*, !=3.2.*, !=3.3.*, !=3.4.*, !=3.5.*',
     install_requires=[
         'six>=1.10.0',
         'enum34; python_version<"3.4"',
     ],
+    extras_require={  # Optional faster JSON backends, picked up automatically when installed
+        'orjson': ['orjson'],
+        'rapidjson': ['python-rapidjson'],
+        'ujson': ['ujson'],
+    },
     include_package_data=True, # Changed to True
     # package_data={ # Example if you had non-code files inside your package
     #     'smartjson': ['some_data_file.dat'],
@@ -10,11 +10,24 @@ Version : 2.1.0
 email: jolli644@gmail.com
 """
 
+import concurrent.futures
 import datetime
+import functools
+import importlib
+import itertools
 import json
+import mmap
 import os
+import pickle
+import re
+import time
+import types
+import typing
+import weakref
 from collections import OrderedDict
 from copy import deepcopy
+from collections import deque
+from enum import Enum, EnumMeta
 
 
 # --- Custom Exception Classes ---
@@ -86,443 +99,2878 @@ class SmartJsonSchemaValidationError(SmartJsonError):
 
 # --- End of Custom Exception Classes ---
 
+# --- Datetime detection for deserialized strings ---
+_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+# Layout of str(datetime) with microseconds, the form written by _JsonConvert.json_convert
+_DATETIME_PATTERN = re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2}:[0-9]{2}\.[0-9]{6}\Z")
+
+
+def _datetime_from_layout(value):
+    return datetime.datetime(int(value[0:4]), int(value[5:7]), int(value[8:10]), int(value[11:13]),
+                             int(value[14:16]), int(value[17:19]), int(value[20:26]))
+
+
+# Parses strings matching _DATETIME_PATTERN; fromisoformat() is much faster where available (Python 3.7+)
+_datetime_from_layout = getattr(datetime.datetime, 'fromisoformat', _datetime_from_layout)
+
+
+def _parse_datetime(value):
+    """
+    Returns the datetime for strings accepted by strptime(value, _DATETIME_FORMAT), None for others.
+
+    Strings that cannot match (shorter than "2020-1-2 3:4:5.6" or not starting with a 4-digit year
+    and '-') are rejected without parsing, and the layout emitted by json_convert is parsed
+    directly; strptime only sees the remaining lenient forms (single-digit fields, extra spaces).
+    """
+    if len(value) < 16 or value[4] != '-' or not value[:4].isdigit():
+        return None
+    if len(value) == 26 and _DATETIME_PATTERN.match(value):
+        try:
+            return _datetime_from_layout(value)
+        except ValueError:
+            return None
+    try:
+        return datetime.datetime.strptime(value, _DATETIME_FORMAT)
+    except ValueError:
+        return None
+
+
 # --- Helper Class: _KObject (for deserialized objects) ---
 class _KObject(object):
-    def __init__(self, d):
+    def __init__(self, d, parse_datetimes=True):
         if not isinstance(d, dict):
             raise SmartJsonDeserializationError(
                 "Cannot create _KObject from type '{}'. Expected a dictionary structure.".format(type(d).__name__))
         for a, b in six.iteritems(d):
+            setattr(self, a, self._convert_attribute(a, b, parse_datetimes))
+
+    @classmethod
+    def _convert_attribute(cls, a, b, parse_datetimes=True):
+        try:
+            if isinstance(b, (list, tuple)):
+                return [cls._from_dict(x, parse_datetimes) if isinstance(x, dict) else x for x in b]
+            elif isinstance(b, six.string_types):
+                if parse_datetimes:
+                    parsed = _parse_datetime(b)
+                    if parsed is not None:
+                        return parsed
+                return b
+            else:
+                return cls._from_dict(b, parse_datetimes) if isinstance(b, dict) else b
+        except Exception as e:
+            raise SmartJsonDeserializationError("Error processing attribute '{}' for _KObject".format(a),
+                                                original_exception=e)
+
+    @classmethod
+    def _from_dict(cls, d, parse_datetimes=True):
+        return cls(d, parse_datetimes)
+
+
+class _LazyKObject(_KObject):
+    """
+    _KObject that keeps the parsed dictionary and converts an attribute the first time it is read.
+
+    Attribute access gives the same values as _KObject (nested dictionaries become _LazyKObject);
+    errors converting an attribute are raised when that attribute is first read.
+    """
+    __slots__ = ('_source', '_parse_datetimes')
+
+    def __init__(self, d, parse_datetimes=True):
+        if not isinstance(d, dict):
+            raise SmartJsonDeserializationError(
+                "Cannot create _KObject from type '{}'. Expected a dictionary structure.".format(type(d).__name__))
+        self._source = d
+        self._parse_datetimes = parse_datetimes
+
+    def __getattr__(self, name):
+        # Only called when the attribute is not materialized yet
+        try:
+            source = object.__getattribute__(self, '_source')
+        except AttributeError:
+            raise AttributeError(name)
+        if name not in source:
+            raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+        value = self._convert_attribute(name, source[name], self._parse_datetimes)
+        setattr(self, name, value)
+        return value
+
+    def __dir__(self):
+        return sorted(set(dir(type(self))) | set(vars(self)) | set(self._source))
+
+
+_IDENTIFIER_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*\Z")
+_MAX_SHAPES = 1024
+_SHAPES = {}  # tuple of keys in document order -> _ShapedKObject subclass
+# Values _KObject._convert_attribute returns unchanged, checked by exact type to skip the call
+_PLAIN_VALUE_TYPES = frozenset(six.integer_types + (float, bool, type(None)))
+
+
+class _ShapedKObject(object):
+    """
+    Base of the `__slots__` classes that toObject(..., slots=True) generates per key set ("shape").
+
+    Records with the same keys (in the same order) share one generated class, so they carry no
+    per-instance `__dict__`. Attribute values are converted exactly as for _KObject, and nested
+    dictionaries are shaped too. Keys that cannot be slot names (non-identifiers, dunder or reserved
+    names), and any new shape once _MAX_SHAPES exist, use a fallback class with a `__dict__`.
+    """
+    __slots__ = ()
+
+    _convert_attribute = _KObject.__dict__['_convert_attribute']
+
+    def __init__(self, d, parse_datetimes=True):
+        convert = self._convert_attribute
+        for a, b in d.items():
+            setattr(self, a, b if b.__class__ in _PLAIN_VALUE_TYPES else convert(a, b, parse_datetimes))
+
+    @classmethod
+    def _from_dict(cls, d, parse_datetimes=True):
+        if not isinstance(d, dict):
+            raise SmartJsonDeserializationError(
+                "Cannot create _KObject from type '{}'. Expected a dictionary structure.".format(type(d).__name__))
+        keys = tuple(d)
+        shape = _SHAPES.get(keys)
+        if shape is None:
+            shape = _ShapedKObject.shape_for(keys)
+        return shape(d, parse_datetimes)
+
+    @staticmethod
+    def shape_for(keys):
+        if len(_SHAPES) >= _MAX_SHAPES:
+            return _DictShapedKObject
+        if all(_IDENTIFIER_PATTERN.match(key) and not key.startswith('__') and not hasattr(_ShapedKObject, key)
+               for key in keys):
+            shape = type(str('_ShapedKObject'), (_ShapedKObject,),
+                         {'__slots__': tuple(str(key) for key in keys), '__module__': _ShapedKObject.__module__})
+        else:
+            shape = _DictShapedKObject
+        return _SHAPES.setdefault(keys, shape)
+
+
+class _DictShapedKObject(_ShapedKObject):
+    __slots__ = ('__dict__',)
+
+
+# --- Helper Classes: type dispatch ---
+_KIND_SCALAR = 'scalar'  # converted without recursion or cycle tracking
+_KIND_SEQUENCE = 'sequence'
+_KIND_MAPPING = 'mapping'
+_KIND_ENUM = 'enum'  # enum classes (not members)
+_KIND_OBJECT = 'object'  # custom objects, converted from their attributes
+_KIND_CUSTOM = 'custom'  # registered converters
+
+
+class _TypeHandler(object):
+    """
+    How one kind of value is serialized.
+
+    For scalar kinds `convert(value)` returns the JSON-ready value; for custom kinds it returns a
+    replacement value that is converted in turn. Containers, enum classes and objects have no
+    `convert`: _ConversionWalk expands them.
+    """
+    __slots__ = ('kind', 'convert')
+
+    def __init__(self, kind, convert=None):
+        self.kind = kind
+        self.convert = convert
+
+    @classmethod
+    def custom(cls, function):
+        """Handler for a registered converter: `function(value)` returns a replacement that is converted in turn."""
+        return cls(_KIND_CUSTOM, function)
+
+
+class _TypeDispatch(object):
+    """
+    Type-keyed table of _TypeHandler with an MRO-resolved cache.
+
+    A handler registered for a type also applies to its subclasses: the handler of a concrete
+    type is found once by walking its MRO and then cached, so dispatching a value costs one dict
+    lookup on type(value). Registering or unregistering a type clears the cache.
+    """
+    _MAX_RESOLVED = 4096
+
+    def __init__(self):
+        self._registered = {}
+        self._resolved = {}
+
+    def register(self, klass, handler):
+        self._registered[klass] = handler
+        self._resolved.clear()
+
+    def unregister(self, klass):
+        self._registered.pop(klass, None)
+        self._resolved.clear()
+
+    def registered(self, klass):
+        """Returns the handler registered for `klass` itself (not inherited), or None."""
+        return self._registered.get(klass)
+
+    def resolve(self, klass):
+        try:
+            return self._resolved[klass]
+        except KeyError:
+            pass
+        for base in klass.__mro__:
+            handler = self._registered.get(base)
+            if handler is not None:
+                break
+        else:
+            raise SmartJsonUnsupportedTypeError("No converter registered for type '{}'".format(klass.__name__))
+        if len(self._resolved) >= self._MAX_RESOLVED:
+            self._resolved.clear()  # Bounded for programs that keep creating classes
+        self._resolved[klass] = handler
+        return handler
+
+    def resolve_value(self, value):
+        """Returns the handler for `value` after applying custom converters, and the value to convert."""
+        handler = self.resolve(type(value))
+        while handler.kind is _KIND_CUSTOM:
+            value = handler.convert(value)
+            previous, handler = handler, self.resolve(type(value))
+            if handler is previous:
+                raise SmartJsonSerializationError(
+                    "Custom converter returned a value of type '{}' it converts itself".format(type(value).__name__))
+        return handler, value
+
+
+def _convert_unchanged(value):
+    return value
+
+
+class _NonFiniteFloat(float):
+    """NaN or an infinity in converted data, marked so that fast backends leave it to the standard library."""
+    __slots__ = ()
+
+
+def _convert_float(value):
+    if value - value == 0.0:  # NaN and infinities give NaN
+        return value
+    return _NonFiniteFloat(value)
+
+
+def _convert_bytes(value):
+    return value.decode("utf-8")
+
+
+def _convert_none(value):
+    return ""
+
+
+def _convert_date(value):
+    return str(value)
+
+
+def _convert_complex(value):
+    return [{'expression': str(value), 'real': value.real, 'imag': value.imag}]
+
+
+def _convert_lazy_kobject(value):
+    # The fields as reading them gives, not the _source/_parse_datetimes slots kept for lazy conversion
+    fields = OrderedDict((name, getattr(value, name)) for name in value._source)
+    fields.update(vars(value))
+    return fields
+
+
+# --- Helper Class: _JsonConvert ---
+class _JsonConvert(object):
+    def __init__(self, visited=None):
+        self.visited = visited if visited is not None else set()
+
+    self_dumpers = dict()
+    self_loaders = dict()
+
+    def self_dump(self, obj):
+        class_name = self.get_class_name(obj)
+        if class_name in self.self_dumpers:
             try:
-                if isinstance(b, (list, tuple)):
-                    setattr(self, a, [self.__class__(x) if isinstance(x, dict) else x for x in b])
-                elif isinstance(b, six.string_types):
-                    try:
-                        setattr(self, a, datetime.datetime.strptime(b, "%Y-%m-%d %H:%M:%S.%f"))
-                    except ValueError:
-                        setattr(self, a, b)
-                else:
-                    setattr(self, a, self.__class__(b) if isinstance(b, dict) else b)
+                return self.self_dumpers[class_name](self, obj)
+            except Exception as e:
+                raise SmartJsonSerializationError("Custom dumper for '{}' failed".format(class_name),
+                                                  original_exception=e)
+        raise SmartJsonUnsupportedTypeError(
+            "Object of type '{}' is not JSON serializable with a custom dumper and no default path available in self_dump.".format(
+                class_name))
+
+    def json_convert(self, obj):
+        handler = _TYPE_HANDLERS.resolve(type(obj))
+        if handler.kind is _KIND_SCALAR:
+            return handler.convert(obj)
+        if handler.kind is not _KIND_MAPPING and handler.kind is not _KIND_SEQUENCE:
+            # Enum classes, custom objects and registered types follow the _convert_value rules,
+            # which track cycles themselves
+            return _ConversionWalk(self.visited).convert(obj)
+        obj_id = id(obj)
+        if obj_id in self.visited:
+            raise SmartJsonCircularDependencyError(
+                "Circular dependency detected in json_convert for object type '{}' (id: {})".format(type(obj).__name__,
+                                                                                                    obj_id),
+                object_id=obj_id
+            )
+        self.visited.add(obj_id)
+        try:
+            if handler.kind is _KIND_SEQUENCE:
+                return [self.json_convert(v) for v in obj]
+            if isinstance(obj, OrderedDict):
+                try:
+                    return self.self_dump(obj)
+                except SmartJsonUnsupportedTypeError:
+                    pass
+            return {k: self.json_convert(v) for k, v in six.iteritems(obj)}
+        finally:
+            self.visited.discard(obj_id)
+
+    def iter_items(self, d, **kw):
+        return six.iteritems(d, **kw)
+
+    def get_class_name(self, obj):
+        return obj.__class__.__module__ + "." + obj.__class__.__name__
+
+
+# --- Helper Class: _BaseConversion ---
+class _BaseConversion(object):
+    def __init__(self, visited):
+        self.visited = visited
+
+    def serialize(self, pretty):
+        if pretty:
+            return json.dumps(self.convert(), indent=2, sort_keys=True)
+        else:
+            return json.dumps(self.convert())
+
+    def convert(self):
+        raise NotImplementedError("Subclasses must implement the convert() method.")
+
+    def _convert_value(self, value):
+        return _ConversionWalk(self.visited).convert(value)
+
+
+# --- Helper Class: _ClassPlan ---
+_HEAPTYPE_FLAG = 1 << 9  # Py_TPFLAGS_HEAPTYPE: classes created by class statements or type()
+
+
+class _ClassPlan(object):
+    """
+    Per-class serialization plan used by _DataTypeConversion.
+
+    Walking dir() and filtering out dunder names, mangled private names and methods
+    only depends on the class, so it is done once per class and cached. The plan keeps:
+
+    * member_names: class-level names (in dir() order) that may hold data, i.e. class
+      data attributes and data descriptors such as properties or __slots__ members.
+    * property_names: the subset of member_names backed by a data descriptor other
+      than a __slots__ member (properties and the like).
+    * slot_names: the subset of member_names that are __slots__ members.
+    * skipped_names: names filtered out once for all instances.
+
+    A plan is rebuilt when the class changes (new MRO, or attributes added to, removed
+    from or replaced by a value of another type in any class of the MRO). Classes
+    overriding __dir__ are flagged as dynamic and keep the per-instance dir() scan.
+    Plans only hold weak references to classes, so the cache does not keep them alive.
+    """
+    __slots__ = ('mro', 'stamp', 'member_names', 'property_names', 'slot_names', 'skipped_names',
+                 'dynamic', '__weakref__')
+
+    _cache = weakref.WeakKeyDictionary()
+
+    def __init__(self, cls):
+        mro = cls.__mro__
+        self.mro = tuple(weakref.ref(klass) for klass in mro)
+        self.stamp = self._stamp(cls)
+        self.dynamic = any('__dir__' in vars(klass) for klass in mro if klass is not object)
+        member_names = []
+        property_names = set()
+        slot_names = set()
+        skipped_names = set()
+        mangled_prefix = '_' + cls.__name__ + '__'
+        for attr in dir(cls):
+            if attr.startswith('__') or attr.startswith(mangled_prefix):
+                skipped_names.add(attr)
+                continue
+            raw_value = self._lookup(mro, attr)
+            if isinstance(raw_value, (staticmethod, classmethod)) or callable(raw_value):
+                # Methods, nested classes and other callables are skipped by the
+                # per-instance callable() check anyway.
+                skipped_names.add(attr)
+                continue
+            if isinstance(raw_value, types.MemberDescriptorType):
+                slot_names.add(attr)
+            elif hasattr(type(raw_value), '__set__'):
+                property_names.add(attr)
+            member_names.append(attr)
+        self.member_names = tuple(member_names)
+        self.property_names = frozenset(property_names)
+        self.slot_names = frozenset(slot_names)
+        self.skipped_names = frozenset(skipped_names)
+
+    @staticmethod
+    def _lookup(mro, attr):
+        for klass in mro:
+            klass_dict = vars(klass)
+            if attr in klass_dict:
+                return klass_dict[attr]
+        return None
+
+    @staticmethod
+    def _stamp(cls):
+        # The plan depends on the names of the class attributes and on the types of their values
+        # (data, method, property, slot...). Built-in classes cannot change, so only heap types
+        # are stamped. copy/pickle cache '__slotnames__' on the class the first time an instance
+        # is copied; that is not a change of the class layout, so it is left out.
+        return tuple((name, type(value))
+                     for klass in cls.__mro__ if klass.__flags__ & _HEAPTYPE_FLAG
+                     for name, value in six.iteritems(vars(klass)) if name != '__slotnames__')
+
+    def is_current(self, klass):
+        mro = klass.__mro__
+        return (len(mro) == len(self.mro) and all(ref() is base for ref, base in zip(self.mro, mro))
+                and self._stamp(klass) == self.stamp)
+
+    @classmethod
+    def for_class(cls, klass):
+        plan = cls._cache.get(klass)
+        if plan is None or not plan.is_current(klass):
+            plan = cls(klass)
+            cls._cache[klass] = plan
+        return plan
+
+    @classmethod
+    def invalidate(cls, klass=None):
+        """Drop the cached plan for `klass`, or every cached plan when `klass` is None."""
+        if klass is None:
+            cls._cache.clear()
+        else:
+            cls._cache.pop(klass, None)
+
+    @staticmethod
+    def scan_dir(obj):
+        mangled_prefix = '_' + obj.__class__.__name__ + '__'
+        return [attr for attr in dir(obj) if not attr.startswith('__') and not attr.startswith(mangled_prefix)]
+
+
+# --- Helper Class: _DataTypeConversion ---
+class _DataTypeConversion(_BaseConversion):
+    def __init__(self, cls, visited):
+        super(_DataTypeConversion, self).__init__(visited)  # Py2 super()
+        self.___cls = cls
+
+    def convert(self):
+        # Builds a new dict holding the JSON-ready attributes; the object itself is never modified.
+        return _ConversionWalk(self.visited).convert_root(self.___cls, _KIND_OBJECT, tracked=True)
+
+    @staticmethod
+    def attribute_items(cls_obj, plan=None):
+        """
+        Returns the (name, unconverted value) pairs serialized for `cls_obj`, in output order.
+
+        `plan` is the _ClassPlan of its class when the caller already holds a current one.
+        """
+        if plan is None:
+            plan = _ClassPlan.for_class(type(cls_obj))
+        # Attributes from vars() first
+        # Note: vars() might not include all attributes, e.g. if __slots__ is used,
+        # or for properties.
+        try:
+            attributes_from_vars = vars(cls_obj)
+        except TypeError: # vars() can fail on some objects (like those with __slots__ and no __dict__)
+            if not plan.slot_names:
+                raise  # Nothing to read the attributes from
+            attributes_from_vars = {}
+        items = list(six.iteritems(attributes_from_vars))
+
+        # Discover and process properties and other attributes not in vars().
+        # Property getters are still evaluated (so a failing property surfaces as an error),
+        # but their values are not part of the output, same as read-only properties were
+        # never written back onto the object. Class-level data attributes and __slots__
+        # members are included.
+        # The candidate names come from the cached per-class plan, so dunder names,
+        # mangled private names and methods are filtered once per class instead of
+        # once per instance.
+        member_names = plan.member_names if not plan.dynamic else _ClassPlan.scan_dir(cls_obj)
+        for attr in member_names:
+            if attr in attributes_from_vars:
+                continue
+
+            try:
+                value = getattr(cls_obj, attr)
+            except AttributeError:
+                # Some attributes listed by dir() might not be accessible via getattr()
+                # (e.g. due to descriptor protocol or specific object configurations).
+                # It's generally safe to skip these for serialization purposes.
+                continue
+            # Let other exceptions from getattr (like ValueError from bad_prop)
+            # propagate to be caught by the .convert() method's handler.
+            if callable(value) or attr in plan.property_names: # Skip methods and properties
+                continue
+            items.append((attr, value))
+        return items
+
+
+# --- Helper Class: _ListConversion ---
+class _ListConversion(_BaseConversion):
+    def __init__(self, myList, visited):
+        super(_ListConversion, self).__init__(visited)  # Py2 super()
+        self.__myList = myList  # Read-only: items are converted into a new list
+
+    def convert(self):
+        walk = _ConversionWalk(self.visited)
+        return walk.convert_root(walk.top_list(self.__myList), _KIND_SEQUENCE)
+
+
+# --- Helper Class: _DictConversion ---
+class _DictConversion(_BaseConversion):
+    def __init__(self, dictionary, visited):
+        super(_DictConversion, self).__init__(visited)  # Py2 super()
+        # Store the original dictionary reference. Conversion happens in .convert()
+        self._original_dict = dictionary
+
+    def convert(self):
+        # JSON keys must be strings: keys are converted with str(), and when two keys convert to
+        # the same string the later value wins. The dictionary itself is not added to the visited
+        # set, values are (see _ConversionWalk).
+        return _ConversionWalk(self.visited).convert_root(self._original_dict, _KIND_MAPPING)
+
+
+# --- Helper Class: _EnumConversion ---
+class _EnumConversion(object):
+    def __init__(self, myEnum, visited):
+        self.__myEnum = myEnum  # Only read through vars() and member lookups
+        self.visited = visited
+
+    def serialize(self, pretty):
+        if pretty:
+            return json.dumps(self.convert(), indent=2, sort_keys=True)
+        else:
+            return json.dumps(self.convert())
+
+    def convert(self):
+        return _ConversionWalk(self.visited).convert_root(self.members(), _KIND_MAPPING)
+
+    def members(self):
+        """Returns a dict mapping each member name of the enum to its (unconverted) value."""
+        if isinstance(self.__myEnum, EnumMeta):
+            converts = {}
+            for attr, value in six.iteritems(vars(self.__myEnum)):
+                if "_member_names_" == attr:
+                    for member_name in value:
+                        enum_member_value = self.__myEnum[member_name].value
+                        converts[member_name] = enum_member_value
+            return converts
+        else:
+            raise SmartJsonUnsupportedTypeError(
+                "Type '{}' is not a directly serializable enum. Expected 'enum.EnumMeta'.".format(
+                    type(self.__myEnum).__name__))
+
+
+# --- Helper Class: _ConversionWalk ---
+_DEFAULT_MAX_DEPTH = 10000
+
+
+class _Frame(object):
+    """A container or object being expanded by _ConversionWalk, plus the state of its consumer."""
+    __slots__ = ('kind', 'value', 'items', 'size', 'obj_id', 'owner', 'out', 'level', 'count', 'separator', 'closing')
+
+
+class _ConversionWalk(object):
+    """
+    Iterative form of the conversion rules of _DictConversion, _DataTypeConversion and friends.
+
+    Containers, enum classes and objects are expanded into _Frame entries kept on an explicit
+    stack instead of recursing through one converter object per node, so the nesting depth is
+    bounded by `max_depth` rather than by the interpreter recursion limit. build() assembles the
+    JSON-ready tree; _StreamEncoder runs the same frames to write JSON text.
+
+    With `track_cycles=False` the visited set is neither read nor updated: the data is trusted to
+    be acyclic, and exceeding `max_depth` (which a reference cycle eventually does) raises
+    SmartJsonCircularDependencyError.
+
+    Given a `node_counts` dictionary, the number of values reached per type name is added to it.
+    """
+
+    def __init__(self, visited, max_depth=None, track_cycles=True, node_counts=None):
+        self.visited = visited
+        self.max_depth = _DEFAULT_MAX_DEPTH if max_depth is None else max_depth
+        self.track_cycles = track_cycles
+        self.resolve = _TYPE_HANDLERS.resolve if node_counts is None else _counting_resolve(node_counts)
+        self.plans = {}  # Class plans checked against their class once per walk
+        if _PROFILER is not None:
+            self.open = _PROFILER.bind(self)
+
+    # --- Entry points ---
+    def convert(self, value):
+        """Converts `value` as _BaseConversion._convert_value() does."""
+        handler, value = _TYPE_HANDLERS.resolve_value(value)
+        if handler.kind is _KIND_SCALAR:
+            return handler.convert(value)
+        return self.build(self.open(value, handler.kind, 0))
+
+    def convert_root(self, value, kind, tracked=False):
+        """Converts `value` as a container of `kind`; the value itself is only added to the visited set if `tracked`."""
+        return self.build(self.open(value, kind, 0, tracked))
+
+    @staticmethod
+    def top_list(items):
+        # Dicts and enum classes directly in a top-level list are wrapped in a list of their own.
+        resolve = _TYPE_HANDLERS.resolve
+        return [[item] if resolve(type(item)).kind in (_KIND_MAPPING, _KIND_ENUM) else item for item in items]
+
+    # --- Frames ---
+    def open(self, value, kind, depth, tracked=True):
+        """Returns the frame expanding `value`, checking the depth limit and (if `tracked`) cycles."""
+        if depth >= self.max_depth:
+            if not self.track_cycles:
+                raise SmartJsonCircularDependencyError(
+                    "Maximum nesting depth of {} exceeded at object of type '{}' with cycle tracking disabled; "
+                    "the data probably contains a circular reference".format(self.max_depth, type(value).__name__),
+                    object_id=id(value)
+                )
+            raise SmartJsonSerializationError(
+                "Maximum nesting depth of {} exceeded at object of type '{}'".format(self.max_depth,
+                                                                                     type(value).__name__))
+        obj_id = None
+        if tracked and self.track_cycles:
+            obj_id = id(value)
+            if obj_id in self.visited:
+                raise SmartJsonCircularDependencyError(
+                    "Circular dependency detected in _convert_value for object type '{}' (id: {})".format(
+                        type(value).__name__, obj_id),
+                    object_id=obj_id
+                )
+        frame = _Frame()
+        frame.kind = kind
+        frame.value = value  # Keeps converter replacements alive, so their ids in `visited` are not reused
+        frame.owner = None
+        if kind is _KIND_SEQUENCE:
+            frame.items = enumerate(value)
+            frame.size = len(value)
+        elif kind is _KIND_OBJECT:
+            klass = type(value)
+            plan = self.plans.get(klass)
+            if plan is None:
+                plan = self.plans[klass] = _ClassPlan.for_class(klass)
+            try:
+                items = _DataTypeConversion.attribute_items(value, plan)
+            except SmartJsonError:
+                raise
             except Exception as e:
-                raise SmartJsonDeserializationError("Error processing attribute '{}' for _KObject".format(a),
-                                                    original_exception=e)
+                raise SmartJsonSerializationError("Error converting attributes for '{}'".format(type(value).__name__),
+                                                  original_exception=e)
+            frame.items = iter(items)
+            frame.size = len(items)
+            frame.owner = klass.__name__
+        else:
+            if kind is _KIND_ENUM:
+                value = _EnumConversion(value, self.visited).members()
+            frame.items = ((str(key), item) for key, item in six.iteritems(value))
+            frame.size = len(value)
+        if obj_id is not None:
+            self.visited.add(obj_id)
+        frame.obj_id = obj_id
+        return frame
+
+    def release(self, frames):
+        for frame in frames:
+            if frame.obj_id is not None:
+                self.visited.discard(frame.obj_id)
+
+    @staticmethod
+    def attribute_error(frames, error):
+        """
+        Returns the error to raise for a non-SmartJsonError raised while expanding `frames`.
+
+        As in _DataTypeConversion, it is reported for the innermost object being converted; outside
+        of any object the original exception is returned unchanged.
+        """
+        for frame in reversed(frames):
+            if frame.owner is not None:
+                return SmartJsonSerializationError("Error converting attributes for '{}'".format(frame.owner),
+                                                   original_exception=error)
+        return error
+
+    def build(self, frame):
+        """Runs `frame` and all frames below it, and returns the JSON-ready container for it."""
+        resolve = self.resolve
+        root = frame
+        root.out = [] if root.kind is _KIND_SEQUENCE else {}
+        stack = [root]
+        try:
+            while stack:
+                frame = stack[-1]
+                out = frame.out
+                is_sequence = frame.kind is _KIND_SEQUENCE
+                for key, value in frame.items:
+                    handler = resolve(type(value))
+                    if handler.kind is _KIND_CUSTOM:
+                        handler, value = _TYPE_HANDLERS.resolve_value(value)
+                    if handler.kind is _KIND_SCALAR:
+                        value = handler.convert(value)
+                        child = None
+                    else:
+                        child = self.open(value, handler.kind, len(stack))
+                        child.out = value = [] if child.kind is _KIND_SEQUENCE else {}
+                    if is_sequence:
+                        out.append(value)
+                    else:
+                        out[key] = value
+                    if child is not None:
+                        stack.append(child)
+                        break
+                else:
+                    stack.pop()
+                    if frame.obj_id is not None:
+                        self.visited.discard(frame.obj_id)
+        except SmartJsonError:
+            raise
+        except Exception as e:
+            error = self.attribute_error(stack, e)
+            if error is e:
+                raise
+            raise error
+        finally:
+            self.release(stack)
+        return root.out
+
+
+def _counting_resolve(node_counts):
+    """Returns _TYPE_HANDLERS.resolve wrapped to count the resolved types by name in `node_counts`."""
+    resolve = _TYPE_HANDLERS.resolve
+
+    def counting_resolve(klass):
+        name = klass.__name__
+        node_counts[name] = node_counts.get(name, 0) + 1
+        return resolve(klass)
+    return counting_resolve
+
+
+# --- Conversion profiling ---
+_PROFILER = None  # the _ConversionProfiler active in SmartJson.profile(), if any
+
+
+class _TypeProfile(object):
+    """Aggregated conversion cost of one class, as reported by _ConversionProfiler."""
+    __slots__ = ('count', 'seconds', 'own_seconds', 'attributes', 'dir_scans', 'property_reads')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.own_seconds = 0.0
+        self.attributes = 0
+        self.dir_scans = 0
+        self.property_reads = 0
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class _ProfiledItems(object):
+    """Iterates the items of an object frame and calls `close` once they are exhausted."""
+    __slots__ = ('items', 'close')
+
+    def __init__(self, items, close):
+        self.items = items
+        self.close = close
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.items)
+        except StopIteration:
+            if self.close is not None:
+                self.close()
+                self.close = None
+            raise
+
+    next = __next__  # Py2
+
+
+class _ProfileRecord(object):
+    __slots__ = ('profile', 'start', 'child_seconds', 'parent')
+
+
+class _ConversionProfiler(object):
+    """
+    Aggregates, per class name (`_JsonConvert.get_class_name()`), the cost of converting custom
+    objects while it is active (see SmartJson.profile()).
+
+    For every class it records the number of instances converted (`count`), the time spent
+    converting them including their attribute values (`seconds`), the part of it not spent in
+    nested custom objects (`own_seconds`), the number of attributes serialized (`attributes`), how
+    many instances needed a per-instance dir() scan because their class overrides `__dir__`
+    (`dir_scans`), and how many class-level members (properties, slots and class attributes) were
+    read through getattr() (`property_reads`).
+    """
+    COLUMNS = ('count', 'seconds', 'own_seconds', 'attributes', 'dir_scans', 'property_reads')
+
+    def __init__(self):
+        self.types = {}
+        self._names = {}
+        self._plans = {}  # class -> _ClassPlan, looked up once per profiling run
+        self._namer = _JsonConvert()
+        self._previous = None
+
+    def __enter__(self):
+        global _PROFILER
+        self._previous = _PROFILER
+        _PROFILER = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global _PROFILER
+        _PROFILER = self._previous
+        self._previous = None
+        return False
+
+    def bind(self, walk):
+        """Returns a replacement for `walk.open` that profiles the object frames it opens."""
+        walk_open = _ConversionWalk.open
+        current = [None]  # innermost object frame of this walk still being converted
+        clock = time.perf_counter
+
+        def profiled_open(value, kind, depth, tracked=True):
+            if kind is not _KIND_OBJECT:
+                return walk_open(walk, value, kind, depth, tracked)
+            record = _ProfileRecord()
+            record.profile = profile = self._profile_for(value)
+            record.child_seconds = 0.0
+            self._count_lookups(value, profile)  # Before the clock starts, so it is not part of the times
+            record.start = clock()
+            frame = walk_open(walk, value, kind, depth, tracked)
+            record.parent = current[0]
+            current[0] = record
+            profile.count += 1
+            profile.attributes += frame.size
+
+            def close():
+                elapsed = clock() - record.start
+                profile.seconds += elapsed
+                profile.own_seconds += elapsed - record.child_seconds
+                current[0] = record.parent
+                if record.parent is not None:
+                    record.parent.child_seconds += elapsed
+
+            if frame.size:
+                frame.items = _ProfiledItems(frame.items, close)
+            else:
+                close()
+            return frame
+        return profiled_open
+
+    def _profile_for(self, value):
+        klass = type(value)
+        name = self._names.get(klass)
+        if name is None:
+            name = self._names[klass] = self._namer.get_class_name(value)
+        profile = self.types.get(name)
+        if profile is None:
+            profile = self.types[name] = _TypeProfile()
+        return profile
+
+    def _count_lookups(self, value, profile):
+        # Repeats the member selection of _DataTypeConversion.attribute_items(). It runs while the
+        # clock of the enclosing object is running, so the plan is not checked again per instance.
+        klass = type(value)
+        plan = self._plans.get(klass)
+        if plan is None:
+            plan = self._plans[klass] = _ClassPlan.for_class(klass)
+        try:
+            attributes_from_vars = vars(value)
+        except TypeError:
+            attributes_from_vars = {}
+        if plan.dynamic:
+            profile.dir_scans += 1
+            member_names = _ClassPlan.scan_dir(value)
+        else:
+            member_names = plan.member_names
+        profile.property_reads += sum(1 for attr in member_names if attr not in attributes_from_vars)
+
+    def rows(self, sort_by='seconds'):
+        """Returns `(class name, _TypeProfile)` pairs, largest `sort_by` first."""
+        if sort_by not in self.COLUMNS:
+            raise SmartJsonError("Unknown profile column '{}'. Expected one of: {}".format(
+                sort_by, ", ".join(self.COLUMNS)))
+        return sorted(self.types.items(), key=lambda row: (-getattr(row[1], sort_by), row[0]))
+
+    def to_dict(self):
+        return {name: profile.to_dict() for name, profile in self.types.items()}
+
+    def to_json(self, sort_by='seconds'):
+        """Returns the profile as a JSON array of per-class objects, largest `sort_by` first."""
+        rows = []
+        for name, profile in self.rows(sort_by):
+            row = OrderedDict([('class', name)])
+            row.update((column, getattr(profile, column)) for column in self.COLUMNS)
+            rows.append(row)
+        return json.dumps(rows, indent=2)
+
+    def table(self, sort_by='seconds', limit=None):
+        """Returns the profile as a text table, largest `sort_by` first, at most `limit` rows."""
+        rows = self.rows(sort_by)[:limit]
+        width = max([len('class')] + [len(name) for name, _ in rows])
+        lines = ["{:<{}}  {:>9}  {:>11}  {:>11}  {:>10}  {:>9}  {:>14}".format('class', width, *self.COLUMNS)]
+        for name, profile in rows:
+            lines.append("{:<{}}  {:>9}  {:>11.6f}  {:>11.6f}  {:>10}  {:>9}  {:>14}".format(
+                name, width, profile.count, profile.seconds, profile.own_seconds, profile.attributes,
+                profile.dir_scans, profile.property_reads))
+        return "\n".join(lines)
+
+
+def _sorted_items(items):
+    """Sorts frame items by key, keeping a profiled frame's end-of-items notification."""
+    if isinstance(items, _ProfiledItems):
+        items.items = iter(sorted(items.items, key=_item_key))
+        return items
+    return iter(sorted(items, key=_item_key))
+
+
+# --- Helper Class: _StreamEncoder ---
+class _StreamEncoder(_BaseConversion):
+    """
+    Encodes values to JSON text fragments while walking the source objects.
+
+    The conversion rules are those of _convert_value(), but each node is written out as soon as
+    it is reached instead of building the converted tree first, so memory use is bounded by the
+    nesting depth (plus the entries of the mapping being written), not by the document size.
+    The concatenated fragments equal json.dumps() of the converted tree with the same `indent`
+    and `sort_keys`.
+    """
+
+    def __init__(self, visited, indent=None, sort_keys=False, max_depth=None, track_cycles=True, node_counts=None):
+        super(_StreamEncoder, self).__init__(visited)  # Py2 super()
+        self._walk = _ConversionWalk(visited, max_depth, track_cycles, node_counts)
+        self.indent = indent
+        self.sort_keys = sort_keys
+        self.item_separator = ',' if indent is not None else ', '
+        self.key_separator = ': '
+
+    def convert(self):
+        raise NotImplementedError("_StreamEncoder produces text fragments, use the iter_* methods.")
+
+    # --- JSON-native values ---
+    @staticmethod
+    def _encode_float(value):
+        if value != value:
+            return 'NaN'
+        if value == float('inf'):
+            return 'Infinity'
+        if value == -float('inf'):
+            return '-Infinity'
+        return float.__repr__(value)
+
+    def _encode_scalar(self, value):
+        if isinstance(value, six.string_types):
+            return json.encoder.encode_basestring_ascii(value)
+        if value is None:
+            return 'null'
+        if value is True:
+            return 'true'
+        if value is False:
+            return 'false'
+        if isinstance(value, six.integer_types):
+            return int.__repr__(value)
+        if isinstance(value, float):
+            return self._encode_float(value)
+        raise TypeError("Object of type '{}' is not JSON serializable".format(type(value).__name__))
+
+    def _encode_key(self, key):
+        if isinstance(key, six.string_types):
+            return json.encoder.encode_basestring_ascii(key)
+        if isinstance(key, float):
+            return json.encoder.encode_basestring_ascii(self._encode_float(key))
+        if key is True or key is False or key is None or isinstance(key, six.integer_types):
+            return json.encoder.encode_basestring_ascii(self._encode_scalar(key))
+        raise TypeError("keys must be str, int, float, bool or None, not {}".format(type(key).__name__))
+
+    def iter_native(self, value, level=0):
+        """Encodes a value that is already JSON-ready (output of a converter)."""
+        if isinstance(value, (list, tuple)):
+            return self.iter_sequence(value, level, self.iter_native)
+        if isinstance(value, dict):
+            return self.iter_mapping(value, level, self.iter_native)
+        return iter((self._encode_scalar(value),))
+
+    # --- Containers ---
+    def iter_sequence(self, items, level, iter_item):
+        if not items:
+            yield '[]'
+            return
+        if self.indent is not None:
+            level += 1
+            newline_indent = '\n' + ' ' * (self.indent * level)
+            separator = self.item_separator + newline_indent
+            yield '[' + newline_indent
+        else:
+            newline_indent = None
+            separator = self.item_separator
+            yield '['
+        first = True
+        for item in items:
+            if first:
+                first = False
+            else:
+                yield separator
+            for chunk in iter_item(item, level):
+                yield chunk
+        if newline_indent is not None:
+            yield '\n' + ' ' * (self.indent * (level - 1))
+        yield ']'
+
+    def iter_mapping(self, mapping, level, iter_value):
+        if not mapping:
+            yield '{}'
+            return
+        if self.indent is not None:
+            level += 1
+            newline_indent = '\n' + ' ' * (self.indent * level)
+            separator = self.item_separator + newline_indent
+            yield '{' + newline_indent
+        else:
+            newline_indent = None
+            separator = self.item_separator
+            yield '{'
+        items = sorted(six.iteritems(mapping), key=lambda kv: kv[0]) if self.sort_keys else six.iteritems(mapping)
+        first = True
+        for key, value in items:
+            if first:
+                first = False
+            else:
+                yield separator
+            yield self._encode_key(key) + self.key_separator
+            for chunk in iter_value(value, level):
+                yield chunk
+        if newline_indent is not None:
+            yield '\n' + ' ' * (self.indent * (level - 1))
+        yield '}'
+
+    # --- Source values, converted on the fly ---
+    def iter_value(self, value, level=0):
+        """Encodes a source value with the rules of _convert_value()."""
+        handler, value = _TYPE_HANDLERS.resolve_value(value)
+        if handler.kind is _KIND_SCALAR:
+            return self.iter_native(handler.convert(value), level)
+        return self._iter_walk(value, handler.kind, level, True)
+
+    def iter_dict(self, dictionary, level=0):
+        # Same as _DictConversion: keys are converted with str(), the dictionary itself is not tracked.
+        return self._iter_walk(dictionary, _KIND_MAPPING, level, False)
+
+    def iter_enum(self, enum_class, level=0):
+        return self._iter_walk(enum_class, _KIND_ENUM, level, False)
+
+    def iter_top_list(self, items, level=0):
+        # Same as _ListConversion: dicts and enum classes directly in the top-level list are wrapped in a list.
+        return self._iter_walk(_ConversionWalk.top_list(items), _KIND_SEQUENCE, level, False)
+
+    def _start(self, frame, level):
+        """Prepares `frame` (a value at `level`) for encoding and returns its opening text."""
+        if frame.kind is _KIND_SEQUENCE:
+            opening, closing = '[', ']'
+        else:
+            opening, closing = '{', '}'
+            if frame.kind is not _KIND_OBJECT:
+                # Later duplicates of a converted key win, in the position of the first one
+                items = dict(frame.items)
+                frame.items = iter(sorted(six.iteritems(items), key=_item_key) if self.sort_keys
+                                   else list(six.iteritems(items)))
+            elif self.sort_keys:
+                frame.items = _sorted_items(frame.items)
+        if not frame.size:
+            return opening + closing
+        frame.level = level + 1
+        frame.count = 0
+        if self.indent is not None:
+            newline_indent = '\n' + ' ' * (self.indent * frame.level)
+            frame.separator = self.item_separator + newline_indent
+            frame.closing = '\n' + ' ' * (self.indent * level) + closing
+            return opening + newline_indent
+        frame.separator = self.item_separator
+        frame.closing = closing
+        return opening
+
+    def _iter_walk(self, value, kind, level, tracked):
+        walk = self._walk
+        resolve = walk.resolve
+        encode_key, encode_scalar, key_separator = self._encode_key, self._encode_scalar, self.key_separator
+        stack = []
+        try:
+            frame = walk.open(value, kind, 0, tracked)
+            stack.append(frame)
+            yield self._start(frame, level)
+            if not frame.size:
+                return
+            while stack:
+                frame = stack[-1]
+                is_sequence = frame.kind is _KIND_SEQUENCE
+                for key, value in frame.items:
+                    if frame.count:
+                        yield frame.separator
+                    frame.count += 1
+                    if not is_sequence:
+                        yield encode_key(key) + key_separator
+                    handler = resolve(type(value))
+                    if handler.kind is _KIND_CUSTOM:
+                        handler, value = _TYPE_HANDLERS.resolve_value(value)
+                    if handler.kind is _KIND_SCALAR:
+                        value = handler.convert(value)
+                        if isinstance(value, (list, dict)):
+                            for chunk in self.iter_native(value, frame.level):
+                                yield chunk
+                        else:
+                            yield encode_scalar(value)
+                        continue
+                    child = walk.open(value, handler.kind, len(stack))
+                    stack.append(child)
+                    yield self._start(child, frame.level)
+                    if child.size:
+                        break
+                    stack.pop()
+                    walk.release((child,))
+                else:
+                    stack.pop()
+                    walk.release((frame,))
+                    yield frame.closing
+        except SmartJsonError:
+            raise
+        except Exception as e:
+            error = walk.attribute_error(stack, e)
+            if error is e:
+                raise
+            raise error
+        finally:
+            walk.release(stack)
+
+
+def _item_key(item):
+    return item[0]
+
+
+_TYPE_HANDLERS = _TypeDispatch()
+for _klass in six.integer_types + six.string_types:  # bool is a subclass of int
+    _TYPE_HANDLERS.register(_klass, _TypeHandler(_KIND_SCALAR, _convert_unchanged))
+_TYPE_HANDLERS.register(float, _TypeHandler(_KIND_SCALAR, _convert_float))
+_TYPE_HANDLERS.register(six.binary_type, _TypeHandler(_KIND_SCALAR, _convert_bytes))
+_TYPE_HANDLERS.register(type(None), _TypeHandler(_KIND_SCALAR, _convert_none))
+_TYPE_HANDLERS.register(datetime.date, _TypeHandler(_KIND_SCALAR, _convert_date))  # and datetime.datetime
+_TYPE_HANDLERS.register(complex, _TypeHandler(_KIND_SCALAR, _convert_complex))
+for _klass in (list, tuple, deque):
+    _TYPE_HANDLERS.register(_klass, _TypeHandler(_KIND_SEQUENCE))
+_TYPE_HANDLERS.register(dict, _TypeHandler(_KIND_MAPPING))
+_TYPE_HANDLERS.register(EnumMeta, _TypeHandler(_KIND_ENUM))
+_TYPE_HANDLERS.register(object, _TypeHandler(_KIND_OBJECT))
+_TYPE_HANDLERS.register(_LazyKObject, _TypeHandler.custom(_convert_lazy_kobject))
+del _klass
+
+_REPLACED_HANDLERS = {}  # built-in handlers replaced by SmartJson.register_dumper(), restored on unregister
+_DUMPER_HANDLERS = set()  # handlers registered by SmartJson.register_dumper()
+_DUMPERS = {}  # class -> (function, json_ready) registered by SmartJson.register_dumper(), sent to batch workers
+
+
+def _register_dumper(klass, function, json_ready=False):
+    def dump(value):
+        try:
+            return function(value)
+        except SmartJsonError:
+            raise
+        except Exception as e:
+            raise SmartJsonSerializationError("Custom dumper for '{}' failed".format(type(value).__name__),
+                                              original_exception=e)
+    previous = _TYPE_HANDLERS.registered(klass)
+    if previous is not None and previous not in _DUMPER_HANDLERS:
+        _REPLACED_HANDLERS[klass] = previous
+    _DUMPER_HANDLERS.discard(previous)
+    # A JSON-ready result needs no further conversion, so the dumper is a scalar converter
+    handler = _TypeHandler(_KIND_SCALAR, dump) if json_ready else _TypeHandler.custom(dump)
+    _DUMPER_HANDLERS.add(handler)
+    _DUMPERS[klass] = (function, json_ready)
+    _TYPE_HANDLERS.register(klass, handler)
+
+
+def _has_dumper(value):
+    return _TYPE_HANDLERS.resolve(type(value)) in _DUMPER_HANDLERS
+
+
+def _unregister_dumper(klass):
+    handler = _TYPE_HANDLERS.registered(klass)
+    if handler not in _DUMPER_HANDLERS:
+        return False
+    _DUMPER_HANDLERS.discard(handler)
+    del _DUMPERS[klass]
+    replaced = _REPLACED_HANDLERS.pop(klass, None)
+    if replaced is not None:
+        _TYPE_HANDLERS.register(klass, replaced)
+    else:
+        _TYPE_HANDLERS.unregister(klass)
+    return True
+
+
+def _install_dumpers(dumpers):
+    """Makes the registered dumpers those of `dumpers`, a copy of _DUMPERS taken in another process."""
+    if dumpers == _DUMPERS:
+        return
+    for klass in [klass for klass in _DUMPERS if dumpers.get(klass) != _DUMPERS[klass]]:
+        _unregister_dumper(klass)
+    for klass, (function, json_ready) in six.iteritems(dumpers):
+        if klass not in _DUMPERS:
+            _register_dumper(klass, function, json_ready)
+
+
+# --- Helper Classes: compiled deserialization schemas ---
+_DATA_SCHEMA_TYPE_MAP = {
+    "str": six.string_types, "int": six.integer_types, "float": float,
+    "bool": bool, "list": list, "dict": dict,
+}
+
+
+def _json_type_name(value):
+    # The names used by _validate_data(), where booleans are reported as 'int'
+    if isinstance(value, six.integer_types):
+        return "int"
+    if isinstance(value, six.string_types):
+        return "str"
+    return type(value).__name__
+
+
+class _SchemaViolation(Exception):
+    """
+    Internal signal raised by compiled validators.
+
+    The failing path is collected segment by segment (innermost first) while the signal
+    propagates, so no path string is formatted unless validation actually fails.
+    """
+
+    def __init__(self, template, details, *segments):
+        super(_SchemaViolation, self).__init__(template)
+        self.template = template
+        self.details = details
+        self.segments = list(segments)
+
+    def prepend(self, segment):
+        self.segments.append(segment)
+        return self
+
+    def path(self):
+        path = ""
+        for segment in reversed(self.segments):
+            if isinstance(segment, six.integer_types):
+                path = "{}[{}]".format(path, segment)
+            else:
+                path = "{}.{}".format(path, segment) if path else segment
+        return path
+
+    def to_error(self):
+        return SmartJsonSchemaValidationError(self.template.format(self.path() or "root", *self.details))
+
+
+class _CompiledDataSchema(object):
+    """
+    Deserialization schema checked and resolved once, see SmartJson.compile_schema().
+
+    Validation gives the same results and error messages as SmartJson._validate_data(), but
+    the schema dictionary is not interpreted again for every document.
+    """
+    __slots__ = ('schema', '_fields')
+
+    _MISSING_FIELD = "Missing required field: '{}'"
+    _INVALID_DATA = "Invalid data type at '{}'. Expected a dictionary, got {}."
+    _INVALID_FIELD = "Invalid type for field '{}'. Expected '{}', got '{}'."
+    _INVALID_ITEM = "Invalid type for item at '{}'. Expected '{}', got '{}'."
+    _INVALID_ITEM_DATA = "Invalid item type at '{}'. Expected a dictionary for schema validation, got {}."
+
+    def __init__(self, schema, path=""):
+        if not isinstance(schema, dict):
+            raise SmartJsonSchemaValidationError(
+                "Invalid schema definition at '{}': schema itself must be a dictionary.".format(path))
+        self.schema = schema
+        fields = []
+        for field_name, field_props in six.iteritems(schema):
+            current_path = "{}.{}".format(path, field_name) if path else field_name
+            if not isinstance(field_props, dict):
+                raise SmartJsonSchemaValidationError(
+                    "Invalid schema definition for field '{}': properties must be a dictionary.".format(current_path))
+            type_key = expected_type = nested_schema = None
+            item_type_key = item_expected_type = item_schema = None
+            field_type_name_from_schema = field_props.get('type')
+            if field_type_name_from_schema:
+                type_key = SmartJson._get_type_str_for_type_map(field_type_name_from_schema)
+                expected_type = _DATA_SCHEMA_TYPE_MAP.get(type_key)
+                if not expected_type:
+                    raise SmartJsonSchemaValidationError(
+                        "Unknown type '{}' specified in schema for field '{}'.".format(type_key, current_path))
+                if type_key == "dict" and 'schema' in field_props:
+                    nested_schema = _CompiledDataSchema(field_props['schema'], path=current_path)
+                elif type_key == "list" and ('item_type' in field_props or 'item_schema' in field_props):
+                    item_type_name_from_schema = field_props.get('item_type')
+                    if item_type_name_from_schema:
+                        item_type_key = SmartJson._get_type_str_for_type_map(item_type_name_from_schema)
+                        item_expected_type = _DATA_SCHEMA_TYPE_MAP.get(item_type_key)
+                        if not item_expected_type:
+                            raise SmartJsonSchemaValidationError(
+                                "Unknown item_type '{}' in list schema for field '{}'.".format(item_type_key,
+                                                                                               current_path))
+                    if field_props.get('item_schema'):
+                        item_schema = _CompiledDataSchema(field_props['item_schema'], path=current_path + "[]")
+            fields.append((field_name, field_props.get('required', False), expected_type, type_key,
+                           nested_schema, item_expected_type, item_type_key, item_schema))
+        self._fields = tuple(fields)
+
+    def validate(self, data):
+        """Raise SmartJsonSchemaValidationError if `data` (parsed JSON) does not match the schema."""
+        try:
+            self._check(data)
+        except _SchemaViolation as violation:
+            six.raise_from(violation.to_error(), None)
+
+    __call__ = validate
+
+    def _check(self, data):
+        if not isinstance(data, dict):
+            raise _SchemaViolation(self._INVALID_DATA, (type(data).__name__,))
+        for (field_name, is_required, expected_type, type_key,
+             nested_schema, item_expected_type, item_type_key, item_schema) in self._fields:
+            if field_name not in data:
+                if is_required:
+                    raise _SchemaViolation(self._MISSING_FIELD, (), field_name)
+                continue
+            if expected_type is None:
+                continue
+            value = data[field_name]
+            if not isinstance(value, expected_type):
+                raise _SchemaViolation(self._INVALID_FIELD, (type_key, _json_type_name(value)), field_name)
+            if nested_schema is not None:
+                try:
+                    nested_schema._check(value)
+                except _SchemaViolation as violation:
+                    raise violation.prepend(field_name)
+            elif item_expected_type is not None or item_schema is not None:
+                for idx, item in enumerate(value):
+                    if item_expected_type is not None and not isinstance(item, item_expected_type):
+                        raise _SchemaViolation(self._INVALID_ITEM, (item_type_key, _json_type_name(item)),
+                                               idx, field_name)
+                    if item_schema is not None:
+                        if not isinstance(item, dict):
+                            raise _SchemaViolation(self._INVALID_ITEM_DATA, (type(item).__name__,), idx, field_name)
+                        try:
+                            item_schema._check(item)
+                        except _SchemaViolation as violation:
+                            raise violation.prepend(idx).prepend(field_name)
+
+
+_MISSING = object()
+
+
+def _get_key(obj, name):
+    return obj[name] if name in obj else _MISSING
+
+
+def _get_attribute(obj, name):
+    return getattr(obj, name, _MISSING)
+
+
+class _CompiledObjectSchema(object):
+    """
+    Serialization schema checked and resolved once, see SmartJson.compile_object_schema().
+
+    Validation gives the same results and error messages as SmartJson._validate_object(). Per
+    validated class the compiled schema caches how fields are read (dictionary key or attribute)
+    and whether values of that class are object-like, so the per-field work on the happy path
+    is one lookup and one isinstance() check.
+    """
+    __slots__ = ('schema', '_fields', '_accessors')
+
+    # Shared by all compiled schemas: class -> (is_dict, has __dict__ and is not a dict)
+    _value_kinds = {}
+    _MAX_CACHED_TYPES = 4096  # Bound of _value_kinds and of each schema's _accessors
+
+    _MISSING_ATTRIBUTE = "Missing required attribute/key: '{}' on object/dict of type '{}'."
+    _INVALID_ATTRIBUTE = "Invalid type for attribute/key '{}'. Expected {}, got {}."
+    _EXPECTED_LIST = "Attribute/key '{}' expected to be a list, got {}."
+    _INVALID_ITEM = "Invalid type for item at '{}'. Expected {}, got {}."
+    _INVALID_ITEM_OBJECT = "Schema for item at '{}' provided, but item type '{}' is not an object or dictionary."
+
+    _BUILTIN_TYPES = (list, dict, six.string_types, six.integer_types, float, bool)
+
+    def __init__(self, schema, path=""):
+        if not isinstance(schema, dict):
+            raise SmartJsonSchemaValidationError(
+                "Invalid schema definition at '{}': schema must be a dictionary.".format(path))
+        self.schema = schema
+        self._accessors = {}
+        fields = []
+        for field_name, field_props in six.iteritems(schema):
+            current_path = "{}.{}".format(path, field_name) if path else field_name
+            if not isinstance(field_props, dict):
+                raise SmartJsonSchemaValidationError(
+                    "Invalid schema definition for field '{}': properties must be a dictionary.".format(current_path))
+            expected_py_type = field_props.get('type') or None
+            nested_schema = item_expected_py_type = item_schema = None
+            check_items = False
+            # A class-typed field with a nested schema skips the strict type check for object values,
+            # so that the nested schema can report a more specific error.
+            defer_for_objects = 'schema' in field_props and isinstance(expected_py_type, type) and \
+                not any(expected_py_type is builtin for builtin in self._BUILTIN_TYPES)
+            if 'schema' in field_props:
+                nested_schema = _CompiledObjectSchema(field_props['schema'], path=current_path)
+            elif expected_py_type == list and ('item_type' in field_props or 'item_schema' in field_props):
+                check_items = True
+                item_expected_py_type = field_props.get('item_type') or None
+                if field_props.get('item_schema'):
+                    item_schema = _CompiledObjectSchema(field_props['item_schema'], path=current_path + "[]")
+            fields.append((field_name, field_props.get('required', False), expected_py_type, defer_for_objects,
+                           nested_schema, check_items, item_expected_py_type, item_schema))
+        self._fields = tuple(fields)
+
+    def validate(self, obj):
+        """Raise SmartJsonSchemaValidationError if `obj` (object or dict) does not match the schema."""
+        try:
+            self._check(obj)
+        except _SchemaViolation as violation:
+            six.raise_from(violation.to_error(), None)
+
+    __call__ = validate
+
+    @classmethod
+    def _kind(cls, value):
+        value_type = type(value)
+        kind = cls._value_kinds.get(value_type)
+        if kind is None:
+            is_dict = isinstance(value, dict)
+            kind = (is_dict, not is_dict and hasattr(value, '__dict__'))
+            if len(cls._value_kinds) >= cls._MAX_CACHED_TYPES:
+                cls._value_kinds.clear()  # Bounded for programs that keep creating classes
+            cls._value_kinds[value_type] = kind
+        return kind
+
+    def _check(self, obj):
+        obj_type = type(obj)
+        get_field = self._accessors.get(obj_type)
+        if get_field is None:
+            get_field = _get_key if isinstance(obj, dict) else _get_attribute
+            if len(self._accessors) >= self._MAX_CACHED_TYPES:
+                self._accessors.clear()
+            self._accessors[obj_type] = get_field
+        for (field_name, is_required, expected_py_type, defer_for_objects,
+             nested_schema, check_items, item_expected_py_type, item_schema) in self._fields:
+            value = get_field(obj, field_name)
+            if value is _MISSING:
+                if is_required:
+                    raise _SchemaViolation(self._MISSING_ATTRIBUTE, (obj_type.__name__,), field_name)
+                continue
+            is_dict, is_object = self._kind(value)
+            if expected_py_type is not None and not (defer_for_objects and is_object) and \
+                    not isinstance(value, expected_py_type):
+                raise _SchemaViolation(self._INVALID_ATTRIBUTE, (SmartJson._get_type_display_name(expected_py_type),
+                                                                 type(value).__name__), field_name)
+            if nested_schema is not None:
+                if is_dict or is_object:
+                    try:
+                        nested_schema._check(value)
+                    except _SchemaViolation as violation:
+                        raise violation.prepend(field_name)
+            elif check_items:
+                if not isinstance(value, list):
+                    raise _SchemaViolation(self._EXPECTED_LIST, (type(value).__name__,), field_name)
+                for idx, item in enumerate(value):
+                    if item_expected_py_type is not None and not isinstance(item, item_expected_py_type):
+                        raise _SchemaViolation(self._INVALID_ITEM,
+                                               (SmartJson._get_type_display_name(item_expected_py_type),
+                                                type(item).__name__), idx, field_name)
+                    if item_schema is not None:
+                        item_is_dict, item_is_object = self._kind(item)
+                        if item_is_dict or item_is_object:
+                            try:
+                                item_schema._check(item)
+                            except _SchemaViolation as violation:
+                                raise violation.prepend(idx).prepend(field_name)
+                        elif item_expected_py_type is not None:
+                            raise _SchemaViolation(self._INVALID_ITEM_OBJECT, (type(item).__name__,), idx, field_name)
+
+
+_MAX_COMPILED_SCHEMAS = 256
+_COMPILED_OBJECT_SCHEMAS = {}  # id(schema dict) -> (schema dict, copy of it, _CompiledObjectSchema or None)
+
+
+def _cached_object_schema(schema):
+    """
+    Returns the _CompiledObjectSchema of a plain serialization schema, compiled on first use.
+
+    Compiled schemas are cached per schema dict (and cache per class how fields are read). A copy
+    of the definitions is kept and compared, so a schema dict changed since is compiled again.
+    None is returned for an invalid definition, left to SmartJson._validate_object() so that it is
+    only reported when validation reaches it.
+    """
+    entry = _COMPILED_OBJECT_SCHEMAS.get(id(schema))
+    if entry is not None and entry[0] is schema and entry[1] == schema:
+        return entry[2]
+    try:
+        definitions = deepcopy(schema)
+    except Exception:  # Definitions that cannot be copied are not cached
+        return None
+    try:
+        compiled = _CompiledObjectSchema(schema)
+    except SmartJsonSchemaValidationError:
+        compiled = None
+    if len(_COMPILED_OBJECT_SCHEMAS) >= _MAX_COMPILED_SCHEMAS:
+        _COMPILED_OBJECT_SCHEMAS.clear()
+    _COMPILED_OBJECT_SCHEMAS[id(schema)] = (schema, definitions, compiled)  # Holding the dict keeps its id unique
+    return compiled
+
+
+# --- Typed deserialization ---
+# Both tables hold their keys weakly, and decoders refer to classes through weak references, so
+# neither keeps a class alive (a loader function that refers to its class does, though).
+_LOADERS = weakref.WeakKeyDictionary()  # class -> function(parsed JSON value), see SmartJson.register_loader()
+_MAX_DECODERS = 1024
+_DECODERS = weakref.WeakKeyDictionary()  # declared type -> function(parsed JSON value) returning the decoded value
+
+
+class _DecodeError(_SchemaViolation):
+    """Internal signal raised by typed decoders; the failing path is collected as for _SchemaViolation."""
+
+    def __init__(self, message, original_exception=None):
+        super(_DecodeError, self).__init__(message, ())
+        self.message = message
+        self.original_exception = original_exception
+
+    def to_error(self, target):
+        return SmartJsonDeserializationError(
+            "Cannot decode {} at '{}': {}".format(_type_label(target), self.path() or "root", self.message),
+            original_exception=self.original_exception)
+
+
+def _decoded_type_name(value):
+    return "bool" if isinstance(value, bool) else _json_type_name(value)
+
+
+def _type_label(tp):
+    return "'{}'".format(tp.__name__) if isinstance(tp, type) else "'{}'".format(tp)
+
+
+def _type_hints(cls):
+    """Returns the declared field types of `cls`: its annotations, else those of its __init__."""
+    for target in (cls, cls.__init__):
+        try:
+            hints = typing.get_type_hints(target, localns={cls.__name__: cls})  # Self references resolve
+        except Exception:  # Unresolvable forward references, or no annotations support
+            hints = dict(getattr(target, '__annotations__', None) or {})
+            hints = {name: hint for name, hint in hints.items() if not isinstance(hint, six.string_types)}
+        hints.pop('return', None)
+        if hints:
+            return hints
+    return {}
+
+
+def _get_origin(tp):
+    get_origin = getattr(typing, 'get_origin', None)
+    if get_origin is not None:
+        return get_origin(tp)
+    origin = getattr(tp, '__origin__', None)
+    if origin is None and getattr(tp, '__module__', None) == 'typing':
+        origin = tp  # An unsubscripted typing.List and the like on Python 3.6
+    # On Python 3.6 the origin of List[int] is typing.List, whose __extra__ is the builtin list
+    return getattr(origin, '__extra__', None) or origin
+
+
+def _get_args(tp):
+    get_args = getattr(typing, 'get_args', None)
+    if get_args is not None:
+        return get_args(tp)
+    return getattr(tp, '__args__', None) or ()  # None for an unsubscripted generic on Python 3.6
+
+
+# How Tuple[int, ...] spells the ellipsis in its arguments (typing._TypingEllipsis on Python 3.6)
+_TUPLE_ELLIPSES = (Ellipsis, getattr(typing, '_TypingEllipsis', Ellipsis))
+
+
+_UNION_TYPES = (typing.Union,) + ((types.UnionType,) if hasattr(types, 'UnionType') else ())
+
+
+def _decoder_for(tp):
+    """Returns the cached decoder turning parsed JSON into a value of the declared type `tp`."""
+    try:
+        return _DECODERS[tp]
+    except KeyError:
+        pass
+    except TypeError:  # Unhashable annotation, or one that cannot be weakly referenced (e.g. `int | None`)
+        return _compile_decoder(tp)
+    decoder = _compile_decoder(tp)
+    if len(_DECODERS) >= _MAX_DECODERS:
+        _DECODERS.clear()
+    _DECODERS[tp] = decoder
+    return decoder
+
+
+def _decode_unchanged(value):
+    return value
+
+
+def _empty_as_none(decode):
+    # serialize() writes None as "", so where a string is not expected "" is read back as None
+    def decode_or_none(value):
+        if isinstance(value, six.string_types) and not value:
+            return None
+        return decode(value)
+    return decode_or_none
+
+
+def _check_json_type(expected, name):
+    def decode(value):
+        if not isinstance(value, expected) or (expected is not bool and isinstance(value, bool)):
+            raise _DecodeError("expected {}, got {}".format(name, _decoded_type_name(value)))
+        return value
+    return decode
+
+
+def _decode_float(value):
+    if isinstance(value, bool) or not isinstance(value, six.integer_types + (float,)):
+        raise _DecodeError("expected float, got {}".format(_decoded_type_name(value)))
+    return float(value)
+
+
+def _decode_datetime(value):
+    if not isinstance(value, six.string_types):
+        raise _DecodeError("expected a datetime string, got {}".format(_decoded_type_name(value)))
+    if hasattr(datetime.datetime, 'fromisoformat'):
+        try:
+            return datetime.datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    for layout in (_DATETIME_FORMAT, "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.datetime.strptime(value, layout)
+        except ValueError:
+            pass
+    raise _DecodeError("invalid datetime '{}'".format(value))
+
+
+def _decode_date(value):
+    if not isinstance(value, six.string_types):
+        raise _DecodeError("expected a date string, got {}".format(_decoded_type_name(value)))
+    try:
+        return datetime.datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise _DecodeError("invalid date '{}'".format(value))
+
+
+def _decode_complex(value):
+    # serialize() writes [{"expression": ..., "real": ..., "imag": ...}]
+    if isinstance(value, list) and len(value) == 1:
+        value = value[0]
+    if isinstance(value, dict) and 'real' in value and 'imag' in value:
+        return complex(value['real'], value['imag'])
+    raise _DecodeError("expected a complex number object, got {}".format(_decoded_type_name(value)))
+
+
+def _enum_decoder(enum_class):
+    enum_ref = weakref.ref(enum_class)
+
+    def decode(value):
+        enum_class = enum_ref()
+        if isinstance(value, dict) and 'value' in value:
+            value = value['value']  # Members serialized from their attributes
+        try:
+            return enum_class(value)
+        except ValueError as e:
+            if isinstance(value, six.string_types) and not value:
+                return None  # None written as "", and "" is not a member value
+            raise _DecodeError("{!r} is not a valid {}".format(value, enum_class.__name__), original_exception=e)
+    return decode
+
+
+def _loader_decoder(cls, loader):
+    class_name = cls.__name__
+
+    def decode(value):
+        try:
+            return loader(value)
+        except SmartJsonError:
+            raise
+        except Exception as e:
+            raise _DecodeError("loader for '{}' failed".format(class_name), original_exception=e)
+    return decode
+
+
+def _sequence_decoder(container, item_type):
+    decode_item = _decoder_for(item_type)
+
+    def decode(value):
+        if not isinstance(value, list):
+            raise _DecodeError("expected array, got {}".format(_decoded_type_name(value)))
+        items = []
+        for index, item in enumerate(value):
+            try:
+                items.append(decode_item(item))
+            except _DecodeError as e:
+                raise e.prepend(index)
+        return items if container is list else container(items)
+    return decode
+
+
+def _tuple_decoder(item_types):
+    decoders = [_decoder_for(item_type) for item_type in item_types]
+
+    def decode(value):
+        if not isinstance(value, list) or len(value) != len(decoders):
+            raise _DecodeError("expected array of {} items, got {}".format(len(decoders), _decoded_type_name(value)))
+        items = []
+        for index, (decode_item, item) in enumerate(zip(decoders, value)):
+            try:
+                items.append(decode_item(item))
+            except _DecodeError as e:
+                raise e.prepend(index)
+        return tuple(items)
+    return decode
+
+
+def _mapping_decoder(container, value_type):
+    decode_value = _decoder_for(value_type)
+
+    def decode(value):
+        if not isinstance(value, dict):
+            raise _DecodeError("expected object, got {}".format(_decoded_type_name(value)))
+        items = container()
+        for key, item in six.iteritems(value):
+            try:
+                items[key] = decode_value(item)
+            except _DecodeError as e:
+                raise e.prepend(key)
+        return items
+    return decode
+
+
+def _optional_decoder(inner):
+    decode_inner = _decoder_for(inner)
+
+    def decode(value):
+        return None if value is None else decode_inner(value)
+    return decode
+
+
+_SEQUENCE_ORIGINS = {list: list, set: set, frozenset: frozenset, deque: deque}
+_SIMPLE_DECODERS = {
+    bool: _empty_as_none(_check_json_type(bool, 'boolean')),
+    float: _empty_as_none(_decode_float),
+    complex: _empty_as_none(_decode_complex),
+    datetime.datetime: _empty_as_none(_decode_datetime),
+    datetime.date: _empty_as_none(_decode_date),
+}
+for _klass in six.integer_types:
+    _SIMPLE_DECODERS[_klass] = _empty_as_none(_check_json_type(six.integer_types, 'integer'))
+for _klass in six.string_types:
+    _SIMPLE_DECODERS[_klass] = _check_json_type(six.string_types, 'string')
+del _klass
+
+
+def _compile_decoder(tp):
+    if tp in (typing.Any, object) or tp is None or tp is type(None):
+        return _decode_unchanged
+    if isinstance(tp, type) and tp in _LOADERS:
+        return _loader_decoder(tp, _LOADERS[tp])
+    origin = _get_origin(tp)
+    if origin is not None:
+        args = _get_args(tp)
+        if origin in _UNION_TYPES:
+            types_present = [arg for arg in args if arg is not type(None)]
+            if len(types_present) == 1:
+                return _optional_decoder(types_present[0])
+            return _decode_unchanged  # Ambiguous unions keep the parsed value
+        if origin in _SEQUENCE_ORIGINS:
+            return _empty_as_none(_sequence_decoder(_SEQUENCE_ORIGINS[origin], args[0] if args else typing.Any))
+        if origin is tuple:
+            if not args or (len(args) == 2 and args[1] in _TUPLE_ELLIPSES):
+                return _empty_as_none(_sequence_decoder(tuple, args[0] if args else typing.Any))
+            return _empty_as_none(_tuple_decoder(args))
+        if origin in (dict, OrderedDict):
+            return _empty_as_none(_mapping_decoder(origin, args[1] if len(args) == 2 else typing.Any))
+        return _decode_unchanged
+    if not isinstance(tp, type):
+        return _decode_unchanged
+    if tp in _SIMPLE_DECODERS:
+        return _SIMPLE_DECODERS[tp]
+    if issubclass(tp, Enum):
+        return _enum_decoder(tp)
+    if tp in _SEQUENCE_ORIGINS or tp is tuple:
+        return _empty_as_none(_sequence_decoder(_SEQUENCE_ORIGINS.get(tp, tuple), typing.Any))
+    if tp in (dict, OrderedDict):
+        return _empty_as_none(_mapping_decoder(tp, typing.Any))
+    if issubclass(tp, (six.binary_type, dict, list, tuple)):
+        return _decode_unchanged
+    return _empty_as_none(_ClassDecoder.for_class(tp).decode)
+
+
+class _ClassDecoder(object):
+    """
+    Builds instances of one class from parsed JSON objects, for `toObject(..., cls=...)`.
+
+    The decoders of the declared fields (class annotations, else __init__ annotations) are
+    compiled on first use, then each key of an object is decoded by a dict lookup; undeclared keys
+    keep their parsed value. Dataclasses are constructed through __init__; other classes are
+    created without calling __init__ and receive the decoded keys as attributes, the reverse of
+    how serialize() reads them.
+
+    The class is only weakly referenced, so that the cache does not keep it alive.
+    """
+    _cache = weakref.WeakKeyDictionary()
+
+    def __init__(self, cls):
+        self.cls_ref = weakref.ref(cls)
+        self.fields = None  # Compiled lazily, as field types may refer back to the class
+        self.init_names = None
+        self.set_attributes = None
+
+    @classmethod
+    def for_class(cls, klass):
+        decoder = cls._cache.get(klass)
+        if decoder is None:
+            decoder = cls._cache[klass] = cls(klass)
+        return decoder
+
+    def _compile(self):
+        klass = self.cls_ref()
+        dataclass_fields = getattr(klass, '__dataclass_fields__', None)
+        if dataclass_fields is not None:
+            self.init_names = frozenset(name for name, field in dataclass_fields.items() if field.init)
+        plan = _ClassPlan.for_class(klass)
+        if plan.slot_names or plan.property_names:
+            self.set_attributes = self._set_each
+        else:
+            self.set_attributes = self._update_dict
+        self.fields = {name: _decoder_for(hint) for name, hint in _type_hints(klass).items()}
+        return self.fields
+
+    @staticmethod
+    def _update_dict(instance, values):
+        instance.__dict__.update(values)
+
+    @staticmethod
+    def _set_each(instance, values):
+        for name, value in six.iteritems(values):
+            setattr(instance, name, value)
+
+    def decode(self, data):
+        cls = self.cls_ref()
+        if not isinstance(data, dict):
+            raise _DecodeError("expected object for '{}', got {}".format(cls.__name__, _decoded_type_name(data)))
+        fields = self.fields if self.fields is not None else self._compile()
+        values = {}
+        for key, value in six.iteritems(data):
+            decode = fields.get(key)
+            if decode is not None:
+                try:
+                    value = decode(value)
+                except _DecodeError as e:
+                    raise e.prepend(key)
+            values[key] = value
+        try:
+            if self.init_names is not None:
+                instance = cls(**{name: value for name, value in six.iteritems(values) if name in self.init_names})
+                values = {name: value for name, value in six.iteritems(values) if name not in self.init_names}
+            else:
+                instance = cls.__new__(cls)
+            self.set_attributes(instance, values)
+        except Exception as e:
+            raise _DecodeError("cannot construct '{}': {}".format(cls.__name__, e), original_exception=e)
+        return instance
+
+    @classmethod
+    def invalidate(cls):
+        cls._cache.clear()
+        _DECODERS.clear()
+
+
+def _decode_typed(data, target):
+    """Decodes parsed JSON `data` into the declared type `target` for toObject(..., cls=target)."""
+    if (isinstance(target, type) and isinstance(data, dict) and len(data) == 1 and target.__name__ in data
+            and target.__name__ not in _type_hints(target)):
+        data = data[target.__name__]  # The {"ClassName": {...}} wrapper written by serialize()
+    try:
+        return _decoder_for(target)(data)
+    except _DecodeError as e:
+        raise e.to_error(target)
+
+
+# --- JSON Backends ---
+class _JsonBackend(object):
+    """
+    Encodes JSON-ready values and parses JSON text with the standard library `json` module.
+
+    Subclasses wrap faster third-party libraries. Their documents parse to the same values as the
+    standard library output, though whitespace and escaping may differ. Values a library cannot
+    encode (e.g. integers beyond 64 bits or non-finite floats) are encoded by the standard library
+    instead, and input it rejects is re-parsed by the standard library, which either accepts it
+    (e.g. NaN) or raises the usual json.JSONDecodeError.
+    """
+    name = 'json'
+    parses_buffers = False  # Whether loads_buffer() parses bytes without decoding them to a str first
+
+    # Same output as json.dumps() with these options, without building an encoder per call.
+    _ENCODERS = {
+        (False, False): json.JSONEncoder(),
+        (False, True): json.JSONEncoder(sort_keys=True),
+        (True, False): json.JSONEncoder(indent=2),
+        (True, True): json.JSONEncoder(indent=2, sort_keys=True),
+    }
+
+    def dumps(self, value, pretty=False, sort_keys=False):
+        return self._ENCODERS[bool(pretty), bool(sort_keys)].encode(value)
+
+    def loads(self, text):
+        return json.loads(text)
+
+    def loads_buffer(self, buffer):
+        """Parses UTF-8 encoded JSON from a bytes-like object such as a memory map."""
+        return self.loads(str(buffer, 'utf-8'))
+
+
+# orjson reads integers outside the 64-bit range as floats. Such an integer has at least 19 digits
+# (e.g. -9223372036854775809), so text with a run of 19 digits is parsed by the standard library.
+_LONG_DIGIT_RUN = re.compile(r'[0-9]{19}')
+_LONG_DIGIT_RUN_BYTES = re.compile(br'[0-9]{19}')
+
+
+class _OrjsonBackend(_JsonBackend):
+    name = 'orjson'
+    parses_buffers = True
+
+    def __init__(self, module):
+        self._module = module
+        self._options = {}
+        for pretty in (False, True):
+            for sort_keys in (False, True):
+                option = module.OPT_NON_STR_KEYS
+                if pretty:
+                    option |= module.OPT_INDENT_2
+                if sort_keys:
+                    option |= module.OPT_SORT_KEYS
+                self._options[pretty, sort_keys] = option
+
+    def dumps(self, value, pretty=False, sort_keys=False):
+        # orjson writes NaN and infinities as null. Conversion turns them into _NonFiniteFloat, a
+        # float subclass orjson rejects, so they are encoded by the standard library; a top-level
+        # float is not converted, so it is always left to the standard library.
+        if isinstance(value, float):
+            return _JsonBackend.dumps(self, value, pretty, sort_keys)
+        try:
+            encoded = self._module.dumps(value, option=self._options[bool(pretty), bool(sort_keys)])
+        except (TypeError, ValueError, OverflowError):  # orjson.JSONEncodeError is a TypeError
+            return _JsonBackend.dumps(self, value, pretty, sort_keys)
+        return encoded.decode('utf-8')
+
+    def loads(self, text):
+        if _LONG_DIGIT_RUN.search(text):
+            return _JsonBackend.loads(self, text)
+        try:
+            return self._module.loads(text)
+        except ValueError:
+            return _JsonBackend.loads(self, text)
+
+    def loads_buffer(self, buffer):
+        with memoryview(buffer) as view:  # Released before the caller closes a memory map
+            if not _LONG_DIGIT_RUN_BYTES.search(view):
+                try:
+                    return self._module.loads(view)
+                except ValueError:
+                    pass
+            return _JsonBackend.loads_buffer(self, view)
+
+
+class _RapidjsonBackend(_JsonBackend):
+    name = 'rapidjson'
+
+    def __init__(self, module):
+        self._module = module
+
+    def dumps(self, value, pretty=False, sort_keys=False):
+        try:
+            return self._module.dumps(value, indent=2 if pretty else None, sort_keys=bool(sort_keys))
+        except (TypeError, ValueError, OverflowError):
+            return _JsonBackend.dumps(self, value, pretty, sort_keys)
+
+    def loads(self, text):
+        try:
+            return self._module.loads(text)
+        except ValueError:
+            return _JsonBackend.loads(self, text)
+
+
+class _UjsonBackend(_JsonBackend):
+    name = 'ujson'
+
+    def __init__(self, module):
+        self._module = module
+
+    def dumps(self, value, pretty=False, sort_keys=False):
+        try:
+            return self._module.dumps(value, indent=2 if pretty else 0, sort_keys=bool(sort_keys),
+                                      escape_forward_slashes=False)
+        except (TypeError, ValueError, OverflowError):
+            return _JsonBackend.dumps(self, value, pretty, sort_keys)
+
+    def loads(self, text):
+        try:
+            return self._module.loads(text)
+        except ValueError:
+            return _JsonBackend.loads(self, text)
+
+
+# Optional backends in order of preference when none is chosen explicitly; 'json' is always available.
+_OPTIONAL_JSON_BACKENDS = OrderedDict([
+    ('orjson', _OrjsonBackend),
+    ('rapidjson', _RapidjsonBackend),
+    ('ujson', _UjsonBackend),
+])
+_STDLIB_JSON_BACKEND = _JsonBackend()
+_json_backend = None  # Chosen with SmartJson.set_backend(); None selects automatically
+_fastest_json_backend = None  # Found on first use, see _get_json_backend()
+
+
+def _load_json_backend(name):
+    """Returns the backend `name`, raising ImportError if its library is not installed."""
+    if name == _JsonBackend.name:
+        return _STDLIB_JSON_BACKEND
+    return _OPTIONAL_JSON_BACKENDS[name](importlib.import_module(name))
+
+
+def _get_json_backend():
+    """Returns the chosen backend, or else the first installed optional one (falling back to 'json')."""
+    global _fastest_json_backend
+    if _json_backend is not None:
+        return _json_backend
+    if _fastest_json_backend is None:
+        for name in _OPTIONAL_JSON_BACKENDS:
+            try:
+                _fastest_json_backend = _load_json_backend(name)
+                break
+            except ImportError:
+                continue
+        else:
+            _fastest_json_backend = _STDLIB_JSON_BACKEND
+    return _fastest_json_backend
 
 
-# --- Helper Class: _JsonConvert ---
-class _JsonConvert(object):
-    def __init__(self, visited=None):
-        self.visited = visited if visited is not None else set()
+def _get_json_encoder(compact_unsorted=False):
+    """
+    Returns the backend that encodes a document.
 
-    self_dumpers = dict()
-    self_loaders = dict()
+    Unless a backend was chosen explicitly, only compact unsorted output (whose exact text callers
+    opted out of) uses the fastest backend; other output keeps the standard library formatting.
+    """
+    if _json_backend is None and not compact_unsorted:
+        return _STDLIB_JSON_BACKEND
+    return _get_json_backend()
 
-    def self_dump(self, obj):
-        class_name = self.get_class_name(obj)
-        if class_name in self.self_dumpers:
+
+# --- Incremental Array Reading ---
+_ARRAY_DECODER = json.JSONDecoder()
+_JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# A decode error this close to the end of the text read so far may only mean the element continues
+# in the next chunk (e.g. a cut-off literal or \uXXXX escape), and a number parsed this close to
+# it may continue there (e.g. "1.5e" read as 1.5).
+_TRUNCATION_MARGIN = 16
+
+
+class _ArrayElementReader(object):
+    """
+    Parses the elements of a top-level JSON array from a text file, one at a time.
+
+    Only the unparsed rest of the text read so far is kept, so memory use is bounded by the
+    largest element plus one read of `chunk_size` characters. Invalid JSON raises
+    json.JSONDecodeError whose `pos` is relative to the current buffer; add `offset` for the
+    position in the file.
+    """
+
+    def __init__(self, infile, chunk_size=65536):
+        self._infile = infile
+        self._chunk_size = chunk_size
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        self.offset = 0  # Characters dropped from the front of the buffer
+
+    def __iter__(self):
+        if self._skip_whitespace() != '[':
+            raise self._error("Expecting '[' at the start of a top-level JSON array")
+        self._pos += 1
+        if self._skip_whitespace() == ']':
+            self._pos += 1
+        else:
+            while True:
+                yield self._element()
+                char = self._skip_whitespace()
+                if char == ']':
+                    self._pos += 1
+                    break
+                if char != ',':
+                    raise self._error("Expecting ',' delimiter")
+                self._pos += 1
+        if self._skip_whitespace():
+            raise self._error("Extra data")
+
+    def _read(self):
+        """Appends the next chunk, dropping the parsed text; returns False at the end of the file."""
+        if self._eof:
+            return False
+        # Reading at least as much as is buffered keeps re-parsing a large element linear overall.
+        chunk = self._infile.read(max(self._chunk_size, len(self._buffer) - self._pos))
+        if not chunk:
+            self._eof = True
+            return False
+        self.offset += self._pos
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _skip_whitespace(self):
+        """Returns the next non-whitespace character, or '' at the end of the file."""
+        while True:
+            self._pos = _JSON_WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._read():
+                return ''
+
+    def _error(self, message):
+        return json.JSONDecodeError(message, self._buffer, self._pos)
+
+    def _element(self):
+        if not self._skip_whitespace():
+            raise self._error("Expecting value")
+        while True:
             try:
-                return self.self_dumpers[class_name](self, obj)
-            except Exception as e:
-                raise SmartJsonSerializationError("Custom dumper for '{}' failed".format(class_name),
-                                                  original_exception=e)
-        raise SmartJsonUnsupportedTypeError(
-            "Object of type '{}' is not JSON serializable with a custom dumper and no default path available in self_dump.".format(
-                class_name))
+                value, end = _ARRAY_DECODER.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError as e:
+                truncated = e.pos >= len(self._buffer) - _TRUNCATION_MARGIN or e.msg.startswith("Unterminated string")
+                if truncated and self._read():
+                    continue
+                raise
+            if end < len(self._buffer) - _TRUNCATION_MARGIN or not self._read():
+                self._pos = end
+                return value
 
-    def json_convert(self, obj):
-        if isinstance(obj, (int, float, bool, six.string_types, type(None), six.binary_type, datetime.date,
-                            datetime.datetime, complex)):
-            if isinstance(obj, six.binary_type): return obj.decode("utf-8")
-            if isinstance(obj, type(None)): return ""
-            if isinstance(obj, (datetime.datetime, datetime.date)): return str(obj)
-            if isinstance(obj, complex): return [{'expression': str(obj), 'real': obj.real, 'imag': obj.imag}]
-            return obj
-        obj_id = id(obj)
-        if obj_id in self.visited:
-            raise SmartJsonCircularDependencyError(
-                "Circular dependency detected in json_convert for object type '{}' (id: {})".format(type(obj).__name__,
-                                                                                                    obj_id),
-                object_id=obj_id
-            )
-        self.visited.add(obj_id)
+
+# Smallest default chunk for SmartJson.serialize_many(): fewer objects per task cost more in
+# pickling and scheduling than the worker saves.
+_PARALLEL_MIN_CHUNK = 64
+# Seconds to wait for a worker's chunk before serializing it in this process and giving up on the pool
+_PARALLEL_CHUNK_TIMEOUT = 60.0
+
+
+def _batch_options(pretty, schema, assume_acyclic, sort_keys, max_depth):
+    """
+    Packs the serialize() options for _serialize_chunk(), including a backend pinned with
+    set_backend() and the dumpers registered with register_dumper().
+    """
+    return (pretty, schema, assume_acyclic, sort_keys, max_depth,
+            _json_backend.name if _json_backend is not None else None, dict(_DUMPERS))
+
+
+def _serialize_chunk(objects, options, collect_errors=False):
+    """
+    Serializes `objects` in order for the batch APIs; runs in a worker process.
+
+    With `collect_errors=True` the SmartJsonError of a failing object takes the place of its JSON
+    string instead of being raised.
+    """
+    global _json_backend
+    pretty, schema, assume_acyclic, sort_keys, max_depth, backend_name, dumpers = options
+    # Spawned workers start without the parent's pinned backend and dumpers
+    if backend_name is not None and (_json_backend is None or _json_backend.name != backend_name):
+        _json_backend = _load_json_backend(backend_name)
+    _install_dumpers(dumpers)
+    documents = []
+    for obj in objects:
         try:
-            if isinstance(obj, OrderedDict):
-                try:
-                    return self.self_dump(obj)
-                except SmartJsonUnsupportedTypeError:
-                    return {k: self.json_convert(v) for k, v in six.iteritems(obj)}
-            elif isinstance(obj, dict):
-                return {k: self.json_convert(v) for k, v in six.iteritems(obj)}
-            elif isinstance(obj, (list, tuple)):
-                return list((self.json_convert(v) for v in obj))
-            elif hasattr(obj, "__class__"):  # Fallback for custom objects
-                # _DataTypeConversion needs to be defined at module level or passed in
-                return _DataTypeConversion(obj, self.visited).convert().__dict__
-            try:  # Final fallback attempt with self_dump
-                return self.self_dump(obj)
-            except SmartJsonUnsupportedTypeError:
-                return obj  # If all else fails, return obj and let json.dumps handle it
-        finally:
-            if obj_id in self.visited:
-                self.visited.remove(obj_id)
+            documents.append(SmartJson(obj, max_depth=max_depth).serialize(pretty, schema, assume_acyclic, sort_keys))
+        except SmartJsonError as e:
+            if not collect_errors:
+                raise
+            documents.append(e)
+    return documents
 
-    def iter_items(self, d, **kw):
-        return six.iteritems(d, **kw)
 
-    def get_class_name(self, obj):
-        return obj.__class__.__module__ + "." + obj.__class__.__name__
+def _serialize_pickled_chunk(payload, collect_errors=False):
+    objects, options = pickle.loads(payload)
+    return _serialize_chunk(objects, options, collect_errors)
 
 
-# --- Helper Class: _BaseConversion ---
-class _BaseConversion(object):
-    def __init__(self, visited):
-        self.visited = visited
-        self._json_cvt = _JsonConvert(self.visited)  # Use module-level _JsonConvert
+def _pickle_chunk(chunk, options):
+    """Returns `chunk` and `options` pickled for a worker, or None if they cannot be pickled."""
+    try:
+        return pickle.dumps((chunk, options), pickle.HIGHEST_PROTOCOL)
+    except Exception:  # PicklingError, or whatever a __reduce__ raises
+        return None
 
-    def serialize(self, pretty):
-        if pretty:
-            return json.dumps(self.convert(), indent=2, sort_keys=True)
-        else:
-            return json.dumps(self.convert())
 
-    def convert(self):
-        raise NotImplementedError("Subclasses must implement the convert() method.")
+def _serialize_chunks(objects, options, workers=None, chunksize=None, collect_errors=False):
+    """
+    Yields the `_serialize_chunk()` results for consecutive chunks of `objects`, in order.
+
+    The chunks are serialized by a pool of `workers` processes (default: one per CPU), or in this
+    process when `workers=1` or all objects fit in one chunk. Chunks are pickled here before they
+    are submitted (a chunk failing in the executor's own pickling would never complete on Python
+    3.6); chunks that cannot be pickled, whose worker dies, or that take longer than
+    _PARALLEL_CHUNK_TIMEOUT are serialized in this process. After a timeout the pool is abandoned
+    and the remaining chunks are serialized here too.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise SmartJsonSerializationError("workers must be at least 1, got {}".format(workers))
+    if chunksize is None:
+        chunksize = max(_PARALLEL_MIN_CHUNK, -(-len(objects) // (workers * 4)))
+    elif chunksize < 1:
+        raise SmartJsonSerializationError("chunksize must be at least 1, got {}".format(chunksize))
+    chunks = [objects[start:start + chunksize] for start in range(0, len(objects), chunksize)]
+    if workers == 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            yield _serialize_chunk(chunk, options, collect_errors)
+        return
+
+    payloads = [_pickle_chunk(chunk, options) for chunk in chunks]
+    if not any(payloads):
+        for chunk in chunks:
+            yield _serialize_chunk(chunk, options, collect_errors)
+        return
+
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=min(workers, sum(map(bool, payloads))))
+    futures, timed_out = [], False
+    try:
+        futures = [executor.submit(_serialize_pickled_chunk, payload, collect_errors) if payload else None
+                   for payload in payloads]
+        for chunk, future in zip(chunks, futures):
+            documents = None
+            if future is not None and not timed_out:
+                try:
+                    documents = future.result(timeout=_PARALLEL_CHUNK_TIMEOUT)
+                except SmartJsonError:
+                    raise
+                except concurrent.futures.TimeoutError:
+                    timed_out = True
+                except Exception:
+                    pass  # The worker process died or could not unpickle the chunk
+            if documents is None:
+                documents = _serialize_chunk(chunk, options, collect_errors)
+            yield documents
+    finally:  # Also on GeneratorExit when the consumer stops early
+        for future in futures:
+            if future is not None:
+                future.cancel()
+        executor.shutdown(wait=not timed_out)
 
-    def _convert_value(self, value):
-        # Handle primitives and direct _JsonConvert cases first (no separate visited handling needed for these)
-        if isinstance(value, (int, float, bool, six.string_types, type(None), six.binary_type, datetime.date,
-                              datetime.datetime, complex)):
-            if isinstance(value, six.binary_type): return value.decode("utf-8")
-            if isinstance(value, type(None)): return ""
-            # datetime.date, datetime.datetime, complex are handled by _json_cvt
-            if isinstance(value, (datetime.datetime, datetime.date, complex)):
-                return self._json_cvt.json_convert(value)
-            return value # Basic primitives (int, float, bool, str)
-
-        obj_id = id(value)
-        if obj_id in self.visited:
-            raise SmartJsonCircularDependencyError(
-                "Circular dependency detected in _convert_value for object type '{}' (id: {})".format(
-                    type(value).__name__, obj_id),
-                object_id=obj_id
-            )
 
-        # Check for custom objects to be delegated to _DataTypeConversion
-        # This delegation means _DataTypeConversion will handle adding value's ID to its *own* visited set.
-        if not isinstance(value, (list, tuple, dict, six.string_types, int, float, bool, type(None),
-                                   datetime.date, datetime.datetime, complex, six.binary_type)) and \
-           self._json_cvt.get_class_name(value) not in ["collections.deque", "enum.EnumMeta"] and \
-           hasattr(value, "__class__"):
-            # _DataTypeConversion takes the original self.visited.
-            # It is responsible for adding id(value) to it for its own scope.
-            return _DataTypeConversion(value, self.visited).convert().__dict__
-
-        # For types that _convert_value processes recursively (lists, dicts, etc.)
-        # or delegates to other converters that also take self.visited (_EnumConversion, _DictConversion for deque)
-        self.visited.add(obj_id)
-        try:
-            if isinstance(value, (list, tuple)):
-                return list((self._convert_value(v) for v in value))
-            elif self._json_cvt.get_class_name(value) == "collections.deque":
-                # _json_cvt.json_convert will handle its own visited set for internal items if needed,
-                # but the deque itself (obj_id) is now in self.visited.
-                # OrderedDict conversion is to make it serializable by json.dumps if it contains complex items.
-                # The _DictConversion call here was likely an error from previous refactoring,
-                # as deques are usually converted to lists or handled by json_convert directly.
-                # Reverting to a simpler, more direct conversion for deque.
-                # Let's assume json_convert can handle an OrderedDict of converted items.
-                return self._json_cvt.json_convert(OrderedDict((k, self._convert_value(v)) for k, v in value.items()) if isinstance(value, OrderedDict) else list((self._convert_value(v) for v in value)))
-
-            elif self._json_cvt.get_class_name(value) == "enum.EnumMeta":
-                # _EnumConversion takes self.visited and will manage its own internal state based on it.
-                return _EnumConversion(value, self.visited).convert()
-            elif isinstance(value, dict):
-                # _DictConversion takes self.visited.
-                return _DictConversion(value, self.visited).convert()
-            # Fallback if no other condition matched (should ideally not be reached if logic is exhaustive)
-            return value
-        finally:
-            if obj_id in self.visited:
-                self.visited.remove(obj_id)
+def _write_text_file(filepath, text):
+    with io.open(filepath, 'w', encoding='utf-8') as outfile:
+        outfile.write(text)
 
 
-# --- Helper Class: _DataTypeConversion ---
-class _DataTypeConversion(_BaseConversion):
-    def __init__(self, cls, visited):
-        super(_DataTypeConversion, self).__init__(visited)  # Py2 super()
-        self.___cls = cls
+# SmartJson.aiterencode() checks its time budget once per this many fragments.
+_TIME_CHECK_INTERVAL = 32
 
-    def convert(self):
-        obj_id = id(self.___cls)
-        if obj_id in self.visited:
-            raise SmartJsonCircularDependencyError(
-                "Circular dependency detected for object of type '{}' (id: {})".format(type(self.___cls).__name__,
-                                                                                       obj_id),
-                object_id=obj_id
-            )
-        self.visited.add(obj_id)
-        try:
-            return self.__convert_attributes(self.___cls)
-        except SmartJsonError:
-            raise
-        except Exception as e:
-            raise SmartJsonSerializationError("Error converting attributes for '{}'".format(type(self.___cls).__name__),
-                                              original_exception=e)
-        finally:
-            if obj_id in self.visited:
-                self.visited.remove(obj_id)
 
-    def __convert_attributes(self, cls_obj):
-        processed_attrs = set()
-        # Convert attributes from vars() first
-        # Note: vars() might not include all attributes, e.g. if __slots__ is used,
-        # or for properties.
-        try:
-            attributes_from_vars = vars(cls_obj)
-            for attr, value in six.iteritems(attributes_from_vars):
-                if not isinstance(value, (int, float, bool, six.string_types)):
-                    converted_value = self._convert_value(value)
-                    cls_obj.__setattr__(attr, converted_value)
-                # else: simple types are left as is, or handled by setattr if needed later
-                # Forcing setattr for all to ensure consistency if cls_obj is modified:
-                # elif isinstance(value, (int, float, bool, six.string_types)):
-                #    cls_obj.__setattr__(attr, value) # Ensure it's on the instance if vars() was from class
-                processed_attrs.add(attr)
-        except TypeError: # vars() can fail on some objects (like those with __slots__ and no __dict__)
-            pass
+# --- Operation statistics ---
+_STATS_HOOKS = []  # callbacks registered with SmartJson.add_stats_hook()
 
 
-        # Discover and process properties and other attributes not in vars()
-        # This part is crucial for including properties in serialization
-        # and for triggering property getters that might raise exceptions (as in the test).
-        for attr in dir(cls_obj):
-            # Skip dunder methods/attributes, private-like ones (by convention), and those already processed
-            if attr.startswith('__') or attr in processed_attrs:
-                continue
+class _OperationStats(object):
+    """
+    Statistics of one SmartJson operation, passed to the stats hooks once it has completed.
 
-            # Skip attributes starting with a single underscore followed by the class name
-            # and then double underscore (name mangling for "private" class attributes)
-            # Example: _MyClass__private_var
-            if attr.startswith('_' + cls_obj.__class__.__name__ + '__'):
-                continue
+    Attributes:
+        operation (str): 'serialize', 'serializeToJsonFile', 'toObject' or 'toObjectFromFile'.
+        phases (OrderedDict): Wall time in seconds per phase, in the order the phases ran: 'copy'
+            (the deep copy taken by `SmartJson(obj, deep_copy=True)`), 'validate', 'convert',
+            'encode' and 'write' when serializing; 'read', 'parse', 'validate' and 'build' when
+            deserializing. Streamed file output converts while encoding, so its conversion time is
+            part of 'encode'.
+        node_counts (dict): Number of values per type name: the source values visited by the
+            conversion when serializing, the parsed JSON values when deserializing.
+        bytes (int): Size in bytes of the UTF-8 JSON produced or consumed (None for dictionary input).
+        path (str): The file written or read, for the file operations.
+    """
+    enabled = True
 
-            try:
-                value = getattr(cls_obj, attr)
-                if callable(value): # Skip methods
-                    continue
+    def __init__(self, operation):
+        self.operation = operation
+        self.phases = OrderedDict()
+        self.node_counts = {}
+        self.bytes = None
+        self.path = None
+        self._last = time.perf_counter()
 
-                # Value is from a property or public field not in vars().
-                # Convert complex types; simple types can be set directly or handled by _convert_value.
-                if not isinstance(value, (int, float, bool, six.string_types)):
-                    converted_value = self._convert_value(value) # This call can raise (e.g. bad_prop)
-                    cls_obj.__setattr__(attr, converted_value)
-                else:
-                    # For simple types obtained via getattr (e.g. properties returning simple types),
-                    # ensure they are also set on the object if the goal is to modify cls_obj in place.
-                    # However, the primary goal of _DataTypeConversion is to prepare the object's
-                    # __dict__ for json.dumps. If cls_obj is the direct source of __dict__, this is fine.
-                    cls_obj.__setattr__(attr, value)
+    @property
+    def total(self):
+        """Wall time of all phases, in seconds."""
+        return sum(self.phases.values())
 
-            except AttributeError:
-                # Some attributes listed by dir() might not be accessible via getattr()
-                # (e.g. due to descriptor protocol or specific object configurations).
-                # It's generally safe to skip these for serialization purposes.
-                continue
-            # Let other exceptions from getattr (like ValueError from bad_prop)
-            # or from _convert_value propagate to be caught by the .convert() method's handler.
+    def mark(self, phase):
+        """Attributes the time since the previous mark to `phase`."""
+        now = time.perf_counter()
+        self.add(phase, now - self._last)
+        self._last = now
 
-        return cls_obj
+    def add(self, phase, seconds):
+        """Attributes `seconds` to `phase`; they are not counted again by the next mark()."""
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+        self._last += seconds
 
+    def count(self, value):
+        name = type(value).__name__
+        self.node_counts[name] = self.node_counts.get(name, 0) + 1
 
-# --- Helper Class: _ListConversion ---
-class _ListConversion(_BaseConversion):
-    def __init__(self, myList, visited):
-        super(_ListConversion, self).__init__(visited)  # Py2 super()
-        self.__myList = deepcopy(myList)
+    def count_json(self, data):
+        """Counts the values of the parsed JSON `data`."""
+        pending = [data]
+        while pending:
+            value = pending.pop()
+            self.count(value)
+            if isinstance(value, dict):
+                pending.extend(six.itervalues(value))
+            elif isinstance(value, list):
+                pending.extend(value)
 
-    def convert(self):
-        convert_result = []
-        for item in self.__myList:
-            converted_item = self._convert_value(item)
-            # Original logic for wrapping dicts/enums in list was specific to direct list items
-            if isinstance(item, dict) and not isinstance(converted_item, list) and \
-                    self._json_cvt.get_class_name(item) != "enum.EnumMeta":  # Don't double-wrap converted enums
-                # This wrapping was specific and might need review if it was for specific scenarios
-                # For now, replicating closely. Enums are handled by _convert_value returning dicts.
-                convert_result.append([converted_item])
-            elif self._json_cvt.get_class_name(item) == "enum.EnumMeta" and not isinstance(converted_item, list):
-                # _convert_value for EnumMeta calls _EnumConversion().convert() which returns a dict.
-                # This dict was then wrapped in a list by original _ListConversion.
-                convert_result.append([converted_item])
-            else:
-                convert_result.append(converted_item)
-        return convert_result
+    def to_dict(self):
+        return {'operation': self.operation, 'phases': dict(self.phases), 'total': self.total,
+                'node_counts': dict(self.node_counts), 'bytes': self.bytes, 'path': self.path}
 
+    def report(self):
+        for hook in list(_STATS_HOOKS):
+            hook(self)
 
-# --- Helper Class: _DictConversion ---
-class _DictConversion(_BaseConversion):
-    def __init__(self, dictionary, visited):
-        super(_DictConversion, self).__init__(visited)  # Py2 super()
-        # Store the original dictionary reference. Conversion happens in .convert()
-        self._original_dict = dictionary
-        # __data will store the converted dictionary contents.
-        # No deepcopy of the initial dictionary here to avoid premature recursion errors.
-        self.__data = {}
+    def __repr__(self):
+        return "<_OperationStats {} {:.6f}s>".format(self.operation, self.total)
 
 
-    def convert(self):
-        # Iterate over the original dictionary.
-        # self.visited from _BaseConversion is used by self._convert_value to detect cycles.
-        for key, value in six.iteritems(self._original_dict):
-            # JSON keys must be strings. Convert key to string if not already.
-            # Simple types in keys (int, etc.) are usually fine if str() is applied.
-            # Complex objects as keys are not standard JSON and would require
-            # a specific string representation strategy if needed.
-            converted_key = str(key)
-
-            # self._convert_value is cycle-aware due to its own usage of self.visited
-            converted_value = self._convert_value(value)
-            self.__data[converted_key] = converted_value
-
-        # The original logic for EnumMeta special handling:
-        # "if self._json_cvt.get_class_name(value) == "enum.EnumMeta" and \
-        #         not isinstance(self.__data[key], list):
-        #     self.__data[key] = [self.__data[key]]"
-        # This logic seems problematic:
-        # 1. It iterates `self.__data` which might have stringified keys, while `value` is from `_original_dict`.
-        # 2. `_convert_value` should already handle Enum conversion appropriately via `_EnumConversion`.
-        #    If _EnumConversion returns a dict, and that dict needs to be wrapped in a list
-        #    if it's a direct value in the output dict, that's a very specific requirement
-        #    that should ideally be handled more consistently or at a higher level.
-        # For now, removing this specific EnumMeta re-wrapping from _DictConversion,
-        # assuming _EnumConversion and _convert_value handle enums sufficiently.
-        # If specific list-wrapping of enums appearing as dict values is needed,
-        # it might require a different approach in how enums are identified and processed.
-        return self.__data
+class _NullStats(object):
+    """Stands in for _OperationStats while no stats hook is registered, so the bookkeeping costs a no-op call."""
+    enabled = False
+    node_counts = None
 
+    def mark(self, phase):
+        pass
 
-# --- Helper Class: _EnumConversion ---
-class _EnumConversion(object):
-    def __init__(self, myEnum, visited):
-        self.__myEnum = deepcopy(myEnum)
-        self.visited = visited
-        self._json_cvt = _JsonConvert(self.visited)  # Use module-level _JsonConvert
+    def add(self, phase, seconds):
+        pass
 
-    def serialize(self, pretty):
-        if pretty:
-            return json.dumps(self.convert(), indent=2, sort_keys=True)
-        else:
-            return json.dumps(self.convert())
+    def report(self):
+        pass
 
-    def convert(self):
-        if self._json_cvt.get_class_name(self.__myEnum) == "enum.EnumMeta":
-            converts = {}
-            for attr, value in six.iteritems(vars(self.__myEnum)):
-                if "_member_names_" == attr:
-                    for member_name in value:
-                        enum_member_value = self.__myEnum[member_name].value
-                        converts[member_name] = enum_member_value
-            return _DictConversion(converts, self.visited).convert()  # Use module-level _DictConversion
-        else:
-            raise SmartJsonUnsupportedTypeError(
-                "Type '{}' is not a directly serializable enum. Expected 'enum.EnumMeta'.".format(
-                    type(self.__myEnum).__name__))
+
+_NULL_STATS = _NullStats()
+
+
+def _start_stats(operation):
+    return _OperationStats(operation) if _STATS_HOOKS else _NULL_STATS
+
+
+# How serialize() and iterencode() write a top-level value, see SmartJson._root_kind()
+_ROOT_MAPPING = 'mapping'
+_ROOT_LIST = 'list'
+_ROOT_NATIVE = 'native'  # JSON scalars, written as they are
+_ROOT_CONVERTED = 'converted'  # converted as a nested value would be, then written unwrapped
+_ROOT_ENUM = 'enum'
+_ROOT_WRAPPED = 'wrapped'  # {"ClassName": converted value}
 
 
 # --- Main SmartJson Class ---
 class SmartJson(object):
-    def __init__(self, cls=None):
+    def __init__(self, cls=None, deep_copy=False, max_depth=None):
+        """
+        Args:
+            cls: The object, dictionary, list or value to serialize (optional for deserialization only).
+            deep_copy (bool): Serialize from a deep copy of `cls` taken now instead of reading `cls`
+                itself at serialization time. The conversion never modifies `cls`, so this is only
+                needed to snapshot objects that may change before `serialize()` is called.
+            max_depth (int): Maximum nesting depth of containers and objects (default 10000).
+                Deeper data raises SmartJsonSerializationError. Conversion does not recurse, so the
+                limit is independent of the interpreter recursion limit.
+        """
+        self.max_depth = max_depth
         self.__copy = cls
         self.__deepcopy_error = None
-        try:
-            self.__classe = deepcopy(cls)
-        except TypeError as e:
-            self.__deepcopy_error = e
-            self.__classe = cls  # Fallback to original object
+        self.__copy_seconds = None
+        self.__classe = cls
+        if deep_copy:
+            start = time.perf_counter() if _STATS_HOOKS else None
+            try:
+                self.__classe = deepcopy(cls)
+            except TypeError as e:
+                self.__deepcopy_error = e
+                self.__classe = cls  # Fallback to original object
+            if start is not None:
+                self.__copy_seconds = time.perf_counter() - start
         self.___obj = None
         if cls:
             self.classname = cls.__class__.__name__
 
-    def serialize(self, pretty=True, schema=None):
+    @staticmethod
+    def set_backend(name=None):
+        """
+        Selects the library used to encode and parse JSON: 'json' (the standard library), 'orjson',
+        'rapidjson' or 'ujson'. Returns the name of the selected backend.
+
+        With `name=None` (the default) the first of orjson, rapidjson and ujson that is installed
+        is used for parsing and for compact unsorted output (`serialize(pretty=False,
+        sort_keys=False)`), falling back to 'json'; all other output is encoded by the standard
+        library so its text does not change. All backends produce documents that parse to the same
+        values, but whitespace and escaping may differ from the standard library output.
+        """
+        global _json_backend
+        if name is None:
+            _json_backend = None
+            return _get_json_backend().name
+        if name != _JsonBackend.name and name not in _OPTIONAL_JSON_BACKENDS:
+            raise SmartJsonError("Unknown JSON backend '{}'. Expected one of: {}".format(
+                name, ", ".join([_JsonBackend.name] + list(_OPTIONAL_JSON_BACKENDS))))
+        try:
+            _json_backend = _load_json_backend(name)
+        except ImportError as e:
+            raise SmartJsonError("JSON backend '{}' is not installed".format(name), original_exception=e)
+        return _json_backend.name
+
+    @staticmethod
+    def get_backend():
+        """Returns the name of the JSON backend used for parsing (see `set_backend()`)."""
+        return _get_json_backend().name
+
+    @staticmethod
+    def add_stats_hook(callback):
+        """
+        Registers `callback` to be called with the statistics of every completed `serialize()`,
+        `serializeToJsonFile()`, `toObject()` and `toObjectFromFile()` call, and returns it (so it
+        can be used as a decorator).
+
+        The statistics object has the attributes `operation`, `phases` (wall time in seconds per
+        phase: 'copy', 'validate', 'convert', 'encode' and 'write' when serializing, 'read',
+        'parse', 'validate' and 'build' when deserializing), `total`, `node_counts` (values per type
+        name), `bytes` (size of the UTF-8 JSON produced or consumed) and `path` (the file, if any),
+        and `to_dict()`. Callbacks run on the thread of the operation and their exceptions
+        propagate to its caller. While no callback is registered nothing is measured.
+        """
+        _STATS_HOOKS.append(callback)
+        return callback
+
+    @staticmethod
+    def remove_stats_hook(callback):
+        """Unregisters a callback registered with `add_stats_hook()`; unknown callbacks are ignored."""
+        try:
+            _STATS_HOOKS.remove(callback)
+        except ValueError:
+            pass
+
+    @staticmethod
+    def register_dumper(klass, function=None, json_ready=False):
+        """
+        Registers `function(obj)` to serialize instances of `klass` and of its subclasses.
+
+        The function returns a replacement value that is converted in turn (nested objects, dates
+        and so on are handled as usual), so objects of hot classes skip the attribute discovery of
+        the generic object path. With `json_ready=True` the result must already consist of dicts
+        with string keys, lists, strings, numbers, booleans and None only; it is then used as is,
+        without walking it or tracking cycles, which is the fastest way to serialize a hot class.
+        Registered dumpers are looked up before any other conversion rule, and the most specific
+        class along the MRO wins; lookups are cached per type. Top-level objects keep their
+        `{"ClassName": ...}` wrapper around the dumped value. Without `function`, returns a
+        decorator:
+
+            @SmartJson.register_dumper(Money)
+            def dump_money(money):
+                return {"amount": str(money.amount), "currency": money.currency}
+
+        Exceptions raised by the function are reported as SmartJsonSerializationError.
+        """
+        if not isinstance(klass, type):
+            raise SmartJsonError("register_dumper() expects a class, got {}".format(type(klass).__name__))
+        if function is None:
+            def decorator(function):
+                _register_dumper(klass, function, json_ready)
+                return function
+            return decorator
+        _register_dumper(klass, function, json_ready)
+        return function
+
+    @staticmethod
+    def unregister_dumper(klass):
+        """
+        Removes the dumper registered for `klass` with `register_dumper()`, restoring the built-in
+        conversion if it replaced one. Returns whether a dumper was registered.
+        """
+        return _unregister_dumper(klass)
+
+    @staticmethod
+    def register_loader(klass, function=None):
+        """
+        Registers `function(value)` to build instances of `klass` from parsed JSON values when
+        decoding with `toObject(..., cls=...)`, for the top-level value and for every field,
+        list item or dict value declared with type `klass`. Without `function`, returns a
+        decorator. Loaders apply to `klass` itself; subclasses are decoded from their own
+        declarations. Exceptions raised by the function are reported as
+        SmartJsonDeserializationError. The loader receives the parsed value as is, including the
+        "" that `serialize()` writes for None.
+
+        The registration lasts until `unregister_loader(klass)`, or until `klass` is garbage
+        collected: the registry holds the class weakly, though a function referring to `klass`
+        keeps it alive.
+        """
+        if not isinstance(klass, type):
+            raise SmartJsonError("register_loader() expects a class, got {}".format(type(klass).__name__))
+        if function is None:
+            def decorator(function):
+                SmartJson.register_loader(klass, function)
+                return function
+            return decorator
+        _LOADERS[klass] = function
+        _ClassDecoder.invalidate()  # Compiled decoders may refer to the previous way of building klass
+        return function
+
+    @staticmethod
+    def unregister_loader(klass):
+        """Removes the loader registered for `klass`; returns whether one was registered."""
+        if _LOADERS.pop(klass, None) is None:
+            return False
+        _ClassDecoder.invalidate()
+        return True
+
+    @staticmethod
+    def profile():
+        """
+        Returns a context manager profiling the conversion of custom objects per class while active.
+
+        Inside `with SmartJson.profile() as profile:` every custom object converted (by any
+        serialization method, on any thread) is aggregated under its fully qualified class name:
+        instances converted, cumulative seconds including nested values, seconds excluding nested
+        custom objects, attributes serialized, per-instance dir() scans, and class-level members
+        read through getattr(). `profile.table(sort_by='seconds', limit=None)` and
+        `profile.to_json(sort_by='seconds')` export them sorted; `profile.rows()` and
+        `profile.to_dict()` return them as objects. Profiling slows conversion down; outside of it
+        the conversion is not instrumented.
+        """
+        return _ConversionProfiler()
+
+    def _start_stats(self, operation):
+        stats = _start_stats(operation)
+        if stats.enabled:
+            if self.__copy_seconds is not None:
+                stats.phases['copy'] = self.__copy_seconds
+            stats.count(self.__classe)
+        return stats
+
+    def serialize(self, pretty=True, schema=None, assume_acyclic=False, sort_keys=None):
+        """
+        Returns the JSON string for the object.
+
+        `sort_keys` overrides whether object keys are sorted; by default pretty output and objects
+        are sorted while compact dictionaries and lists keep their key order. `pretty=False,
+        sort_keys=False` is the fast path for machine-to-machine use: it is encoded by the fastest
+        installed backend (see `set_backend()`), so its exact formatting depends on that backend.
+
+        With `assume_acyclic=True` the data is trusted to contain no reference cycles and the
+        per-node cycle bookkeeping is skipped, which is faster for tree-shaped data such as DTOs.
+        A cycle is then reported as SmartJsonCircularDependencyError once the nesting depth
+        exceeds `max_depth`.
+        """
+        stats = self._start_stats('serialize')
+        serialized = self._serialize_text(pretty, schema, assume_acyclic, sort_keys, stats)
+        if stats.enabled:
+            stats.bytes = len(serialized.encode('utf-8'))
+        stats.report()
+        return serialized
+
+    def _check_deepcopy(self):
         if self.__deepcopy_error:
             raise SmartJsonSerializationError(
                 "Error during initial object copying (deepcopy) that may affect serialization.",
                 original_exception=self.__deepcopy_error
             )
+
+    def _serialize_text(self, pretty, schema, assume_acyclic, sort_keys, stats):
+        self._check_deepcopy()
         if schema:
-            SmartJson._validate_object(self.__classe, schema)
+            SmartJson._check_object(self.__classe, schema)
+            stats.mark('validate')
         visited_set = set()
         try:
-            if isinstance(self.__classe, dict):
-                return _DictConversion(self.__classe, visited_set).serialize(pretty)
-            elif isinstance(self.__classe, list):
-                return _ListConversion(self.__classe, visited_set).serialize(pretty)
-            elif isinstance(self.__classe, (int, float, bool, six.string_types, type(None))):
-                if pretty:
-                    return json.dumps(self.__classe, indent=2, sort_keys=True)
-                else:
-                    return json.dumps(self.__classe, sort_keys=True)
-            elif isinstance(self.__classe, (tuple, complex, datetime.date, datetime.datetime, OrderedDict)):
-                # Create a _JsonConvert instance for this serialization call
-                # It will get its own visited set copy if _BaseConversion does it, or use the passed one.
-                # The _JsonConvert instance within _BaseConversion is preferred.
-                # For direct calls like this, we need a _JsonConvert.
-                temp_json_cvt = _JsonConvert(visited_set)
-                if pretty:
-                    return json.dumps(temp_json_cvt.json_convert(self.__classe), indent=2, sort_keys=True)
-                else:
-                    return json.dumps(temp_json_cvt.json_convert(self.__classe), sort_keys=True)
-            elif isinstance(self.__classe, object):
-                # Same here, need a _JsonConvert instance
-                temp_json_cvt = _JsonConvert(visited_set)
-                if temp_json_cvt.get_class_name(self.__classe) == "enum.EnumMeta":
-                    return _EnumConversion(self.__classe, visited_set).serialize(pretty)
-                else:
-                    self.___obj = _DataTypeConversion(self.__classe, visited_set).convert()
-                    if pretty:
-                        return json.dumps({'' + self.classname: self._serialize(self.___obj).__dict__}, indent=2,
-                                          sort_keys=True)
-                    else:
-                        return json.dumps({'' + self.classname: self._serialize(self.___obj).__dict__}, sort_keys=True)
+            converted, compact_sort_keys = SmartJson._convert_root(self.__classe, visited_set, self.max_depth,
+                                                                   assume_acyclic, stats.node_counts)
+            stats.mark('convert')
+            encoder = _get_json_encoder(not pretty and sort_keys is False)
+            if sort_keys is None:
+                sort_keys = True if pretty else compact_sort_keys
+            try:
+                serialized = encoder.dumps(converted, pretty, sort_keys)
+            except RecursionError:
+                # Nesting beyond what json.dumps can recurse through: encode iteratively instead
+                del converted
+                serialized = ''.join(self._iter_serialized(pretty, assume_acyclic, sort_keys))
+            stats.mark('encode')
+            return serialized
+        except SmartJsonError:
+            raise
+        except Exception as e:
+            obj_type = type(self.__classe).__name__
+            raise SmartJsonSerializationError("Failed to serialize object of type '{}'".format(obj_type),
+                                              original_exception=e)
+
+    @staticmethod
+    def _convert_root(value, visited_set, max_depth=None, assume_acyclic=False, node_counts=None):
+        """
+        Converts a top-level value for serialize().
+
+        Returns the JSON-ready value and whether compact output sorts its keys (pretty output always does).
+        Custom objects are wrapped in a dict keyed by their class name.
+        """
+        walk = _ConversionWalk(visited_set, max_depth, not assume_acyclic, node_counts)
+        root_kind = SmartJson._root_kind(value)
+        if root_kind is _ROOT_MAPPING:
+            return walk.convert_root(value, _KIND_MAPPING), False
+        elif root_kind is _ROOT_LIST:
+            return walk.convert_root(walk.top_list(value), _KIND_SEQUENCE), False
+        elif root_kind is _ROOT_NATIVE:
+            return value, True
+        elif root_kind is _ROOT_CONVERTED:
+            return walk.convert(value), True
+        elif root_kind is _ROOT_ENUM:
+            return walk.convert_root(value, _KIND_ENUM), False
+        return {'' + value.__class__.__name__: walk.convert(value)}, True
+
+    @staticmethod
+    def _root_kind(value):
+        """
+        Returns how serialize() and iterencode() write the top-level `value`.
+
+        Values matching none of the top-level rules (custom objects, values with a registered
+        dumper, deques, bytes...) are wrapped in a dict keyed by their class name, holding the
+        value as it converts when nested.
+        """
+        if _has_dumper(value):
+            return _ROOT_WRAPPED  # Registered dumpers come first
+        if isinstance(value, dict):
+            return _ROOT_MAPPING
+        elif isinstance(value, list):
+            return _ROOT_LIST
+        elif isinstance(value, (int, float, bool, six.string_types, type(None))):
+            return _ROOT_NATIVE
+        elif isinstance(value, (tuple, complex, datetime.date, datetime.datetime, OrderedDict)):
+            return _ROOT_CONVERTED
+        elif isinstance(value, EnumMeta):
+            return _ROOT_ENUM
+        return _ROOT_WRAPPED
+
+    def iterencode(self, pretty=True, schema=None, assume_acyclic=False, sort_keys=None):
+        """
+        Yields the JSON text of `serialize(pretty, schema, assume_acyclic, sort_keys)` in fragments.
+
+        The fragments are always produced with the standard library formatting, whichever backend
+        is selected.
+
+        Objects are converted while they are encoded, so neither the converted tree nor the whole
+        JSON string is held in memory; memory use is bounded by the nesting depth of the data.
+        """
+        self._check_deepcopy()
+        if schema:
+            SmartJson._check_object(self.__classe, schema)
+        for chunk in self._iterencode(pretty, assume_acyclic, sort_keys):
+            yield chunk
+
+    def _iterencode(self, pretty, assume_acyclic, sort_keys, node_counts=None):
+        try:
+            for chunk in self._iter_serialized(pretty, assume_acyclic, sort_keys, node_counts):
+                yield chunk
         except SmartJsonError:
             raise
         except Exception as e:
             obj_type = type(self.__classe).__name__
-            if self.___obj:
-                obj_type = type(self.___obj).__name__
             raise SmartJsonSerializationError("Failed to serialize object of type '{}'".format(obj_type),
                                               original_exception=e)
 
-    def serializeToJsonFile(self, directory="output", filename="smart.json", schema=None):
+    def _iter_serialized(self, pretty, assume_acyclic=False, sort_keys=None, node_counts=None):
+        # Mirrors the dispatch of serialize(), including which outputs sort their keys.
+        visited_set = set()
+        indent = 2 if pretty else None
+        value = self.__classe
+        track_cycles = not assume_acyclic
+        container_sort = pretty if sort_keys is None else sort_keys
+        always_sort = True if sort_keys is None else sort_keys
+        root_kind = SmartJson._root_kind(value)
+        if root_kind is _ROOT_MAPPING:
+            encoder = _StreamEncoder(visited_set, indent, container_sort, self.max_depth, track_cycles, node_counts)
+            return encoder.iter_dict(value)
+        elif root_kind is _ROOT_LIST:
+            encoder = _StreamEncoder(visited_set, indent, container_sort, self.max_depth, track_cycles, node_counts)
+            return encoder.iter_top_list(value)
+        elif root_kind is _ROOT_NATIVE:
+            return _StreamEncoder(visited_set, indent, always_sort).iter_native(value)
+        elif root_kind is _ROOT_CONVERTED:
+            encoder = _StreamEncoder(visited_set, indent, always_sort, self.max_depth, track_cycles, node_counts)
+            return encoder.iter_value(value)
+        elif root_kind is _ROOT_ENUM:
+            encoder = _StreamEncoder(visited_set, indent, container_sort, self.max_depth, track_cycles, node_counts)
+            return encoder.iter_enum(value)
+        if node_counts is not None:
+            node_counts[type(value).__name__] -= 1  # The root was counted already; the walk reaches it again
+        encoder = _StreamEncoder(visited_set, indent, always_sort, self.max_depth, track_cycles, node_counts)
+        return encoder.iter_dict({'' + value.__class__.__name__: value})
+
+    def serializeToJsonFile(self, directory="output", filename="smart.json", schema=None, pretty=True, stream=False,
+                            chunk_size=65536, assume_acyclic=False, sort_keys=None):
+        """
+        Serializes the object to `directory`/`filename` (UTF-8).
+
+        Args:
+            pretty (bool): Indented output, as `serialize(pretty=True)`.
+            stream (bool): Encode into the file while converting (see `iterencode()`), writing about
+                `chunk_size` characters at a time, instead of building the whole JSON string first.
+                The content is written to a temporary file that replaces `filename` once complete.
+            assume_acyclic (bool): Skip cycle tracking, as `serialize(assume_acyclic=True)`.
+            sort_keys (bool): Override key sorting, as in `serialize()`.
+        """
+        stats = self._start_stats('serializeToJsonFile')
         if schema:
-            SmartJson._validate_object(self.__classe, schema)
+            SmartJson._check_object(self.__classe, schema)
+            stats.mark('validate')
         try:
             os.makedirs(directory, exist_ok=True)
         except OSError as e:
             raise SmartJsonSerializationError("Could not create directory '{}'".format(directory), original_exception=e)
+        output_filename = filename
+        if filename == "smart.json" and hasattr(self, 'classname') and self.classname:
+            output_filename = self.classname + ".json"
+        filepath = os.path.join(directory, output_filename)
         try:
-            serialized_data = self.serialize(pretty=True, schema=None)
-            output_filename = filename
-            if filename == "smart.json" and hasattr(self, 'classname') and self.classname:
-                output_filename = self.classname + ".json"
-            filepath = os.path.join(directory, output_filename)
-            with io.open(filepath, 'w', encoding='utf-8') as outfile:
-                if six.PY2 and isinstance(serialized_data, str):
-                    serialized_data = serialized_data.decode('utf-8')
-                outfile.write(serialized_data)
+            if stream:
+                self._stream_to_file(filepath, pretty, chunk_size, assume_acyclic, sort_keys, stats)
+            else:
+                serialized_data = self._serialize_text(pretty, None, assume_acyclic, sort_keys, stats)
+                with io.open(filepath, 'w', encoding='utf-8') as outfile:
+                    if six.PY2 and isinstance(serialized_data, str):
+                        serialized_data = serialized_data.decode('utf-8')
+                    outfile.write(serialized_data)
+                stats.mark('write')
         except SmartJsonError:
             raise
         except Exception as e:
             obj_type = type(self.__classe).__name__
             raise SmartJsonSerializationError(
                 "Failed to serialize object of type '{}' to file '{}'".format(obj_type, filepath), original_exception=e)
+        if stats.enabled:
+            stats.path = filepath
+            stats.bytes = os.path.getsize(filepath)
+        stats.report()
+
+    def _stream_to_file(self, filepath, pretty, chunk_size, assume_acyclic=False, sort_keys=None, stats=_NULL_STATS):
+        self._check_deepcopy()
+        temp_filepath = filepath + ".tmp"
+        try:
+            with io.open(temp_filepath, 'w', encoding='utf-8') as outfile:
+                write = outfile.write
+                if stats.enabled:
+                    def write(text, write=outfile.write, clock=time.perf_counter):
+                        start = clock()
+                        write(text)
+                        stats.add('write', clock() - start)
+                buffered, buffered_size = [], 0
+                for chunk in self._iterencode(pretty, assume_acyclic, sort_keys, stats.node_counts):
+                    buffered.append(chunk)
+                    buffered_size += len(chunk)
+                    if buffered_size >= chunk_size:
+                        write(''.join(buffered))
+                        buffered, buffered_size = [], 0
+                write(''.join(buffered))
+                stats.mark('encode')
+            os.replace(temp_filepath, filepath)
+            stats.mark('write')
+        except BaseException:
+            if os.path.exists(temp_filepath):
+                os.remove(temp_filepath)
+            raise
+
+    @staticmethod
+    def serialize_many(objects, workers=None, chunksize=None, pretty=True, schema=None, assume_acyclic=False,
+                       sort_keys=None, max_depth=None):
+        """
+        Returns the JSON string of each of `objects`, in input order, as
+        `SmartJson(obj, max_depth=max_depth).serialize(pretty, schema, assume_acyclic, sort_keys)`.
+
+        The objects are split into chunks of `chunksize` and serialized by a pool of `workers`
+        processes (default: one per CPU). By default each worker receives about four chunks of at
+        least 64 objects. A batch that fits in one chunk, or `workers=1`, is serialized in this
+        process, where nothing needs to be pickled. Chunks that cannot be pickled (e.g. instances
+        of locally defined classes), whose worker dies or that time out are also serialized in this
+        process. Dumpers registered with `register_dumper()` are sent to the workers, so output is
+        the same with any multiprocessing start method; if one cannot be pickled (e.g. a lambda),
+        the whole batch is serialized in this process.
+
+        The SmartJsonError of the first object that fails is raised, as in a sequential loop.
+        """
+        options = _batch_options(pretty, schema, assume_acyclic, sort_keys, max_depth)
+        results = []
+        for documents in _serialize_chunks(list(objects), options, workers, chunksize):
+            results.extend(documents)
+        return results
 
-    def toObjectFromFile(self, jsonFile, schema=None):
+    @staticmethod
+    def serialize_to_files(items, directory="output", workers=None, chunksize=None, io_workers=4, pretty=True,
+                           schema=None, assume_acyclic=False, sort_keys=None, max_depth=None):
+        """
+        Serializes each `(obj, filename)` pair of `items` to `directory`/`filename` (UTF-8) and
+        returns the failures as a list of `(filename, SmartJsonError)` pairs, in input order.
+
+        `directory` is created once. Objects are serialized as by `serialize_many()`, with the same
+        `workers`, `chunksize` and serialization options, while `io_workers` threads write the
+        finished documents, so disk I/O overlaps with conversion. An object that cannot be
+        serialized or a file that cannot be written is reported without stopping the batch.
+        """
+        items = list(items)
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError as e:
+            raise SmartJsonSerializationError("Could not create directory '{}'".format(directory), original_exception=e)
+        options = _batch_options(pretty, schema, assume_acyclic, sort_keys, max_depth)
+        filepaths = [os.path.join(directory, filename) for _, filename in items]
+        failures = {}
+        writes = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=io_workers) as writer:
+            index = 0
+            for documents in _serialize_chunks([obj for obj, _ in items], options, workers, chunksize, True):
+                for document in documents:
+                    if isinstance(document, SmartJsonError):
+                        failures[index] = document
+                    else:
+                        writes.append((index, writer.submit(_write_text_file, filepaths[index], document)))
+                    index += 1
+            for index, future in writes:
+                try:
+                    future.result()
+                except Exception as e:
+                    failures[index] = SmartJsonSerializationError(
+                        "Failed to write file '{}'".format(filepaths[index]), original_exception=e)
+        return [(items[index][1], failures[index]) for index in sorted(failures)]
+
+    def toObjectFromFile(self, jsonFile, schema=None, lazy=False, parse_datetimes=True, slots=False,
+                         use_mmap=False, cls=None):
+        """
+        Reads the UTF-8 JSON file `jsonFile` and converts it as `toObject()` does.
+
+        With `use_mmap=True` the file is memory-mapped instead of read through a text stream. A
+        backend that parses bytes (orjson) then parses the mapped file directly, so no decoded copy
+        of the document is made, which lowers peak memory for large files; other backends decode
+        the mapping to a str and unmap it before parsing.
+        """
+        stats = _start_stats('toObjectFromFile')
         try:
-            with io.open(jsonFile, 'r', encoding='utf-8') as outfile:
-                dic = json.load(outfile)
+            if use_mmap:
+                dic = SmartJson._load_mapped(jsonFile)
+            else:
+                with io.open(jsonFile, 'r', encoding='utf-8') as outfile:
+                    text = outfile.read()
+                stats.mark('read')
+                dic = _get_json_backend().loads(text)
+                del text
+            stats.mark('parse')
             if schema:
-                SmartJson._validate_data(dic, schema)
-            return _KObject(dic)  # Use module-level _KObject
+                SmartJson._check_data(dic, schema)
+                stats.mark('validate')
+            result = SmartJson._make_object(dic, lazy, slots, parse_datetimes, cls)
+            stats.mark('build')
         except FileNotFoundError:  # Py3 specific
             raise SmartJsonDeserializationError("JSON file not found: {}".format(jsonFile))
         except IOError as e:  # Py2 equivalent for FileNotFoundError and other I/O issues
@@ -537,6 +2985,229 @@ class SmartJson(object):
         except Exception as e:
             raise SmartJsonDeserializationError("Error deserializing from file '{}'".format(jsonFile),
                                                 original_exception=e)
+        if stats.enabled:
+            stats.path = jsonFile
+            stats.bytes = os.path.getsize(jsonFile)
+            stats.count_json(dic)
+        stats.report()
+        return result
+
+    @staticmethod
+    def _load_mapped(jsonFile):
+        backend = _get_json_backend()
+        with io.open(jsonFile, 'rb') as infile:
+            if not os.fstat(infile.fileno()).st_size:
+                return backend.loads('')  # An empty file cannot be mapped; fails as the text path does
+            with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if backend.parses_buffers:
+                    return backend.loads_buffer(mapped)
+                text = str(mapped, 'utf-8')
+        return backend.loads(text)
+
+    # --- asyncio API ---
+    # Blocking file I/O and conversion run on `executor` (the event loop's default executor when
+    # None), so the loop keeps serving other tasks. asyncio is imported on first use only.
+
+    @staticmethod
+    async def _run_blocking(executor, function, *args):
+        import asyncio
+        # get_running_loop() is new in Python 3.7; from a coroutine get_event_loop() returns the same loop
+        loop = asyncio.get_running_loop() if hasattr(asyncio, 'get_running_loop') else asyncio.get_event_loop()
+        return await loop.run_in_executor(executor, functools.partial(function, *args))
+
+    async def aserialize_to_file(self, directory="output", filename="smart.json", schema=None, pretty=True,
+                                 stream=False, chunk_size=65536, assume_acyclic=False, sort_keys=None, executor=None):
+        """Coroutine version of `serializeToJsonFile()`, run on `executor`."""
+        await SmartJson._run_blocking(executor, self.serializeToJsonFile, directory, filename, schema, pretty, stream,
+                                      chunk_size, assume_acyclic, sort_keys)
+
+    async def ato_object_from_file(self, jsonFile, schema=None, lazy=False, parse_datetimes=True, slots=False,
+                                   use_mmap=False, executor=None, cls=None):
+        """Coroutine version of `toObjectFromFile()`, run on `executor`."""
+        return await SmartJson._run_blocking(executor, self.toObjectFromFile, jsonFile, schema, lazy, parse_datetimes,
+                                             slots, use_mmap, cls)
+
+    async def aiterencode(self, pretty=True, schema=None, assume_acyclic=False, sort_keys=None, time_slice=0.005,
+                          fragment_budget=None):
+        """
+        Asynchronous version of `iterencode()` that yields to the event loop while encoding.
+
+        Conversion runs on the event loop thread in slices: once a slice has run for `time_slice`
+        seconds, or produced `fragment_budget` fragments (about two per value), the text encoded so
+        far is yielded and control passes to other tasks before the walk resumes. A single huge
+        object graph then streams out without stalling the rest of the loop, which threads cannot
+        guarantee while the conversion holds the GIL. Pass None to disable either limit. The data
+        must not be modified until encoding has finished.
+        """
+        import asyncio
+        clock = time.perf_counter
+        fragments = self.iterencode(pretty, schema, assume_acyclic, sort_keys)
+        # Fragments are taken in batches so the budget checks do not run for every fragment.
+        batch_size = _TIME_CHECK_INTERVAL if fragment_budget is None else max(1, min(fragment_budget,
+                                                                                    _TIME_CHECK_INTERVAL))
+        buffered = []
+        count = 0
+        deadline = clock() + time_slice if time_slice is not None else None
+        while True:
+            batch = list(itertools.islice(fragments, batch_size))
+            if not batch:
+                break
+            buffered.extend(batch)
+            count += len(batch)
+            if ((fragment_budget is not None and count >= fragment_budget)
+                    or (deadline is not None and clock() >= deadline)):
+                yield ''.join(buffered)
+                buffered = []
+                count = 0
+                await asyncio.sleep(0)
+                if deadline is not None:
+                    deadline = clock() + time_slice
+        if buffered:
+            yield ''.join(buffered)
+
+    async def aserialize_to_stream(self, writer, pretty=True, schema=None, assume_acyclic=False, sort_keys=None,
+                                   chunk_size=65536, executor=None):
+        """
+        Writes the JSON of `serialize(pretty, schema, assume_acyclic, sort_keys)` to the
+        asyncio.StreamWriter `writer` as UTF-8. The document is built on `executor` and written in
+        blocks of `chunk_size` bytes, draining the writer after each one. The writer is not closed.
+        """
+        data = await SmartJson._run_blocking(executor, self.serialize, pretty, schema, assume_acyclic, sort_keys)
+        data = data.encode('utf-8')
+        for start in range(0, len(data), chunk_size):
+            writer.write(data[start:start + chunk_size])
+            await writer.drain()
+
+    async def ato_object_from_stream(self, reader, schema=None, lazy=False, parse_datetimes=True, slots=False,
+                                     executor=None, cls=None):
+        """
+        Reads the asyncio.StreamReader `reader` until EOF and converts the JSON document as
+        `toObject()` does, on `executor`.
+        """
+        data = await reader.read()
+        return await SmartJson._run_blocking(executor, self.toObject, data, schema, lazy, parse_datetimes, slots,
+                                             cls)
+
+    @staticmethod
+    def dump_lines(records, fp, schema=None, buffer_size=65536):
+        """
+        Writes records as JSON Lines: one compact JSON document per record, as `SmartJson(record).serialize(pretty=False)`.
+
+        The conversion state, the JSON backend and the compiled `schema` (a serialization schema, validated
+        against every record) are shared by all records, and output is written to the text file `fp` in
+        blocks of about `buffer_size` characters. Returns the number of records written.
+        """
+        validator = SmartJson.compile_object_schema(schema) if schema else None
+        dumps = _get_json_encoder().dumps
+        visited_set = set()
+        buffered, buffered_size, count = [], 0, 0
+        for index, record in enumerate(records):
+            if validator is not None:
+                try:
+                    validator.validate(record)
+                except SmartJsonSchemaValidationError as e:
+                    six.raise_from(SmartJsonSchemaValidationError("Record {}: {}".format(index, e.message)), e)
+            try:
+                converted, compact_sort_keys = SmartJson._convert_root(record, visited_set)
+                line = dumps(converted, False, compact_sort_keys)
+            except SmartJsonError:
+                raise
+            except Exception as e:
+                raise SmartJsonSerializationError(
+                    "Failed to serialize record {} of type '{}'".format(index, type(record).__name__),
+                    original_exception=e)
+            buffered.append(line)
+            buffered.append('\n')
+            buffered_size += len(line) + 1
+            count += 1
+            if buffered_size >= buffer_size:
+                fp.write(''.join(buffered))
+                buffered, buffered_size = [], 0
+        if buffered:
+            fp.write(''.join(buffered))
+        return count
+
+    @staticmethod
+    def iter_lines(fp, schema=None, lazy=False, parse_datetimes=True, slots=False, cls=None):
+        """
+        Reads JSON Lines from the text file `fp`, yielding one object per non-empty line.
+
+        `schema` (a deserialization schema, compiled once) is validated against every record, and
+        each record is converted as `toObject()` does with the `lazy`, `parse_datetimes`, `slots`
+        and `cls` options.
+        """
+        validator = SmartJson.compile_schema(schema) if schema else None
+        decode = _get_json_backend().loads
+        for line_number, line in enumerate(fp, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                dic = decode(line)
+            except ValueError as e:
+                raise SmartJsonDeserializationError(
+                    "Invalid JSON format on line {}: {}".format(line_number, getattr(e, 'msg', e)),
+                    original_exception=e)
+            if validator is not None:
+                try:
+                    validator.validate(dic)
+                except SmartJsonSchemaValidationError as e:
+                    six.raise_from(SmartJsonSchemaValidationError("Line {}: {}".format(line_number, e.message)), e)
+            try:
+                obj = SmartJson._make_object(dic, lazy, slots, parse_datetimes, cls)
+            except SmartJsonDeserializationError as e:
+                six.raise_from(SmartJsonDeserializationError("Line {}: {}".format(line_number, e.message),
+                                                             e.original_exception), e)
+            yield obj
+
+    @staticmethod
+    def iter_objects_from_file(jsonFile, schema=None, lazy=False, parse_datetimes=True, slots=False,
+                               chunk_size=65536, cls=None):
+        """
+        Reads a UTF-8 file holding a top-level JSON array and yields one object per element, as
+        `toObject()` converts it, as soon as that element has been read.
+
+        The file is read `chunk_size` characters at a time and only the unparsed text is kept, so
+        memory use is bounded by the largest element rather than by the file. `schema` (a
+        deserialization schema, compiled once) is validated against every element.
+        """
+        validator = SmartJson.compile_schema(schema) if schema else None
+        try:
+            infile = io.open(jsonFile, 'r', encoding='utf-8')
+        except IOError as e:
+            if e.errno == 2:  # errno.ENOENT
+                raise SmartJsonDeserializationError("JSON file not found: {}".format(jsonFile))
+            raise SmartJsonDeserializationError("I/O error reading file '{}'".format(jsonFile), original_exception=e)
+        with infile:
+            reader = _ArrayElementReader(infile, chunk_size)
+            elements = iter(reader)
+            index = 0
+            while True:
+                try:
+                    element = next(elements)
+                except StopIteration:
+                    return
+                except json.JSONDecodeError as e:
+                    raise SmartJsonDeserializationError("Invalid JSON format in file '{}' at character {}: {}".format(
+                        jsonFile, reader.offset + e.pos, e.msg), original_exception=e)
+                except UnicodeDecodeError as e:
+                    raise SmartJsonDeserializationError(
+                        "File '{}' could not be decoded using UTF-8".format(jsonFile), original_exception=e)
+                except IOError as e:
+                    raise SmartJsonDeserializationError(
+                        "I/O error reading file '{}'".format(jsonFile), original_exception=e)
+                if validator is not None:
+                    try:
+                        validator.validate(element)
+                    except SmartJsonSchemaValidationError as e:
+                        six.raise_from(SmartJsonSchemaValidationError("Element {}: {}".format(index, e.message)), e)
+                try:
+                    obj = SmartJson._make_object(element, lazy, slots, parse_datetimes, cls)
+                except SmartJsonDeserializationError as e:
+                    six.raise_from(SmartJsonDeserializationError("Element {}: {}".format(index, e.message),
+                                                                 e.original_exception), e)
+                yield obj
+                index += 1
 
     @staticmethod
     def _get_type_display_name(type_val):
@@ -548,6 +3219,28 @@ class SmartJson(object):
             return type_val.__name__
         return str(type_val)
 
+    @staticmethod
+    def compile_object_schema(schema):
+        """
+        Checks a serialization schema (Python types) once and returns a reusable validator.
+
+        The result can be passed as `schema` to `serialize()` and `serializeToJsonFile()`, or called
+        directly with an object or dictionary. Invalid schema definitions raise
+        SmartJsonSchemaValidationError here instead of during validation.
+        """
+        if isinstance(schema, _CompiledObjectSchema):
+            return schema
+        return _CompiledObjectSchema(schema)
+
+    @staticmethod
+    def _check_object(obj, schema):
+        if not isinstance(schema, _CompiledObjectSchema):
+            schema = _cached_object_schema(schema) or schema
+        if isinstance(schema, _CompiledObjectSchema):
+            schema.validate(obj)
+        else:
+            SmartJson._validate_object(obj, schema)
+
     @staticmethod
     def _validate_object(obj, schema, path=""):
         if not isinstance(schema, dict):
@@ -644,13 +3337,36 @@ class SmartJson(object):
             return "dict" # Heuristic for custom classes
         return py_type_val # Fallback for other unexpected values (e.g. if already processed or not a type)
 
-    def toObject(self, _json, schema=None):
+    def toObject(self, _json, schema=None, lazy=False, parse_datetimes=True, slots=False, cls=None):
+        """
+        Converts a JSON string, bytes or dictionary into a _KObject.
+
+        With `lazy=True` the returned object keeps the parsed dictionary and converts each attribute
+        (and nested object) only when it is first read, which is cheaper when only a few fields of a
+        large document are used. With `slots=True` objects are built from `__slots__` classes
+        generated once per distinct key set, which saves memory and time when many objects share
+        the same keys; they support the same attribute access but have no `__dict__` and are not
+        _KObject instances. With `parse_datetimes=False` strings are never turned into datetime
+        objects.
+
+        With `cls` the document is decoded straight into that type instead of a _KObject: a
+        class, or a typing form such as `List[MyClass]` or `Dict[str, MyClass]`. Fields are decoded
+        by their declared types (class annotations, or else `__init__` annotations), recursively,
+        using loaders registered with `register_loader()` first; undeclared fields keep their
+        parsed JSON value. The `{"MyClass": {...}}` wrapper written by `serialize()` is accepted,
+        and so is the "" it writes for None, which is read back as None wherever the declared type
+        is not a string (an `Optional[str]` field gets ""). Dataclasses are built through `__init__`; other classes receive the fields as attributes
+        without `__init__` being called. Values that do not match their declared type raise
+        SmartJsonDeserializationError naming the field path.
+        """
         dic = None
+        stats = _start_stats('toObject')
         try:
             if isinstance(_json, six.binary_type):
                 _json = _json.decode('utf-8')
             if isinstance(_json, six.string_types):
-                dic = json.loads(_json)
+                dic = _get_json_backend().loads(_json)
+                stats.mark('parse')
             elif isinstance(_json, dict):
                 dic = _json
             else:
@@ -658,8 +3374,10 @@ class SmartJson(object):
                     "Invalid input type for deserialization: Expected a JSON string, bytes, or a dictionary, got {}.".format(
                         type(_json).__name__))
             if schema and dic is not None:
-                SmartJson._validate_data(dic, schema)
-            return _KObject(dic)  # Use module-level _KObject
+                SmartJson._check_data(dic, schema)
+                stats.mark('validate')
+            result = SmartJson._make_object(dic, lazy, slots, parse_datetimes, cls)
+            stats.mark('build')
         except json.JSONDecodeError as e:
             raise SmartJsonDeserializationError("Invalid JSON format in input: {}".format(e.msg),
                                                 original_exception=e)
@@ -669,6 +3387,44 @@ class SmartJson(object):
             raise
         except Exception as e:
             raise SmartJsonDeserializationError("Error converting input to object", original_exception=e)
+        if stats.enabled:
+            if isinstance(_json, six.string_types):
+                stats.bytes = len(_json.encode('utf-8'))
+            stats.count_json(dic)
+        stats.report()
+        return result
+
+    @staticmethod
+    def _make_object(dic, lazy=False, slots=False, parse_datetimes=True, cls=None):
+        if cls is not None:
+            if lazy or slots:
+                raise SmartJsonDeserializationError("The 'cls' option cannot be combined with 'lazy' or 'slots'.")
+            return _decode_typed(dic, cls)
+        if lazy and slots:
+            raise SmartJsonDeserializationError("The 'lazy' and 'slots' options cannot be combined.")
+        if slots:
+            return _ShapedKObject._from_dict(dic, parse_datetimes)
+        return (_LazyKObject if lazy else _KObject)(dic, parse_datetimes)  # Use module-level _KObject
+
+    @staticmethod
+    def compile_schema(schema):
+        """
+        Checks a deserialization schema once and returns a reusable validator.
+
+        The result can be passed as `schema` to `toObject()` and `toObjectFromFile()`, or called
+        directly with parsed JSON data. Invalid schema definitions (including unknown type names)
+        raise SmartJsonSchemaValidationError here instead of during validation.
+        """
+        if isinstance(schema, _CompiledDataSchema):
+            return schema
+        return _CompiledDataSchema(schema)
+
+    @staticmethod
+    def _check_data(data, schema):
+        if isinstance(schema, _CompiledDataSchema):
+            schema.validate(data)
+        else:
+            SmartJson._validate_data(data, schema)
 
     @staticmethod
     def _validate_data(data, schema, path=""):
@@ -685,10 +3441,7 @@ class SmartJson(object):
                     "Invalid schema definition for field '{}': properties must be a dictionary.".format(current_path))
             is_required = field_props.get('required', False)
             field_type_name_from_schema = field_props.get('type')
-            TYPE_MAP = {
-                "str": six.string_types, "int": six.integer_types, "float": float,
-                "bool": bool, "list": list, "dict": dict,
-            }
+            TYPE_MAP = _DATA_SCHEMA_TYPE_MAP
             if is_required and field_name not in data:
                 raise SmartJsonSchemaValidationError("Missing required field: '{}'".format(current_path))
             if field_name in data:
@@ -4,15 +4,28 @@ import os
 import io # For Python 2/3 compatible file I/O
 import six # For Python 2/3 compatibility
 import json # For malformed JSON test
+try:
+    import dataclasses
+except ImportError:  # Python 3.6
+    dataclasses = None
 from smartjson.core import (
     _KObject,
+    _OPTIONAL_JSON_BACKENDS,
+    _load_json_backend,
+    _ArrayElementReader,
     SmartJson,
     SmartJsonError,
     SmartJsonSerializationError,
     SmartJsonDeserializationError,
     SmartJsonUnsupportedTypeError,
     SmartJsonCircularDependencyError,
-    SmartJsonSchemaValidationError # Added
+    SmartJsonSchemaValidationError, # Added
+    _ClassPlan,
+    _LazyKObject,
+    _ShapedKObject,
+    _TypeHandler,
+    _TYPE_HANDLERS,
+    _parse_datetime
 )
 
 # --- Helper classes and Schemas for Validation Tests ---
@@ -100,6 +113,25 @@ class ContainerObject:
         self.list_attr = []
         self.dict_attr = {}
 
+class DumpedRecord:  # Module level, so batch workers can unpickle it and its dumper
+    def __init__(self, number):
+        self.number = number
+
+def dump_record(record):
+    return {"dumped": record.number}
+
+
+def run_coroutine(coroutine):
+    """asyncio.run(), which Python 3.6 lacks."""
+    import asyncio
+    if hasattr(asyncio, 'run'):
+        return asyncio.run(coroutine)
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
 
 class TestSmartJson(unittest.TestCase):
 
@@ -268,10 +300,77 @@ class TestSmartJson(unittest.TestCase):
         sj_vars_fails = SmartJson(VarsFails())
         # _DataTypeConversion.convert() catches exceptions from __convert_attributes (where vars() is called)
         # and wraps them in SmartJsonSerializationError.
-        # Updated regex to match the error message from serialize() due to __deepcopy_error
+        with self.assertRaisesRegex(SmartJsonSerializationError, "Error converting attributes for 'VarsFails'"):
+            sj_vars_fails.serialize()
+
+        # With the opt-in deep copy, the failure surfaces from the copy step instead.
+        sj_vars_fails_copy = SmartJson(VarsFails(), deep_copy=True)
         with self.assertRaisesRegex(SmartJsonSerializationError,
                                      r"Error during initial object copying .*Simulating vars\(\) failure"):
-            sj_vars_fails.serialize()
+            sj_vars_fails_copy.serialize()
+
+    # --- Copy-free Serialization Tests ---
+    def test_serialize_does_not_mutate_source(self):
+        inner = SimpleObject("inner", None)
+        obj = ContainerObject("source")
+        obj.list_attr.append(inner)
+        obj.dict_attr["inner"] = inner
+
+        serialized = SmartJson(obj).serialize(pretty=False)
+        self.assertEqual(json.loads(serialized)["ContainerObject"]["dict_attr"]["inner"],
+                         {"name": "inner", "value": ""})
+        self.assertIs(obj.list_attr[0], inner)
+        self.assertIs(obj.dict_attr["inner"], inner)
+        self.assertIsNone(inner.value)
+        self.assertEqual(sorted(vars(obj)), ["dict_attr", "list_attr", "name"])
+
+    def test_deep_copy_snapshots_source(self):
+        obj = SimpleObject("before", 1)
+        sj_live = SmartJson(obj)
+        sj_snapshot = SmartJson(obj, deep_copy=True)
+        obj.name = "after"
+        self.assertIn('"name": "after"', sj_live.serialize(pretty=False))
+        self.assertIn('"name": "before"', sj_snapshot.serialize(pretty=False))
+        self.assertEqual(sj_live.serialize(pretty=False), SmartJson(obj, deep_copy=True).serialize(pretty=False))
+
+    def test_serialize_slots_object(self):
+        class Slotted(object):
+            __slots__ = ("a", "b")
+            def __init__(self):
+                self.a = 1
+                self.b = [None]
+
+        self.assertEqual(SmartJson(Slotted()).serialize(pretty=False), '{"Slotted": {"a": 1, "b": [""]}}')
+
+    def test_property_setter_is_not_called(self):
+        class Celsius(object):
+            def __init__(self):
+                self._degrees = 3
+
+            @property
+            def degrees(self):
+                return [self._degrees]
+
+            @degrees.setter
+            def degrees(self, value):
+                self._degrees = value
+
+        # The getter runs, but its value is no longer written back through the setter, which
+        # used to change the serialized backing attribute to {"_degrees": [3]}.
+        source = Celsius()
+        self.assertEqual(SmartJson(source).serialize(pretty=False), '{"Celsius": {"_degrees": 3}}')
+        self.assertEqual("".join(SmartJson(source).iterencode(pretty=False)), '{"Celsius": {"_degrees": 3}}')
+        self.assertEqual(source._degrees, 3)
+
+    def test_top_level_deque_matches_iterencode(self):
+        from collections import deque
+        for value, expected in ((deque([1, {"a": None}]), {"deque": [1, {"a": ""}]}),
+                                (b"raw", {"bytes": "raw"}),
+                                ((1, deque([SimpleObject("x", 2)])), [1, [{"name": "x", "value": 2}]])):
+            for pretty in (True, False):
+                serialized = SmartJson(value).serialize(pretty=pretty)
+                self.assertEqual(json.loads(serialized), expected)
+                self.assertEqual("".join(SmartJson(value).iterencode(pretty=pretty)), serialized)
 
     # --- Schema Validation Tests ---
 
@@ -354,6 +453,57 @@ class TestSmartJson(unittest.TestCase):
         self.assertEqual(obj.name, "Minimal User")
         self.assertFalse(hasattr(obj, 'email')) # _KObject won't have it if not in JSON
 
+    def test_compiled_schema_matches_dict_schema(self):
+        compiled = SmartJson.compile_schema(VALID_USER_SCHEMA)
+        self.assertIs(SmartJson.compile_schema(compiled), compiled)
+        documents = [
+            {'name': 'Ok', 'age': 1, 'address': {'street': 's', 'city': 'c', 'zip_code': 'z'},
+             'roles': ['a'], 'items': [{'item_id': 1, 'price': 1.5}]},
+            {'age': 30},
+            {'name': 'Test', 'age': 'thirty'},
+            {'name': 'N', 'age': 1, 'address': {'street': 's'}},
+            {'name': 'N', 'age': 1, 'address': {'street': 's', 'city': 1, 'zip_code': 'z'}},
+            {'name': 'N', 'age': 1, 'roles': ['user', 123]},
+            {'name': 'N', 'age': 1, 'items': [{'item_id': 1, 'price': 1.0}, {'item_id': 2, 'price': 'cheap'}]},
+            {'name': 'N', 'age': 1, 'items': [5]},
+            {'name': True, 'age': 1},
+            {'name': 'N', 'age': 1, 'roles': ['user', False]},
+            [1, 2],
+        ]
+        sj = SmartJson()
+        for document in documents:
+            expected_message = None
+            try:
+                SmartJson._validate_data(document, VALID_USER_SCHEMA)
+            except SmartJsonSchemaValidationError as e:
+                expected_message = str(e)
+            if expected_message is None:
+                compiled.validate(document)
+                self.assertEqual(sj.toObject(json.dumps(document), schema=compiled).name, document['name'])
+            else:
+                with self.assertRaises(SmartJsonSchemaValidationError) as ctx:
+                    sj.toObject(json.dumps(document), schema=compiled)
+                self.assertEqual(str(ctx.exception), expected_message)
+
+    def test_compile_schema_rejects_invalid_definitions_upfront(self):
+        with self.assertRaisesRegex(SmartJsonSchemaValidationError, "Unknown type 'complex' specified in schema for field 'a.b'"):
+            SmartJson.compile_schema({'a': {'type': 'dict', 'schema': {'b': {'type': 'complex'}}}})
+        with self.assertRaisesRegex(SmartJsonSchemaValidationError, "properties must be a dictionary"):
+            SmartJson.compile_schema({'a': 'str'})
+        with self.assertRaisesRegex(SmartJsonSchemaValidationError, "schema itself must be a dictionary"):
+            SmartJson.compile_schema(['a'])
+
+    def test_compiled_schema_with_file(self):
+        filename = os.path.join("tests" if os.path.exists("tests") else ".", "compiled_schema_temp.json")
+        try:
+            with io.open(filename, "w", encoding="utf-8") as f:
+                f.write(six.text_type(json.dumps({'name': 'File', 'age': 'old'})))
+            with self.assertRaisesRegex(SmartJsonSchemaValidationError, "Invalid type for field 'age'"):
+                SmartJson().toObjectFromFile(filename, schema=SmartJson.compile_schema(VALID_USER_SCHEMA))
+        finally:
+            if os.path.exists(filename):
+                os.remove(filename)
+
     # --- Serialization Schema Validation Tests ---
     def test_serialize_valid_object_success(self):
         address = ValidAddress("789 Pine", "Otherville", "67890")
@@ -426,6 +576,68 @@ class TestSmartJson(unittest.TestCase):
         self.assertNotIn("email", serialized_data) # Ensure optional fields are not there if not set
 
 
+    def test_compiled_object_schema_matches_dict_schema(self):
+        class AddressMissingCity(object):
+            def __init__(self):
+                self.street = "s"
+                self.zip_code = "z"
+
+        compiled = SmartJson.compile_object_schema(VALID_USER_SCHEMA)
+        self.assertIs(SmartJson.compile_object_schema(compiled), compiled)
+        objects = [
+            ValidUser("Ok", 1, email="e", address=ValidAddress("s", "c", "z"), roles=["a"],
+                      items=[ValidItem(1, 1.5)]),
+            ValidUser("Minimal", 2),
+            ValidUser("Wrong age", "thirty"),
+            ValidUser("Nested missing", 3, address=AddressMissingCity()),
+            ValidUser("Nested type", 3, address=ValidAddress("s", 1, "z")),
+            ValidUser("Roles", 3, roles=["user", 123]),
+            ValidUser("Items", 3, items=[ValidItem(1, 1.0), ValidItem(2, "expensive")]),
+            ValidUser("Item kind", 3, items=[7]),
+            {'name': 'As dict', 'age': 4, 'address': {'street': 's', 'city': 'c'}},
+            SimpleObject("no age", 1),
+        ]
+        for obj in objects:
+            expected_message = None
+            try:
+                SmartJson._validate_object(obj, VALID_USER_SCHEMA)
+            except SmartJsonSchemaValidationError as e:
+                expected_message = str(e)
+            if expected_message is None:
+                SmartJson(obj).serialize(schema=compiled)
+            else:
+                with self.assertRaises(SmartJsonSchemaValidationError) as ctx:
+                    SmartJson(obj).serialize(schema=compiled)
+                self.assertEqual(str(ctx.exception), expected_message)
+
+    def test_plain_object_schema_is_compiled_once_and_recompiled_when_changed(self):
+        from smartjson.core import _COMPILED_OBJECT_SCHEMAS, _CompiledObjectSchema
+        schema = {'name': {'type': six.string_types, 'required': True},
+                  'value': {'type': int, 'required': True}}
+        SmartJson(SimpleObject("a", 1)).serialize(schema=schema)
+        compiled = _COMPILED_OBJECT_SCHEMAS[id(schema)][2]
+        self.assertIsInstance(compiled, _CompiledObjectSchema)
+        SmartJson({'name': 'b', 'value': 2}).serialize(schema=schema)
+        self.assertIs(_COMPILED_OBJECT_SCHEMAS[id(schema)][2], compiled)
+
+        schema['value']['type'] = float  # Changed in place after being compiled
+        with self.assertRaisesRegex(SmartJsonSchemaValidationError, "Expected float, got int"):
+            SmartJson(SimpleObject("a", 1)).serialize(schema=schema)
+        self.assertIsNot(_COMPILED_OBJECT_SCHEMAS[id(schema)][2], compiled)
+
+        # An invalid definition is still only reported when validation reaches it
+        lenient = {'name': {'type': six.string_types}, 'extra': {'type': dict, 'schema': None}}
+        SmartJson(SimpleObject("a", 1)).serialize(schema=lenient)
+        with self.assertRaisesRegex(SmartJsonSchemaValidationError, "schema must be a dictionary"):
+            SmartJson({'name': 'a', 'extra': {}}).serialize(schema=lenient)
+
+    def test_compile_object_schema_rejects_invalid_definitions_upfront(self):
+        with self.assertRaisesRegex(SmartJsonSchemaValidationError,
+                                    "Invalid schema definition at 'address': schema must be a dictionary."):
+            SmartJson.compile_object_schema({'address': {'type': ValidAddress, 'schema': None}})
+        with self.assertRaisesRegex(SmartJsonSchemaValidationError, "properties must be a dictionary"):
+            SmartJson.compile_object_schema({'name': str})
+
     # --- Basic Serialization/Deserialization Tests ---
     def test_simple_object_serialization_deserialization(self):
         obj = SimpleObject("test_obj", 123)
@@ -519,5 +731,1274 @@ class TestSmartJson(unittest.TestCase):
             if os.path.exists(filename):
                 os.remove(filename)
 
+    # --- Class Plan Cache Tests ---
+    def test_class_plan_is_cached_per_class(self):
+        class Planned(object):
+            kind = "planned"
+            def method(self):
+                return 1
+            @property
+            def computed(self):
+                return self.value * 2
+            def __init__(self, value):
+                self.value = value
+
+        _ClassPlan.invalidate(Planned)
+        plan = _ClassPlan.for_class(Planned)
+        self.assertIs(plan, _ClassPlan.for_class(Planned))
+        self.assertEqual(plan.member_names, ('computed', 'kind'))
+        self.assertEqual(plan.property_names, frozenset(['computed']))
+        self.assertIn('method', plan.skipped_names)
+
+        serialized = json.loads(SmartJson([Planned(1), Planned(2)]).serialize(pretty=False))
+        self.assertEqual(serialized, [{'value': 1, 'kind': 'planned'}, {'value': 2, 'kind': 'planned'}])
+        self.assertIs(plan, _ClassPlan.for_class(Planned))
+
+    def test_class_plan_invalidated_when_class_changes(self):
+        class Mutable(object):
+            def __init__(self):
+                self.a = 1
+
+        _ClassPlan.invalidate(Mutable)
+        plan = _ClassPlan.for_class(Mutable)
+        self.assertEqual(plan.member_names, ())
+
+        Mutable.added_later = "late"
+        new_plan = _ClassPlan.for_class(Mutable)
+        self.assertIsNot(plan, new_plan)
+        self.assertEqual(new_plan.member_names, ('added_later',))
+        self.assertIn('"added_later": "late"', SmartJson(Mutable()).serialize(pretty=False))
+
+        # Replacing an attribute by a property keeps the number of class attributes
+        Mutable.added_later = property(lambda instance: instance.a + 1)
+        replaced_plan = _ClassPlan.for_class(Mutable)
+        self.assertIsNot(replaced_plan, new_plan)
+        self.assertEqual(replaced_plan.property_names, frozenset(['added_later']))
+        self.assertEqual(json.loads(SmartJson(Mutable()).serialize(pretty=False)), {'Mutable': {'a': 1}})
+        Mutable.added_later = "again"
+        self.assertEqual(_ClassPlan.for_class(Mutable).property_names, frozenset())
+        self.assertIn('"added_later": "again"', SmartJson(Mutable()).serialize(pretty=False))
+
+    def test_class_plan_cache_does_not_keep_classes_alive(self):
+        import gc
+        import weakref
+
+        class Temporary(object):
+            kind = "temporary"
+
+        self.assertEqual(_ClassPlan.for_class(Temporary).member_names, ('kind',))
+        self.assertIn(Temporary, _ClassPlan._cache)
+        class_ref = weakref.ref(Temporary)
+        del Temporary
+        gc.collect()
+        self.assertIsNone(class_ref())
+
+    # --- Streaming Serialization Tests ---
+    def _make_stream_sample(self):
+        import datetime
+        from collections import OrderedDict, deque
+        obj = ContainerObject("stream \u00e9")
+        obj.list_attr.extend([SimpleObject("a", None), 1.5, float("inf"), True, b"bytes", (1, 2),
+                              deque([SimpleObject("b", 2)]), complex(1, 2), datetime.date(2020, 1, 2), []])
+        obj.dict_attr.update({"x": {}, 3: OrderedDict([("z", 1), ("a", [None])]), "dt": datetime.datetime(2020, 1, 2)})
+        return obj
+
+    def test_iterencode_matches_serialize(self):
+        samples = [self._make_stream_sample(), {"b": self._make_stream_sample(), "a": [1, {"k": None}]},
+                   [{"a": 1}, self._make_stream_sample(), [{"b": 2}], None], 5, "text", None, (1, {"a": None}), {}, []]
+        for sample in samples:
+            for pretty in (True, False):
+                sj = SmartJson(sample)
+                self.assertEqual("".join(sj.iterencode(pretty=pretty)), sj.serialize(pretty=pretty))
+
+    def test_iterencode_converts_lazily(self):
+        accessed = []
+
+        class Tracked(object):
+            def __init__(self, index):
+                self._index = index
+
+            @property
+            def index(self):
+                accessed.append(self._index)
+                return self._index
+
+        chunks = SmartJson([Tracked(i) for i in range(1000)]).iterencode(pretty=False)
+        self.assertEqual(next(chunks), "[")
+        self.assertEqual(next(chunks), "{")
+        self.assertEqual(accessed, [0])
+        with self.assertRaisesRegex(SmartJsonCircularDependencyError, "Circular dependency detected"):
+            obj = CircularRefObject("loop")
+            obj.ref = obj
+            "".join(SmartJson(obj).iterencode())
+
+    def test_serialize_to_json_file_streaming(self):
+        test_dir = "tests" if os.path.exists("tests") else "."
+        filepath = os.path.join(test_dir, "stream_test.json")
+        sample = self._make_stream_sample()
+        try:
+            for pretty in (True, False):
+                SmartJson(sample).serializeToJsonFile(directory=test_dir, filename="stream_test.json",
+                                                      pretty=pretty, stream=True, chunk_size=16)
+                with io.open(filepath, "r", encoding="utf-8") as f:
+                    self.assertEqual(f.read(), SmartJson(sample).serialize(pretty=pretty))
+            self.assertFalse(os.path.exists(filepath + ".tmp"))
+
+            broken = CircularRefObject("broken")
+            broken.ref = broken
+            with self.assertRaises(SmartJsonCircularDependencyError):
+                SmartJson(broken).serializeToJsonFile(directory=test_dir, filename="stream_test.json", stream=True)
+            self.assertFalse(os.path.exists(filepath + ".tmp"))
+        finally:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+
+    # --- JSON Lines Tests ---
+    def test_dump_lines_and_iter_lines_round_trip(self):
+        records = [SimpleObject("first", 1), {"b": None, "a": [SimpleObject("nested", 2)]}, [{"x": 1}], 7]
+        out = six.StringIO()
+        self.assertEqual(SmartJson.dump_lines(iter(records), out, buffer_size=8), len(records))
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines, [SmartJson(record).serialize(pretty=False) for record in records])
+
+        loaded = list(SmartJson.iter_lines(six.StringIO(lines[0] + "\n\n" + lines[0] + "\n"),
+                                           schema={'SimpleObject': {'type': 'dict'}}))
+        self.assertEqual(len(loaded), 2)
+        self.assertEqual(loaded[0].SimpleObject.name, "first")
+        self.assertEqual(loaded[1].SimpleObject.value, 1)
+
+    def test_iter_lines_reports_line_numbers(self):
+        sj_lines = SmartJson.iter_lines(six.StringIO('{"name": "ok", "age": 1}\n{"age": 2}\n'),
+                                        schema=VALID_USER_SCHEMA)
+        self.assertEqual(next(sj_lines).name, "ok")
+        with self.assertRaisesRegex(SmartJsonSchemaValidationError, "Line 2: Missing required field: 'name'"):
+            next(sj_lines)
+        with self.assertRaisesRegex(SmartJsonDeserializationError, "Invalid JSON format on line 2"):
+            list(SmartJson.iter_lines(six.StringIO('{"a": 1}\n{"a": \n')))
+
+    def test_iter_lines_accepts_to_object_options(self):
+        import datetime
+        text = '{"name": "a", "value": "2020-01-02 03:04:05.000000"}\n{"name": "b", "value": "x"}\n'
+        eager = list(SmartJson.iter_lines(six.StringIO(text)))
+        self.assertEqual(eager[0].value, datetime.datetime(2020, 1, 2, 3, 4, 5))
+        lazy = list(SmartJson.iter_lines(six.StringIO(text), lazy=True))
+        self.assertIsInstance(lazy[0], _LazyKObject)
+        self.assertEqual(lazy[1].name, "b")
+        slotted = list(SmartJson.iter_lines(six.StringIO(text), slots=True, parse_datetimes=False))
+        self.assertIsInstance(slotted[0], _ShapedKObject)
+        self.assertEqual(slotted[0].value, "2020-01-02 03:04:05.000000")
+
+        class Named(object):
+            name: str
+
+        typed = list(SmartJson.iter_lines(six.StringIO(text), cls=Named))
+        self.assertEqual([(type(record), record.name) for record in typed], [(Named, "a"), (Named, "b")])
+        with self.assertRaisesRegex(SmartJsonDeserializationError, "Line 2: Cannot decode 'Named' at 'name'"):
+            list(SmartJson.iter_lines(six.StringIO('{"name": "a"}\n{"name": 2}\n'), cls=Named))
+
+    def test_dump_lines_validates_each_record(self):
+        records = [ValidUser("ok", 1), ValidUser("bad", "age")]
+        with self.assertRaisesRegex(SmartJsonSchemaValidationError, "Record 1: Invalid type for attribute/key 'age'"):
+            SmartJson.dump_lines(records, six.StringIO(), schema=VALID_USER_SCHEMA)
+
+    # --- Lazy Deserialization Tests ---
+    def test_lazy_kobject_matches_eager_kobject(self):
+        document = {
+            "name": "lazy", "count": 3, "when": "2020-01-02 03:04:05.000600",
+            "nested": {"inner": {"value": [1, {"deep": True}]}, "label": "x"},
+            "items": [{"id": 1}, 2, [{"not": "converted"}]],
+        }
+        eager = SmartJson().toObject(json.dumps(document))
+        lazy = SmartJson().toObject(json.dumps(document), lazy=True)
+        self.assertIsInstance(lazy, _KObject)
+        self.assertEqual(lazy.name, eager.name)
+        self.assertEqual(lazy.count, eager.count)
+        self.assertEqual(lazy.when, eager.when)
+        self.assertEqual(lazy.nested.inner.value[0], 1)
+        self.assertIsInstance(lazy.nested, _LazyKObject)
+        self.assertTrue(lazy.nested.inner.value[1].deep)
+        self.assertEqual(lazy.items[0].id, 1)
+        self.assertEqual(lazy.items[1], 2)
+        self.assertEqual(lazy.items[2], [{"not": "converted"}])
+        self.assertFalse(hasattr(lazy, "missing"))
+        self.assertIn("count", dir(lazy))
+
+    def test_lazy_kobject_converts_on_first_access(self):
+        lazy = SmartJson().toObject({"a": {"b": 1}, "c": "text"}, lazy=True)
+        self.assertEqual(vars(lazy), {})
+        first = lazy.a
+        self.assertEqual(list(vars(lazy)), ["a"])
+        self.assertIs(lazy.a, first)
+        lazy.c = "overridden"
+        self.assertEqual(lazy.c, "overridden")
+
+    def test_lazy_kobject_serializes_its_fields(self):
+        document = {
+            "name": "lazy", "when": "2020-01-02 03:04:05.000600",
+            "nested": {"inner": {"value": [1, {"deep": True}]}, "label": "x"},
+            "items": [{"id": 1}, 2, [{"not": "converted"}]],
+        }
+        text = json.dumps(document)
+        eager = json.loads(SmartJson(SmartJson().toObject(text)).serialize())["_KObject"]
+        lazy = SmartJson().toObject(text, lazy=True)
+        self.assertEqual(json.loads(SmartJson(lazy).serialize()), {"_LazyKObject": eager})
+        self.assertEqual(json.loads(SmartJson(lazy).serialize())["_LazyKObject"], document)
+
+        # Materialized and overridden fields serialize as read, in iterencode() too
+        self.assertEqual(lazy.nested.label, "x")
+        lazy.name = "changed"
+        expected = dict(document, name="changed")
+        self.assertEqual(json.loads(SmartJson([lazy]).serialize(pretty=False)), [expected])
+        self.assertEqual(json.loads("".join(SmartJson([lazy]).iterencode(pretty=False))), [expected])
+        back = SmartJson().toObject(SmartJson(lazy).serialize(), lazy=True)
+        self.assertEqual(back._LazyKObject.nested.inner.value[1].deep, True)
+
+    def test_lazy_kobject_from_file_with_schema(self):
+        filename = os.path.join("tests" if os.path.exists("tests") else ".", "lazy_temp.json")
+        try:
+            with io.open(filename, "w", encoding="utf-8") as f:
+                f.write(six.text_type(json.dumps({"name": "File", "age": 5, "address": {"city": "C"}})))
+            obj = SmartJson().toObjectFromFile(filename, schema={'name': {'type': 'str', 'required': True}}, lazy=True)
+            self.assertEqual(obj.address.city, "C")
+            with self.assertRaisesRegex(SmartJsonDeserializationError, "Expected a dictionary structure"):
+                SmartJson().toObject("[1, 2]", lazy=True)
+        finally:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    # --- Datetime Detection Tests ---
+    def test_parse_datetime_matches_strptime(self):
+        import datetime
+        candidates = [
+            "2020-01-02 03:04:05.000600", "2020-01-02 03:04:05", "2020-1-2 3:4:5.6", "2020-01-02  03:04:05.1",
+            "2020-02-30 03:04:05.000000", "2020-01-02 24:00:00.000000", "2020-01-02T03:04:05.000600",
+            "2020-01-02 03:04:05.0006001", "hello world, this is text", "", "2020", "abcd-01-02 03:04:05.000600",
+            str(datetime.datetime(1999, 12, 31, 23, 59, 59, 999999)), "9999-99-99 99:99:99.999999",
+        ]
+        for candidate in candidates:
+            try:
+                expected = datetime.datetime.strptime(candidate, "%Y-%m-%d %H:%M:%S.%f")
+            except ValueError:
+                expected = None
+            self.assertEqual(_parse_datetime(candidate), expected, candidate)
+
+    def test_parse_datetimes_switch(self):
+        import datetime
+        document = '{"when": "2020-01-02 03:04:05.000600", "nested": {"when": "2021-01-02 03:04:05.000001"}}'
+        parsed = SmartJson().toObject(document)
+        self.assertEqual(parsed.when, datetime.datetime(2020, 1, 2, 3, 4, 5, 600))
+        self.assertEqual(parsed.nested.when, datetime.datetime(2021, 1, 2, 3, 4, 5, 1))
+        raw = SmartJson().toObject(document, parse_datetimes=False)
+        self.assertEqual(raw.when, "2020-01-02 03:04:05.000600")
+        self.assertEqual(raw.nested.when, "2021-01-02 03:04:05.000001")
+        lazy_raw = SmartJson().toObject(document, lazy=True, parse_datetimes=False)
+        self.assertEqual(lazy_raw.nested.when, "2021-01-02 03:04:05.000001")
+
+    # --- Slots Deserialization Tests ---
+    def test_slots_objects_match_kobject(self):
+        document = {
+            "name": "slots", "count": 3, "when": "2020-01-02 03:04:05.000600", "none": None,
+            "records": [{"id": 1, "tags": ["a"]}, {"id": 2, "tags": []}, 3, {"id": "x", "extra": {"deep": True}}],
+        }
+        eager = SmartJson().toObject(json.dumps(document))
+        shaped = SmartJson().toObject(json.dumps(document), slots=True)
+        for name in ("name", "count", "when", "none"):
+            self.assertEqual(getattr(shaped, name), getattr(eager, name))
+        self.assertIsInstance(shaped, _ShapedKObject)
+        self.assertFalse(hasattr(shaped, "__dict__"))
+        first, second, third, fourth = shaped.records
+        self.assertIs(type(first), type(second))
+        self.assertIsNot(type(first), type(fourth))
+        self.assertEqual([first.id, second.id, first.tags, third], [1, 2, ["a"], 3])
+        self.assertTrue(fourth.extra.deep)
+        self.assertFalse(hasattr(first, "missing"))
+        self.assertIn("tags", dir(first))
+        again = SmartJson().toObject({"id": 5, "tags": None}, slots=True)
+        self.assertIs(type(again), type(first))
+        self.assertEqual(json.loads(SmartJson(first).serialize(pretty=False)), {"_ShapedKObject": {"id": 1, "tags": ["a"]}})
+
+    def test_slots_fall_back_for_unusable_keys(self):
+        shaped = SmartJson().toObject({"not an identifier": 1, "_from_dict": 2, "__dunder": 3}, slots=True)
+        self.assertEqual(getattr(shaped, "not an identifier"), 1)
+        self.assertEqual(getattr(shaped, "_from_dict"), 2)
+        self.assertEqual(getattr(shaped, "__dunder"), 3)
+        self.assertIsInstance(shaped, _ShapedKObject)
+        with self.assertRaisesRegex(SmartJsonDeserializationError, "Expected a dictionary structure"):
+            SmartJson().toObject("[1, 2]", slots=True)
+        with self.assertRaisesRegex(SmartJsonDeserializationError, "cannot be combined"):
+            SmartJson().toObject("{}", slots=True, lazy=True)
+
+    # --- Type Dispatch Tests ---
+    def test_type_dispatch_resolves_through_mro(self):
+        import collections
+        import enum
+
+        class Color(enum.Enum):
+            RED = 1
+            GREEN = 2
+
+        class Tags(collections.deque):
+            pass
+
+        class Counter(dict):
+            pass
+
+        self.assertIs(_TYPE_HANDLERS.resolve(bool), _TYPE_HANDLERS.resolve(int))
+        self.assertIs(_TYPE_HANDLERS.resolve(Counter), _TYPE_HANDLERS.resolve(dict))
+        self.assertIs(_TYPE_HANDLERS.resolve(Tags), _TYPE_HANDLERS.resolve(collections.deque))
+        self.assertIs(_TYPE_HANDLERS.resolve(type(Color)), _TYPE_HANDLERS.resolve(enum.EnumMeta))
+        value = {"tags": Tags(["a", "b"]), "counts": Counter(x=1), "color": Color}
+        expected = {"tags": ["a", "b"], "counts": {"x": 1}, "color": {"RED": 1, "GREEN": 2}}
+        self.assertEqual(json.loads(SmartJson(value).serialize(pretty=False)), expected)
+        self.assertEqual(json.loads("".join(SmartJson(value).iterencode(pretty=False))), expected)
+        self.assertEqual(json.loads(SmartJson(Color).serialize()), {"RED": 1, "GREEN": 2})
+
+    def test_registered_type_handler_is_used_everywhere(self):
+        class Money(object):
+            def __init__(self, cents):
+                self.cents = cents
+
+        _TYPE_HANDLERS.register(Money, _TypeHandler.custom(lambda money: "{:.2f}".format(money.cents / 100.0)))
+        try:
+            holder = SimpleObject("wallet", 1)
+            holder.balance = Money(1234)
+            expected = {"SimpleObject": {"name": "wallet", "value": 1, "balance": "12.34"}}
+            self.assertEqual(json.loads(SmartJson(holder).serialize()), expected)
+            self.assertEqual(json.loads("".join(SmartJson(holder).iterencode())), expected)
+            self.assertEqual(json.loads(SmartJson((Money(5), [Money(6)])).serialize()), ["0.05", ["0.06"]])
+        finally:
+            _TYPE_HANDLERS.unregister(Money)
+        self.assertEqual(json.loads(SmartJson([Money(7)]).serialize()), [{"cents": 7}])
+
+    # --- Custom Dumper Tests ---
+    def test_register_dumper_decorator_applies_to_subclasses_and_roots(self):
+        class Money(object):
+            def __init__(self, cents):
+                self.cents = cents
+
+        class Euros(Money):
+            pass
+
+        @SmartJson.register_dumper(Money)
+        def dump_money(money):
+            return {"amount": "{:.2f}".format(money.cents / 100.0), "kind": type(money).__name__}
+
+        try:
+            self.assertEqual(dump_money(Money(1))["amount"], "0.01")  # The decorator returns the function
+            holder = SimpleObject("wallet", Euros(250))
+            expected = {"SimpleObject": {"name": "wallet", "value": {"amount": "2.50", "kind": "Euros"}}}
+            self.assertEqual(json.loads(SmartJson(holder).serialize()), expected)
+            self.assertEqual(json.loads("".join(SmartJson(holder).iterencode())), expected)
+            root = {"Euros": {"amount": "0.99", "kind": "Euros"}}
+            self.assertEqual(json.loads(SmartJson(Euros(99)).serialize()), root)
+            self.assertEqual(SmartJson(Euros(99)).serialize(), "".join(SmartJson(Euros(99)).iterencode()))
+
+            SmartJson.register_dumper(Euros, lambda euros: "EUR {}".format(euros.cents))  # More specific class wins
+            self.assertEqual(json.loads(SmartJson([Euros(3), Money(4)]).serialize()),
+                             ["EUR 3", {"amount": "0.04", "kind": "Money"}])
+            self.assertTrue(SmartJson.unregister_dumper(Euros))
+            self.assertEqual(json.loads(SmartJson([Euros(3)]).serialize()), [{"amount": "0.03", "kind": "Euros"}])
+        finally:
+            SmartJson.unregister_dumper(Money)
+            SmartJson.unregister_dumper(Euros)
+        self.assertFalse(SmartJson.unregister_dumper(Money))
+        self.assertEqual(json.loads(SmartJson([Money(7)]).serialize()), [{"cents": 7}])
+
+    def test_register_json_ready_dumper_is_used_as_is(self):
+        def dump_address(address):
+            return {"street": address.street, "city": address.city, "zip_code": address.zip_code}
+
+        user = ValidUser("Ann", 30, address=ValidAddress("1 Main St", "Town", "12345"))
+        data = {"users": [user], "address": ValidAddress("2 High St", "City", "54321")}
+        expected = {pretty: SmartJson(data).serialize(pretty=pretty) for pretty in (True, False)}
+        expected_root = SmartJson(user.address).serialize()
+        SmartJson.register_dumper(ValidAddress, dump_address, json_ready=True)
+        try:
+            for pretty in (True, False):
+                self.assertEqual(SmartJson(data).serialize(pretty=pretty), expected[pretty])
+                self.assertEqual("".join(SmartJson(data).iterencode(pretty=pretty)), expected[pretty])
+            self.assertEqual(SmartJson(user.address).serialize(), expected_root)
+            self.assertEqual("".join(SmartJson(user.address).iterencode()), expected_root)
+            self.assertTrue(SmartJson.unregister_dumper(ValidAddress))
+        finally:
+            SmartJson.unregister_dumper(ValidAddress)
+        self.assertFalse(SmartJson.unregister_dumper(ValidAddress))
+
+    def test_register_dumper_replaces_and_restores_builtin_conversion(self):
+        import datetime
+        moment = datetime.datetime(2020, 1, 2, 3, 4, 5)
+        SmartJson.register_dumper(datetime.datetime, lambda value: value.isoformat())
+        try:
+            self.assertEqual(json.loads(SmartJson({"at": moment}).serialize()), {"at": "2020-01-02T03:04:05"})
+        finally:
+            self.assertTrue(SmartJson.unregister_dumper(datetime.datetime))
+        self.assertEqual(json.loads(SmartJson({"at": moment}).serialize()), {"at": "2020-01-02 03:04:05"})
+        self.assertFalse(SmartJson.unregister_dumper(dict))  # Built-in conversions are not dumpers
+        self.assertEqual(json.loads(SmartJson({"a": 1}).serialize()), {"a": 1})
+
+    def test_register_dumper_errors(self):
+        class Broken(object):
+            pass
+
+        class Recursive(object):
+            pass
+
+        SmartJson.register_dumper(Broken, lambda value: 1 / 0)
+        SmartJson.register_dumper(Recursive, lambda value: Recursive())
+        try:
+            with self.assertRaisesRegex(SmartJsonSerializationError, "Custom dumper for 'Broken' failed"):
+                SmartJson({"value": Broken()}).serialize()
+            with self.assertRaisesRegex(SmartJsonSerializationError, "returned a value of type 'Recursive'"):
+                SmartJson([Recursive()]).serialize()
+        finally:
+            SmartJson.unregister_dumper(Broken)
+            SmartJson.unregister_dumper(Recursive)
+        with self.assertRaisesRegex(SmartJsonError, "expects a class"):
+            SmartJson.register_dumper("Broken")
+
+    # --- Typed Deserialization Tests ---
+    def test_to_object_with_cls_decodes_declared_field_types(self):
+        import datetime
+        import enum
+        from typing import Dict, List, Optional
+
+        class Level(enum.Enum):
+            LOW = 1
+            HIGH = 2
+
+        class Contact(object):
+            street: str
+            zip_code: int
+
+            def __init__(self, street, zip_code):
+                self.street = street
+                self.zip_code = zip_code
+
+        class Account(object):
+            name: str
+            born: datetime.date
+            seen: datetime.datetime
+            level: Level
+            contacts: List[Contact]
+            scores: Dict[str, float]
+            nickname: Optional[str]
+
+            def __init__(self):
+                self.name = "Ann"
+                self.born = datetime.date(1990, 1, 2)
+                self.seen = datetime.datetime(2020, 1, 2, 3, 4, 5)
+                self.level = Level.HIGH
+                self.contacts = [Contact("1 Main St", 12345), Contact("2 High St", 54321)]
+                self.scores = {"math": 1.5}
+                self.extra = "2020-01-02"  # Undeclared fields keep their JSON value
+
+        text = SmartJson(Account()).serialize()
+        account = SmartJson().toObject(text, cls=Account)
+        self.assertIsInstance(account, Account)
+        self.assertEqual(account.born, datetime.date(1990, 1, 2))
+        self.assertEqual(account.seen, datetime.datetime(2020, 1, 2, 3, 4, 5))
+        self.assertIs(account.level, Level.HIGH)
+        self.assertEqual([type(contact) for contact in account.contacts], [Contact, Contact])
+        self.assertEqual(account.contacts[1].zip_code, 54321)
+        self.assertEqual(account.scores, {"math": 1.5})
+        self.assertEqual(account.extra, "2020-01-02")
+        self.assertFalse(hasattr(account, "nickname"))
+        self.assertEqual(SmartJson(account).serialize(), text)
+
+        test_dir = "tests" if os.path.exists("tests") else "."
+        filepath = os.path.join(test_dir, "typed_temp.json")
+        try:
+            SmartJson([Contact("3 Low St", 1)]).serializeToJsonFile(directory=test_dir, filename="typed_temp.json")
+            contacts = SmartJson().toObjectFromFile(filepath, cls=List[Contact])
+            self.assertEqual([(contact.street, contact.zip_code) for contact in contacts], [("3 Low St", 1)])
+            self.assertEqual([contact.street for contact in SmartJson.iter_objects_from_file(filepath, cls=Contact)],
+                             ["3 Low St"])
+        finally:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+
+    def test_to_object_with_cls_reads_back_none_fields(self):
+        import datetime
+        import enum
+        from typing import Dict, List, Optional
+
+        class Grade(enum.Enum):
+            LOW = 1
+
+        class Person(object):
+            name: str
+            boss: Optional["Person"]
+            age: Optional[int]
+            height: float
+            born: datetime.date
+            grade: Grade
+            reports: List["Person"]
+            scores: Dict[str, int]
+            nickname: Optional[str]
+
+            def __init__(self, name, boss=None):
+                self.name = name
+                self.boss = boss
+                self.age = None
+                self.height = None
+                self.born = None
+                self.grade = None
+                self.reports = [None]
+                self.scores = None
+                self.nickname = None
+
+        text = SmartJson(Person("Ann", Person("Bob"))).serialize()
+        ann = SmartJson().toObject(text, cls=Person)
+        self.assertEqual(ann.boss.name, "Bob")
+        for person in (ann, ann.boss):
+            self.assertEqual((person.age, person.height, person.born, person.grade, person.scores),
+                             (None, None, None, None, None))
+            self.assertEqual(person.reports, [None])
+            self.assertEqual(person.nickname, "")  # A string field cannot tell "" from None
+        self.assertIsNone(ann.boss.boss)
+        self.assertEqual(SmartJson(ann).serialize(), text)
+
+    def test_typed_decoder_caches_do_not_keep_classes_alive(self):
+        import gc
+        import weakref
+        from smartjson.core import _ClassDecoder, _DECODERS, _LOADERS
+
+        def decode_temporary_classes():
+            class Leaf(object):
+                value: int
+
+            # Plain annotations only: subscripting a typing generic such as List["Branch"] is cached
+            # by the typing module, which would keep the class alive whatever SmartJson does.
+            class Branch(object):
+                leaf: Leaf
+                child: "Branch"
+
+            SmartJson.register_loader(Leaf, lambda value: value)
+            branch = SmartJson().toObject('{"leaf": 1, "child": {"leaf": 2, "child": ""}}', cls=Branch)
+            self.assertEqual((branch.child.leaf, branch.child.child), (2, None))
+            self.assertIn(Branch, _ClassDecoder._cache)
+            self.assertIn(Branch, _DECODERS)
+            self.assertIn(Leaf, _LOADERS)
+            return weakref.ref(Leaf), weakref.ref(Branch)
+
+        class_refs = decode_temporary_classes()
+        gc.collect()
+        self.assertEqual([class_ref() for class_ref in class_refs], [None, None])
+
+    @unittest.skipUnless(dataclasses, "dataclasses requires Python 3.7+")
+    def test_to_object_with_dataclass_calls_init(self):
+        from typing import List, Optional
+
+        @dataclasses.dataclass
+        class Point(object):
+            x: int
+            y: int = 0
+            label: Optional[str] = None
+
+        @dataclasses.dataclass
+        class Path(object):
+            points: List[Point]
+
+            def __post_init__(self):
+                self.length = len(self.points)
+
+        path = SmartJson().toObject('{"points": [{"x": 1, "y": 2}, {"x": 3, "label": "end"}]}', cls=Path)
+        self.assertEqual(path, Path([Point(1, 2), Point(3, 0, "end")]))
+        self.assertEqual(path.length, 2)
+        with self.assertRaisesRegex(SmartJsonDeserializationError, "Cannot decode 'Path' at 'points\\[0\\]'"):
+            SmartJson().toObject('{"points": [{"y": 2}]}', cls=Path)
+
+    def test_register_loader_is_used_for_its_class(self):
+        from typing import List
+
+        class Temperature(object):
+            def __init__(self, celsius):
+                self.celsius = celsius
+
+        class Reading(object):
+            temperatures: List[Temperature]
+
+        @SmartJson.register_loader(Temperature)
+        def load_temperature(value):
+            return Temperature(float(value.rstrip("C")))
+
+        try:
+            self.assertEqual(load_temperature("1C").celsius, 1.0)  # The decorator returns the function
+            reading = SmartJson().toObject('{"temperatures": ["21.5C", "-3C"]}', cls=Reading)
+            self.assertEqual([t.celsius for t in reading.temperatures], [21.5, -3.0])
+            self.assertTrue(SmartJson.unregister_loader(Temperature))
+        finally:
+            SmartJson.unregister_loader(Temperature)
+        self.assertFalse(SmartJson.unregister_loader(Temperature))
+        with self.assertRaisesRegex(SmartJsonDeserializationError, "at 'temperatures\\[0\\]'"):
+            SmartJson().toObject('{"temperatures": ["21.5C"]}', cls=Reading)
+        with self.assertRaisesRegex(SmartJsonError, "expects a class"):
+            SmartJson.register_loader("Temperature")
+
+    def test_to_object_with_cls_errors(self):
+        class Item(object):
+            item_id: int
+            price: float
+
+        item = SmartJson().toObject('{"item_id": 1, "price": 2}', cls=Item)
+        self.assertEqual((item.item_id, item.price), (1, 2.0))
+        with self.assertRaisesRegex(SmartJsonDeserializationError,
+                                    "Cannot decode 'Item' at 'price': expected float, got str"):
+            SmartJson().toObject('{"item_id": 1, "price": "2"}', cls=Item)
+        with self.assertRaisesRegex(SmartJsonDeserializationError, "at 'root'"):
+            SmartJson().toObject('[1]', cls=Item)
+        for option in ({"lazy": True}, {"slots": True}):
+            with self.assertRaisesRegex(SmartJsonError, "cannot be combined"):
+                SmartJson().toObject('{"item_id": 1}', cls=Item, **option)
+
+    # --- Iterative Conversion Tests ---
+    def test_deep_nesting_beyond_recursion_limit(self):
+        import sys
+
+        class Node(object):
+            def __init__(self, child):
+                self.child = child
+                self.meta = {"leaf": [child is None]}
+
+        depth = sys.getrecursionlimit() + 500
+        node = None
+        for _ in range(depth):
+            node = Node(node)
+        compact = SmartJson(node).serialize(pretty=False)
+        self.assertEqual(compact.count('"child"'), depth)
+        self.assertEqual("".join(SmartJson(node).iterencode(pretty=False)), compact)
+        self.assertEqual("".join(SmartJson(node).iterencode()), SmartJson(node).serialize())
+        with self.assertRaisesRegex(SmartJsonSerializationError, "Maximum nesting depth of 50 exceeded"):
+            SmartJson(node, max_depth=50).serialize()
+        with self.assertRaisesRegex(SmartJsonSerializationError, "Maximum nesting depth of 50 exceeded"):
+            "".join(SmartJson(node, max_depth=50).iterencode())
+
+    def test_deep_nesting_under_tuple_and_ordered_dict_roots(self):
+        import sys
+        from collections import OrderedDict
+
+        depth = sys.getrecursionlimit() + 500
+        nested = []
+        for _ in range(depth):
+            nested = [nested]
+        for root in ((nested,), OrderedDict([("deep", nested)])):
+            compact = SmartJson(root).serialize(pretty=False)
+            self.assertEqual(compact.count("["), depth + (2 if isinstance(root, tuple) else 1))
+            self.assertEqual("".join(SmartJson(root).iterencode(pretty=False)), compact)
+            with self.assertRaisesRegex(SmartJsonSerializationError, "Maximum nesting depth of 50 exceeded"):
+                SmartJson(root, max_depth=50).serialize()
+
+    def test_iterative_conversion_errors_name_innermost_object(self):
+        class Outer(object):
+            def __init__(self, inner):
+                self.inner = inner
+
+        visited = set()
+        broken = {"outer": Outer(SimpleObject("bad", b"\xff"))}
+        with self.assertRaisesRegex(SmartJsonSerializationError, "Error converting attributes for 'SimpleObject'"):
+            SmartJson._convert_root(broken, visited)
+        with self.assertRaisesRegex(SmartJsonSerializationError, "Error converting attributes for 'SimpleObject'"):
+            "".join(SmartJson(broken).iterencode())
+        self.assertEqual(visited, set())
+        self.assertEqual(SmartJson._convert_root({"outer": Outer(1)}, visited), ({"outer": {"inner": 1}}, False))
+
+    # --- Acyclic Mode Tests ---
+    def test_assume_acyclic_matches_tracked_output(self):
+        import datetime
+        shared = {"shared": [1, 2]}
+        data = {"a": shared, "b": shared, "when": datetime.date(2020, 1, 2),
+                "obj": SimpleObject("x", [shared, (3, 4)])}
+        for pretty in (True, False):
+            expected = SmartJson(data).serialize(pretty=pretty)
+            self.assertEqual(SmartJson(data).serialize(pretty=pretty, assume_acyclic=True), expected)
+            self.assertEqual("".join(SmartJson(data).iterencode(pretty=pretty, assume_acyclic=True)), expected)
+        self.assertEqual(SmartJson(SimpleObject("root", data)).serialize(assume_acyclic=True),
+                         SmartJson(SimpleObject("root", data)).serialize())
+
+    def test_assume_acyclic_reports_cycles_at_depth_cap(self):
+        obj1 = CircularRefObject("obj1")
+        obj2 = CircularRefObject("obj2")
+        obj1.ref = obj2
+        obj2.ref = obj1
+        with self.assertRaisesRegex(SmartJsonCircularDependencyError, "Maximum nesting depth of 40 exceeded"):
+            SmartJson(obj1, max_depth=40).serialize(assume_acyclic=True)
+        looped = []
+        looped.append({"again": looped})
+        with self.assertRaises(SmartJsonCircularDependencyError):
+            "".join(SmartJson(looped).iterencode(assume_acyclic=True))
+
+    # --- JSON Backend Conformance Tests ---
+    def _json_backend_corpus(self):
+        import datetime
+        return [
+            {"b": 1, "a": [1, 2.5, -0.1, 1e-07, 1e+300, True, False, ""], "c": {"nested": {"deep": [[]]}}},
+            {"text": "caf\u00e9 \u2603 \U0001f600 \"quoted\" back\\slash / tab\t newline\n \u0000"},
+            {"big": 2 ** 64 + 1, "neg": -2 ** 63, "empty_list": [], "empty_dict": {}},
+            {"below_int64": -2 ** 63 - 1},  # 19 digits, alone so no longer run sends it to the stdlib
+            [float("nan"), float("inf"), -float("inf"), "null", {"null": "a null value"}],
+            float("nan"),
+            SimpleObject("name", [SimpleObject("inner", datetime.date(2020, 1, 2)), b"bytes", None, (1, 2)]),
+            ["a", {"z": 1, "y": 2}, 3],
+            "just a string",
+            42,
+        ]
+
+    def _available_json_backends(self):
+        backends = []
+        for name in ['json'] + list(_OPTIONAL_JSON_BACKENDS):
+            try:
+                backends.append(_load_json_backend(name))
+            except ImportError:
+                pass
+        return backends
+
+    def test_json_backends_produce_equivalent_documents(self):
+        corpus = [SmartJson._convert_root(value, set())[0] for value in self._json_backend_corpus()]
+        for backend in self._available_json_backends():
+            for value in corpus:
+                for pretty in (True, False):
+                    for sort_keys in (True, False):
+                        with self.subTest(backend=backend.name, value=value, pretty=pretty, sort_keys=sort_keys):
+                            text = backend.dumps(value, pretty, sort_keys)
+                            expected = json.dumps(value, indent=2 if pretty else None, sort_keys=sort_keys)
+                            self.assertEqual(json.dumps(json.loads(text)), json.dumps(json.loads(expected)))
+                            self.assertEqual(json.dumps(backend.loads(expected)), json.dumps(json.loads(expected)))
+                            if backend.name == 'json':
+                                self.assertEqual(text, expected)
+            with self.subTest(backend=backend.name):
+                with self.assertRaises(json.JSONDecodeError):
+                    backend.loads('{"a": [1, 2}')
+
+    def test_json_backend_selection(self):
+        try:
+            self.assertEqual(SmartJson.set_backend('json'), 'json')
+            self.assertEqual(SmartJson.get_backend(), 'json')
+            with self.assertRaisesRegex(SmartJsonError, "Unknown JSON backend 'simplejson'"):
+                SmartJson.set_backend('simplejson')
+            self.assertEqual(SmartJson.get_backend(), 'json')
+            self.assertIn(SmartJson.set_backend(None), ['json'] + list(_OPTIONAL_JSON_BACKENDS))
+        finally:
+            SmartJson.set_backend(None)
+
+    def test_compact_unsorted_serialization_on_every_backend(self):
+        data = {"b": 1, "a": SimpleObject("x", [1, "\u00e9"])}
+        expected = json.loads(SmartJson(data).serialize(pretty=False))
+        names = ['json'] + list(_OPTIONAL_JSON_BACKENDS)
+        try:
+            for name in names:
+                try:
+                    SmartJson.set_backend(name)
+                except SmartJsonError:
+                    continue
+                with self.subTest(backend=name):
+                    compact = SmartJson(data).serialize(pretty=False, sort_keys=False)
+                    self.assertEqual(json.loads(compact), expected)
+                    self.assertEqual(list(json.loads(compact)), ["b", "a"])
+                    self.assertEqual(SmartJson().toObject(compact).a.value, [1, "\u00e9"])
+                    self.assertEqual(list(json.loads(SmartJson(data).serialize(pretty=False, sort_keys=True))),
+                                     ["a", "b"])
+        finally:
+            SmartJson.set_backend(None)
+        # Output that is not compact and unsorted keeps the standard library formatting by default.
+        self.assertEqual(SmartJson(data).serialize(), json.dumps(expected, indent=2, sort_keys=True))
+        self.assertEqual(SmartJson(data).serialize(pretty=False), json.dumps(expected))
+
+    # --- Batch Serialization Tests ---
+    def test_serialize_many_preserves_order_across_workers(self):
+        import datetime
+        objects = [SimpleObject("item{}".format(i), [i, {"when": datetime.date(2020, 1, 1 + i % 28)}])
+                   for i in range(25)]
+        objects.insert(7, {"plain": "dict"})
+        for pretty in (True, False):
+            expected = [SmartJson(obj).serialize(pretty=pretty) for obj in objects]
+            self.assertEqual(SmartJson.serialize_many(objects, workers=2, chunksize=4, pretty=pretty), expected)
+            self.assertEqual(SmartJson.serialize_many(iter(objects), workers=1, pretty=pretty), expected)
+        self.assertEqual(SmartJson.serialize_many([]), [])
+
+    def test_serialize_many_raises_error_of_first_failing_item(self):
+        objects = [SimpleObject("ok{}".format(i), i) for i in range(12)]
+        looped = CircularRefObject("looped")
+        looped.ref = looped
+        objects[9] = looped
+        objects[11] = SimpleObject("later", [])
+        objects[11].value.append(objects[11])
+        with self.assertRaisesRegex(SmartJsonCircularDependencyError, "object type 'CircularRefObject'"):
+            SmartJson.serialize_many(objects, workers=2, chunksize=2)
+        with self.assertRaisesRegex(SmartJsonSchemaValidationError, "age"):
+            SmartJson.serialize_many([ValidUser("Valid", 30)] * 3 + [SimpleObject("x", 1)],
+                                     workers=2, chunksize=2, schema=VALID_USER_SCHEMA)
+
+    def test_serialize_many_falls_back_for_unpicklable_objects(self):
+        class LocalRecord(object):  # Cannot be pickled for a worker process
+            def __init__(self, number):
+                self.number = number
+
+        records = [LocalRecord(i) for i in range(6)]
+        self.assertEqual(SmartJson.serialize_many(records, workers=2, chunksize=2, pretty=False),
+                         ['{{"LocalRecord": {{"number": {}}}}}'.format(i) for i in range(6)])
+        with self.assertRaises(SmartJsonSerializationError):
+            SmartJson.serialize_many(records, workers=0)
+
+    def test_serialize_many_sends_dumpers_to_spawned_workers(self):
+        import multiprocessing
+        import smartjson.core as core
+        records = [DumpedRecord(i) for i in range(6)]
+        start_method = multiprocessing.get_start_method(allow_none=True)
+        SmartJson.register_dumper(DumpedRecord, dump_record)
+        try:
+            expected = [SmartJson(record).serialize(pretty=False) for record in records]
+            self.assertEqual(expected[0], '{"DumpedRecord": {"dumped": 0}}')
+            multiprocessing.set_start_method('spawn', force=True)
+            self.assertEqual(SmartJson.serialize_many(records, workers=2, chunksize=2, pretty=False), expected)
+            # A dumper that cannot be pickled keeps the batch in this process
+            SmartJson.register_dumper(DumpedRecord, lambda record: {"dumped": record.number})
+            self.assertEqual(SmartJson.serialize_many(records, workers=2, chunksize=2, pretty=False), expected)
+            # Chunks not done in time are serialized here
+            timeout, core._PARALLEL_CHUNK_TIMEOUT = core._PARALLEL_CHUNK_TIMEOUT, 0
+            try:
+                SmartJson.register_dumper(DumpedRecord, dump_record)
+                self.assertEqual(SmartJson.serialize_many(records, workers=2, chunksize=2, pretty=False), expected)
+            finally:
+                core._PARALLEL_CHUNK_TIMEOUT = timeout
+        finally:
+            multiprocessing.set_start_method(start_method, force=True)
+            SmartJson.unregister_dumper(DumpedRecord)
+
+    def test_serialize_to_files_reports_failures_and_writes_the_rest(self):
+        import shutil
+        test_dir = os.path.join("tests" if os.path.exists("tests") else ".", "bulk_export_temp")
+        looped = CircularRefObject("looped")
+        looped.ref = looped
+        items = [(SimpleObject("file{}".format(i), [i]), "file{}.json".format(i)) for i in range(9)]
+        items[3] = (looped, "looped.json")
+        items[6] = ({"a": 1}, os.path.join("missing_subdir", "unwritable.json"))
+        try:
+            for workers in (1, 2):
+                failures = SmartJson.serialize_to_files(items, directory=test_dir, workers=workers, chunksize=2,
+                                                        io_workers=3, pretty=False)
+                self.assertEqual([filename for filename, _ in failures],
+                                 ["looped.json", os.path.join("missing_subdir", "unwritable.json")])
+                self.assertIsInstance(failures[0][1], SmartJsonCircularDependencyError)
+                self.assertIsInstance(failures[1][1], SmartJsonSerializationError)
+                self.assertIn("Failed to write file", str(failures[1][1]))
+                self.assertEqual(sorted(os.listdir(test_dir)),
+                                 sorted(filename for index, (_, filename) in enumerate(items) if index not in (3, 6)))
+                for obj, filename in items[:3]:
+                    with io.open(os.path.join(test_dir, filename), encoding='utf-8') as infile:
+                        self.assertEqual(infile.read(), SmartJson(obj).serialize(pretty=False))
+                shutil.rmtree(test_dir)
+        finally:
+            if os.path.exists(test_dir):
+                shutil.rmtree(test_dir)
+
+    # --- asyncio API Tests ---
+    def test_async_file_round_trip(self):
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+        test_dir = "tests" if os.path.exists("tests") else "."
+        filepath = os.path.join(test_dir, "async_temp.json")
+        data = {"name": "async", "values": [1, 2, {"nested": "2020-01-02 03:04:05.000600"}]}
+
+        async def round_trip(executor):
+            await SmartJson(data).aserialize_to_file(directory=test_dir, filename="async_temp.json", pretty=False,
+                                                     executor=executor)
+            return await SmartJson().ato_object_from_file(filepath, executor=executor)
+
+        try:
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                for pool in (None, executor):
+                    obj = run_coroutine(round_trip(pool))
+                    self.assertEqual(obj.name, "async")
+                    self.assertEqual(obj.values[2].nested.year, 2020)
+                    with io.open(filepath, encoding='utf-8') as infile:
+                        self.assertEqual(infile.read(), SmartJson(data).serialize(pretty=False))
+            with self.assertRaises(SmartJsonDeserializationError):
+                run_coroutine(SmartJson().ato_object_from_file(os.path.join(test_dir, "missing_async.json")))
+        finally:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+
+    def test_async_stream_round_trip(self):
+        import asyncio
+        import socket
+        sample = SimpleObject("streamed", ["x" * 100] * 50)
+
+        async def round_trip():
+            left, right = socket.socketpair()
+            _, writer = await asyncio.open_connection(sock=left)
+            reader, peer = await asyncio.open_connection(sock=right)
+            await SmartJson(sample).aserialize_to_stream(writer, pretty=False, chunk_size=512)
+            writer.close()
+            obj = await SmartJson().ato_object_from_stream(reader)
+            peer.close()
+            return obj
+
+        obj = run_coroutine(round_trip())
+        self.assertEqual(obj.SimpleObject.name, "streamed")
+        self.assertEqual(obj.SimpleObject.value, ["x" * 100] * 50)
+
+        async def read_invalid():
+            reader = asyncio.StreamReader()
+            reader.feed_data(b'{"broken": ')
+            reader.feed_eof()
+            return await SmartJson().ato_object_from_stream(reader)
+
+        with self.assertRaisesRegex(SmartJsonDeserializationError, "Invalid JSON format"):
+            run_coroutine(read_invalid())
+
+    def test_aiterencode_matches_serialize_in_slices(self):
+        import asyncio
+        import datetime
+        data = {"rows": [SimpleObject("row{}".format(i), {"when": datetime.date(2020, 1, 2), "n": [i, i * 0.5]})
+                         for i in range(200)]}
+
+        async def collect(**options):
+            return [chunk async for chunk in SmartJson(data).aiterencode(**options)]
+
+        for pretty in (True, False):
+            chunks = run_coroutine(collect(pretty=pretty, fragment_budget=50, time_slice=None))
+            self.assertGreater(len(chunks), 10)
+            self.assertEqual("".join(chunks), SmartJson(data).serialize(pretty=pretty))
+        self.assertEqual(run_coroutine(collect(time_slice=None)), [SmartJson(data).serialize()])
+        # Compact unsorted output may come from a faster backend, which can differ in whitespace.
+        self.assertEqual(json.loads("".join(run_coroutine(collect(pretty=False, sort_keys=False)))),
+                         json.loads(SmartJson(data).serialize(pretty=False, sort_keys=False)))
+
+    def test_aiterencode_lets_other_tasks_run(self):
+        import asyncio
+        data = [SimpleObject("item{}".format(i), list(range(10))) for i in range(300)]
+
+        async def encode_while_ticking():
+            ticks = []
+
+            async def ticker():
+                while True:
+                    ticks.append(len(ticks))
+                    await asyncio.sleep(0)
+
+            task = asyncio.ensure_future(ticker())
+            await asyncio.sleep(0)
+            chunks = [chunk async for chunk in SmartJson(data).aiterencode(time_slice=None, fragment_budget=100)]
+            task.cancel()
+            return len(chunks), len(ticks)
+
+        chunk_count, tick_count = run_coroutine(encode_while_ticking())
+        self.assertGreater(chunk_count, 10)
+        self.assertGreaterEqual(tick_count, chunk_count - 1)
+
+        async def encode_invalid():
+            obj = CircularRefObject("loop")
+            obj.ref = obj
+            return [chunk async for chunk in SmartJson(obj).aiterencode()]
+
+        with self.assertRaises(SmartJsonCircularDependencyError):
+            run_coroutine(encode_invalid())
+
+    # --- Memory-mapped Loading Tests ---
+    def test_to_object_from_file_with_mmap_matches_text_read(self):
+        test_dir = "tests" if os.path.exists("tests") else "."
+        filepath = os.path.join(test_dir, "mmap_temp.json")
+        document = {"name": "caf\u00e9 \u2603", "big": 2 ** 70, "when": "2020-01-02 03:04:05.000600",
+                    "rows": [{"id": i, "nested": {"ok": True}} for i in range(20)]}
+        try:
+            with io.open(filepath, "w", encoding="utf-8") as outfile:
+                outfile.write(json.dumps(document, ensure_ascii=False))
+            for name in ['json'] + list(_OPTIONAL_JSON_BACKENDS):
+                try:
+                    SmartJson.set_backend(name)
+                except SmartJsonError:
+                    continue
+                with self.subTest(backend=name):
+                    mapped = SmartJson().toObjectFromFile(filepath, use_mmap=True)
+                    self.assertEqual(mapped.name, "caf\u00e9 \u2603")
+                    self.assertEqual(mapped.big, 2 ** 70)
+                    self.assertEqual(mapped.when.microsecond, 600)
+                    self.assertEqual(mapped.rows[19].nested.ok, True)
+                    text = SmartJson().toObjectFromFile(filepath)
+                    self.assertEqual(SmartJson(mapped).serialize(), SmartJson(text).serialize())
+            for content, message in ((b"", "Invalid JSON format"), (b'{"a": [1, 2}', "Invalid JSON format")):
+                with io.open(filepath, "wb") as outfile:
+                    outfile.write(content)
+                with self.assertRaisesRegex(SmartJsonDeserializationError, message):
+                    SmartJson().toObjectFromFile(filepath, use_mmap=True)
+        finally:
+            SmartJson.set_backend(None)
+            if os.path.exists(filepath):
+                os.remove(filepath)
+        with self.assertRaisesRegex(SmartJsonDeserializationError, "JSON file not found"):
+            SmartJson().toObjectFromFile(filepath, use_mmap=True)
+
+    def test_mmap_loading_lowers_peak_rss(self):
+        import subprocess
+        import sys
+        if not os.path.exists("/proc/self/status"):
+            self.skipTest("Peak RSS (VmHWM) is only measured on Linux")
+        buffer_backends = [name for name, backend in _OPTIONAL_JSON_BACKENDS.items() if backend.parses_buffers]
+        for name in buffer_backends:
+            try:
+                _load_json_backend(name)
+                break
+            except ImportError:
+                continue
+        else:
+            self.skipTest("No installed JSON backend parses mapped buffers")
+        test_dir = os.path.abspath("tests" if os.path.exists("tests") else ".")
+        filepath = os.path.join(test_dir, "mmap_rss_temp.json")
+        # Peak RSS growth (KiB) of a fresh interpreter loading the file. VmHWM is used because
+        # ru_maxrss keeps the parent's peak across exec on Linux.
+        script = (
+            "import sys\n"
+            "from smartjson.core import SmartJson\n"
+            "def peak():\n"
+            "    with open('/proc/self/status') as status:\n"
+            "        return int([line for line in status if line.startswith('VmHWM:')][0].split()[1])\n"
+            "SmartJson.set_backend(sys.argv[1])\n"
+            "before = peak()\n"
+            "SmartJson().toObjectFromFile(sys.argv[2], use_mmap=sys.argv[3] == '1')\n"
+            "print(peak() - before)\n"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        try:
+            with io.open(filepath, "w", encoding="utf-8") as outfile:
+                rows = [{"id": i, "text": "\u0141\u00f3d\u017a caf\u00e9 r\u00e9sum\u00e9 lorem ipsum " * 100}
+                        for i in range(4000)]
+                json.dump({"rows": rows}, outfile, ensure_ascii=False)
+            del rows
+            peaks = {}
+            for use_mmap in ("0", "1"):
+                output = subprocess.check_output([sys.executable, "-c", script, name, filepath, use_mmap], cwd=root)
+                peaks[use_mmap] = int(output.decode("ascii").strip())
+            self.assertLess(peaks["1"], peaks["0"] * 0.85, peaks)
+        finally:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+
+    # --- Incremental Array Reading Tests ---
+    def test_iter_objects_from_file_yields_each_element(self):
+        test_dir = "tests" if os.path.exists("tests") else "."
+        filepath = os.path.join(test_dir, "array_temp.json")
+        records = [{"id": i, "name": "caf\u00e9 \"{}\"".format(i), "score": -1.5e-07 * i, "big": 2 ** 70,
+                    "when": "2020-01-02 03:04:05.000600", "tags": [{"t": "x"}] * (i % 3)} for i in range(40)]
+        try:
+            for indent in (None, 2):
+                with io.open(filepath, "w", encoding="utf-8") as outfile:
+                    outfile.write(json.dumps(records, indent=indent, ensure_ascii=False))
+                for chunk_size in (1, 5, 65536):
+                    objects = list(SmartJson.iter_objects_from_file(filepath, chunk_size=chunk_size))
+                    self.assertEqual(len(objects), 40)
+                    self.assertEqual([obj.id for obj in objects], list(range(40)))
+                    self.assertEqual(objects[7].name, 'caf\u00e9 "7"')
+                    self.assertEqual(objects[7].score, -1.5e-07 * 7)
+                    self.assertEqual(objects[39].big, 2 ** 70)
+                    self.assertEqual(objects[2].tags[1].t, "x")
+                    self.assertEqual(objects[0].when.microsecond, 600)
+            slotted = next(SmartJson.iter_objects_from_file(filepath, slots=True, parse_datetimes=False))
+            self.assertIsInstance(slotted, _ShapedKObject)
+            self.assertEqual(slotted.when, "2020-01-02 03:04:05.000600")
+            with io.open(filepath, "w", encoding="utf-8") as outfile:
+                outfile.write(" [ ] ")
+            self.assertEqual(list(SmartJson.iter_objects_from_file(filepath)), [])
+        finally:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+
+    def test_iter_objects_from_file_errors_and_schema(self):
+        test_dir = "tests" if os.path.exists("tests") else "."
+        filepath = os.path.join(test_dir, "array_temp.json")
+        schema = {'name': {'type': six.string_types, 'required': True}}
+        cases = [
+            ('[{"name": "a"}, {"name": 1}]', SmartJsonSchemaValidationError, "Element 1: .*name"),
+            ('[{"name": "a"}, 3]', SmartJsonSchemaValidationError, "Element 1: Invalid data type at 'root'"),
+            ('[{"name": "a"}, {"name": "b"}', SmartJsonDeserializationError, "at character 29: Expecting ',' delimiter"),
+            ('[{"name": "a"}] {}', SmartJsonDeserializationError, "at character 16: Extra data"),
+            ('{"name": "a"}', SmartJsonDeserializationError, "Expecting '\\[' at the start of a top-level JSON array"),
+        ]
+        try:
+            for content, error, message in cases:
+                with io.open(filepath, "w", encoding="utf-8") as outfile:
+                    outfile.write(content)
+                objects = SmartJson.iter_objects_from_file(filepath, schema=schema, chunk_size=4)
+                if content.startswith('[{"name": "a"}'):
+                    self.assertEqual(next(objects).name, "a")  # Yielded before the failing element is read
+                with self.assertRaisesRegex(error, message):
+                    list(objects)
+            with io.open(filepath, "w", encoding="utf-8") as outfile:
+                outfile.write('[{"name": "a"}, 3]')
+            with self.assertRaisesRegex(SmartJsonDeserializationError, "Element 1: Cannot create _KObject"):
+                list(SmartJson.iter_objects_from_file(filepath))
+        finally:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+        with self.assertRaisesRegex(SmartJsonDeserializationError, "JSON file not found"):
+            next(SmartJson.iter_objects_from_file(filepath))
+
+    def test_array_element_reader_keeps_only_unparsed_text(self):
+        element = {"id": 1, "payload": "x" * 200}
+        text = json.dumps([element] * 2000)
+        reader = _ArrayElementReader(io.StringIO(text), chunk_size=256)
+        largest_buffer = 0
+        for value in reader:
+            self.assertEqual(value, element)
+            largest_buffer = max(largest_buffer, len(reader._buffer))
+        self.assertLess(largest_buffer, 4 * len(json.dumps(element)) + 256)
+
+    # --- Stats Hook Tests ---
+    def test_stats_hooks_report_phases_counts_and_bytes(self):
+        test_dir = "tests" if os.path.exists("tests") else "."
+        filepath = os.path.join(test_dir, "ValidUser.json")
+        user = ValidUser("Ann", 30, address=ValidAddress("1 Main St", "Town", "12345"), roles=["a", "b"])
+        reports = []
+        SmartJson.add_stats_hook(reports.append)
+        try:
+            sj = SmartJson(user, deep_copy=True)
+            serialized = sj.serialize(schema=VALID_USER_SCHEMA)
+            sj.serializeToJsonFile(directory=test_dir)
+            sj.serializeToJsonFile(directory=test_dir, stream=True)
+            SmartJson().toObject(serialized)
+            SmartJson().toObjectFromFile(filepath, schema={'ValidUser': {'type': 'dict', 'required': True}})
+        finally:
+            SmartJson.remove_stats_hook(reports.append)
+            if os.path.exists(filepath):
+                os.remove(filepath)
+        self.assertEqual([stats.operation for stats in reports],
+                         ['serialize', 'serializeToJsonFile', 'serializeToJsonFile', 'toObject', 'toObjectFromFile'])
+        serialize, to_file, to_stream, to_object, from_file = reports
+        self.assertEqual(list(serialize.phases), ['copy', 'validate', 'convert', 'encode'])
+        self.assertEqual(list(to_file.phases), ['copy', 'convert', 'encode', 'write'])
+        self.assertEqual(set(to_stream.phases), {'copy', 'encode', 'write'})
+        self.assertEqual(list(to_object.phases), ['parse', 'build'])
+        self.assertEqual(list(from_file.phases), ['read', 'parse', 'validate', 'build'])
+        for stats in reports:
+            self.assertTrue(all(seconds >= 0 for seconds in stats.phases.values()), stats.operation)
+            self.assertAlmostEqual(stats.total, sum(stats.phases.values()))
+            self.assertEqual(stats.bytes, len(serialized.encode('utf-8')), stats.operation)
+            self.assertEqual(stats.to_dict()['operation'], stats.operation)
+        for stats in (serialize, to_file, to_stream):
+            self.assertEqual(stats.node_counts, {'ValidUser': 1, 'ValidAddress': 1, 'list': 1, 'str': 6, 'int': 1})
+        self.assertEqual(to_object.node_counts, {'dict': 3, 'list': 1, 'str': 6, 'int': 1})
+        self.assertEqual(to_file.path, filepath)
+
+        SmartJson(user).serialize()
+        self.assertEqual(len(reports), 5)  # Removed hooks are no longer called
+
+    # --- Conversion Profiling Tests ---
+    def test_profile_aggregates_conversion_cost_per_class(self):
+        class DynamicDir(object):
+            def __init__(self):
+                self.shown = 1
+
+            def __dir__(self):
+                return ['shown', 'computed']
+
+            @property
+            def computed(self):
+                return 2
+
+        user = ValidUser("Ann", 30, address=ValidAddress("1 Main St", "Town", "12345"),
+                         items=[ValidItem(1, 2.5), ValidItem(2, 3.5)])
+        data = {"users": [user, user], "dynamic": DynamicDir()}
+        expected = SmartJson(data).serialize()
+        test_dir = "tests" if os.path.exists("tests") else "."
+        filepath = os.path.join(test_dir, "profile_temp.json")
+        try:
+            with SmartJson.profile() as profile:
+                self.assertEqual(SmartJson(data).serialize(), expected)
+                SmartJson(data).serializeToJsonFile(directory=test_dir, filename="profile_temp.json", stream=True)
+        finally:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+        name = __name__ + "."
+        profiles = profile.to_dict()
+        self.assertEqual(set(profiles), {name + cls for cls in ('ValidUser', 'ValidAddress', 'ValidItem', 'DynamicDir')})
+        self.assertEqual(profiles[name + 'ValidUser']['count'], 4)
+        self.assertEqual(profiles[name + 'ValidItem']['count'], 8)
+        self.assertEqual(profiles[name + 'ValidItem']['attributes'], 16)
+        self.assertEqual(profiles[name + 'DynamicDir']['dir_scans'], 2)
+        self.assertEqual(profiles[name + 'DynamicDir']['property_reads'], 2)
+        self.assertEqual(profiles[name + 'ValidUser']['dir_scans'], 0)
+        user_profile = profiles[name + 'ValidUser']
+        self.assertGreater(user_profile['seconds'], 0)
+        self.assertLess(user_profile['own_seconds'], user_profile['seconds'])  # Addresses and items are nested
+
+        self.assertEqual([row[0] for row in profile.rows('count')][0], name + 'ValidItem')
+        table = profile.table(sort_by='count', limit=2).splitlines()
+        self.assertEqual(len(table), 3)
+        self.assertTrue(table[1].startswith(name + 'ValidItem'))
+        exported = json.loads(profile.to_json())
+        self.assertEqual([row['seconds'] for row in exported], sorted(profile['seconds'] for profile in profiles.values())[::-1])
+        with self.assertRaisesRegex(SmartJsonError, "Unknown profile column"):
+            profile.table(sort_by='bogus')
+
+        SmartJson(data).serialize()
+        self.assertEqual(profile.to_dict()[name + 'ValidUser']['count'], 4)  # Not profiled after the block
+
+    # --- Benchmark Suite Tests ---
+    def test_benchmark_compare_flags_regressions_beyond_threshold(self):
+        from benchmarks.runner import compare
+        baseline = {"benchmarks": {"a": {"min": 1.0}, "b": {"min": 2.0}, "gone": {"min": 1.0}}}
+        results = {"benchmarks": {"a": {"min": 1.2}, "b": {"min": 2.6}, "new": {"min": 5.0}}}
+        rows = compare(results, baseline, threshold=0.25)
+        self.assertEqual([(name, metric, regressed) for name, metric, _, _, _, regressed in rows],
+                         [("a", "min", False), ("b", "min", True)])
+        self.assertAlmostEqual(rows[1][4], 1.3)
+        with self.assertRaisesRegex(ValueError, "'orjson' JSON backend with a baseline using 'json'"):
+            compare(dict(results, json_backend="orjson"), dict(baseline, json_backend="json"))
+
+    def test_benchmark_entry_point_gates_on_baseline(self):
+        from benchmarks.runner import main, load_results, save_results
+        test_dir = "tests" if os.path.exists("tests") else "."
+        results_path = os.path.join(test_dir, "bench_results_temp.json")
+        baseline_path = os.path.join(test_dir, "bench_baseline_temp.json")
+        options = ["serialize.wide_object", "--repeat", "1", "--min-time", "0.001"]
+        try:
+            out = six.StringIO()
+            self.assertEqual(main(options + ["--output", results_path], out=out), 0)
+            results = load_results(results_path)
+            self.assertEqual(list(results["benchmarks"]), ["serialize.wide_object"])
+            self.assertGreater(results["benchmarks"]["serialize.wide_object"]["min"], 0)
+
+            results["benchmarks"]["serialize.wide_object"]["min"] *= 1000  # A much slower baseline
+            save_results(results, baseline_path)
+            self.assertEqual(main(options + ["--baseline", baseline_path], out=six.StringIO()), 0)
+            results["benchmarks"]["serialize.wide_object"]["min"] /= 1e6  # A much faster one
+            save_results(results, baseline_path)
+            out = six.StringIO()
+            self.assertEqual(main(options + ["--baseline", baseline_path], out=out), 1)
+            self.assertIn("REGRESSION", out.getvalue())
+        finally:
+            for path in (results_path, baseline_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def test_benchmark_memory_mode_measures_each_phase(self):
+        from benchmarks.memory import PHASES
+        from benchmarks.runner import compare, main, load_results
+        test_dir = "tests" if os.path.exists("tests") else "."
+        results_path = os.path.join(test_dir, "bench_memory_temp.json")
+        try:
+            self.assertEqual(main(["deep_object.*", "--memory", "--output", results_path], out=six.StringIO()), 0)
+            results = load_results(results_path)
+            self.assertEqual(results["mode"], "memory")
+            self.assertEqual(sorted(results["benchmarks"]), sorted("deep_object.{}".format(phase) for phase in PHASES))
+            for name, measurement in results["benchmarks"].items():
+                self.assertGreater(measurement["peak"], 0, name)
+                self.assertIn("blocks", measurement)
+            # The tree built from the parsed file is still referenced when the phase returns
+            build = results["benchmarks"]["deep_object.build"]
+            self.assertGreaterEqual(build["allocations"], 200)
+            self.assertGreater(build["allocated"], 0)
+
+            baseline = json.loads(json.dumps(results))
+            baseline["benchmarks"]["deep_object.build"]["peak"] //= 2  # The build phase used half as much before
+            baseline["benchmarks"]["deep_object.parse"]["allocations"] //= 2  # And parsing allocated half as often
+            rows = compare(results, baseline, threshold=0.25)
+            self.assertEqual(sorted((name, metric) for name, metric, _, _, _, regressed in rows if regressed),
+                             [("deep_object.build", "peak"), ("deep_object.parse", "allocations")])
+            with self.assertRaises(ValueError):
+                compare(results, {"mode": "time", "benchmarks": {}})
+        finally:
+            if os.path.exists(results_path):
+                os.remove(results_path)
+
 if __name__ == '__main__':
     unittest.main()